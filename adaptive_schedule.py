@@ -0,0 +1,157 @@
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from scheduler import MINSK_TZ, format_hours
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+# Observations lose half their weight after four weeks
+HALF_LIFE_HOURS = 4 * HOURS_PER_WEEK
+# Pseudo-hours of the profile's average rate mixed into every hour-of-week bucket,
+# so rarely observed hours don't swing the interval on a single arrival
+PRIOR_HOURS = 2.0
+# Gaps between checks longer than this (e.g. the bot was down) are not attributed
+MAX_WINDOW_HOURS = HOURS_PER_WEEK
+
+
+def hour_of_week(moment: datetime) -> int:
+    """Bucket index 0..167 in Minsk time, Monday 0:00 is 0"""
+    moment = moment.astimezone(MINSK_TZ)
+    return moment.weekday() * 24 + moment.hour
+
+
+def _hour_segments(start: datetime, end: datetime) -> Iterator[Tuple[int, float]]:
+    """Split [start, end) into (hour-of-week bucket, hours) segments"""
+    cursor = start
+    while cursor < end:
+        boundary = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        segment_end = min(boundary, end)
+        yield hour_of_week(cursor), (segment_end - cursor).total_seconds() / 3600
+        cursor = segment_end
+
+
+class ArrivalModel:
+    """
+    Arrival rate of new objects per search profile and hour of week
+
+    Every check adds the number of new objects it found and the time since
+    the previous check of the same profile, spread over the hour-of-week
+    buckets that time covers. State is a plain JSON-able dict:
+    {profile: {"arrivals": [168], "exposure": [168], "last_check": iso}}.
+    """
+
+    def __init__(self, stats: Dict = None):
+        self.stats: Dict[str, Dict] = stats or {}
+
+    def record(self, profile: str, new_count: int, checked_at: datetime):
+        """
+        Add the result of a successful check
+
+        Args:
+            profile: Search profile name
+            new_count: New objects of this profile found by the check
+            checked_at: Time of the check
+        """
+        entry = self.stats.setdefault(profile, {
+            'arrivals': [0.0] * HOURS_PER_WEEK,
+            'exposure': [0.0] * HOURS_PER_WEEK,
+        })
+        last_check = entry.get('last_check')
+        entry['last_check'] = checked_at.isoformat()
+        if last_check is None:
+            # Objects found by the first check were published at unknown times
+            return
+
+        start = datetime.fromisoformat(last_check)
+        hours = (checked_at - start).total_seconds() / 3600
+        if hours <= 0 or hours > MAX_WINDOW_HOURS:
+            return
+
+        decay = 0.5 ** (hours / HALF_LIFE_HOURS)
+        arrivals = [value * decay for value in entry['arrivals']]
+        exposure = [value * decay for value in entry['exposure']]
+        for bucket, segment_hours in _hour_segments(start, checked_at):
+            exposure[bucket] += segment_hours
+            arrivals[bucket] += new_count * segment_hours / hours
+        entry['arrivals'] = arrivals
+        entry['exposure'] = exposure
+
+    def rates(self, profiles: List[str]) -> Optional[List[float]]:
+        """
+        Expected new objects per hour for every hour-of-week bucket
+
+        Args:
+            profiles: Profiles checked together, their rates are added up
+
+        Returns:
+            168 rates or None if nothing was observed yet
+        """
+        totals = [0.0] * HOURS_PER_WEEK
+        observed = False
+        for profile in profiles:
+            entry = self.stats.get(profile)
+            if not entry or not sum(entry['exposure']):
+                continue
+            observed = True
+            mean = sum(entry['arrivals']) / sum(entry['exposure'])
+            for bucket in range(HOURS_PER_WEEK):
+                totals[bucket] += ((entry['arrivals'][bucket] + mean * PRIOR_HOURS)
+                                   / (entry['exposure'][bucket] + PRIOR_HOURS))
+        return totals if observed else None
+
+
+class AdaptiveSchedule:
+    """
+    Check interval that follows the observed publication pattern
+
+    The weekly request budget of the base interval is spread over the hours
+    of the week in proportion to the square root of their arrival rate, which
+    minimises the mean delay between publication and notification for a fixed
+    number of requests. Intervals stay within [min_hours, max_hours]; until
+    there is data the base interval is used.
+    """
+
+    def __init__(self, model: ArrivalModel, profiles: List[str], base_hours: float,
+                 min_hours: float, max_hours: float):
+        self.model = model
+        self.profiles = profiles
+        self.base_hours = base_hours
+        self.min_hours = min(min_hours, base_hours)
+        self.max_hours = max(max_hours, base_hours)
+
+    def _frequencies(self) -> List[float]:
+        """Checks per hour for every hour-of-week bucket"""
+        budget = HOURS_PER_WEEK / self.base_hours
+        rates = self.model.rates(self.profiles)
+        roots = [math.sqrt(rate) for rate in rates] if rates else []
+        total = sum(roots)
+        if not total:
+            return [1 / self.base_hours] * HOURS_PER_WEEK
+        return [
+            min(1 / self.min_hours, max(1 / self.max_hours, budget * root / total))
+            for root in roots
+        ]
+
+    def next_after(self, moment: datetime) -> datetime:
+        # Advance until one check's worth of frequency has accumulated, so a
+        # quiet hour right before a busy one doesn't delay the busy one
+        frequencies = self._frequencies()
+        remaining = 1.0
+        cursor = moment
+        limit = moment + timedelta(hours=self.max_hours)
+        while cursor < limit:
+            boundary = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            frequency = frequencies[hour_of_week(cursor)]
+            segment_hours = (boundary - cursor).total_seconds() / 3600
+            if frequency * segment_hours >= remaining:
+                cursor += timedelta(hours=remaining / frequency)
+                break
+            remaining -= frequency * segment_hours
+            cursor = boundary
+        return max(moment + timedelta(hours=self.min_hours), min(cursor, limit))
+
+    def describe(self) -> str:
+        return f"адаптивно, каждые {format_hours(self.min_hours)}–{format_hours(self.max_hours)}"
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from api_client import SearchResult
+from config import ERI_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class CachedObjectsAPI:
+    """
+    Single-flight and short-TTL cache in front of AbandonedObjectsAPI
+
+    Concurrent fetches with the same search payload share one upstream
+    request, and successful results are reused for ERI_CACHE_TTL seconds.
+    Failed fetches (None) are never cached. Everything else is delegated
+    to the wrapped client.
+    """
+
+    def __init__(self, api, ttl: float = ERI_CACHE_TTL):
+        self.api = api
+        self.ttl = ttl
+        self._results: Dict[Tuple[str, str], Tuple[float, SearchResult]] = {}
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def __getattr__(self, name):
+        return getattr(self.api, name)
+
+    def _key(self, kind: str, payload: Dict = None) -> Tuple[str, str]:
+        return kind, json.dumps(payload or self.api.payload, sort_keys=True, ensure_ascii=False)
+
+    def _store(self, key: Tuple[str, str], future: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        if result is None or self.ttl <= 0:
+            return
+        now = time.monotonic()
+        # Drop expired entries so payloads that are no longer used don't pile up
+        for stale in [k for k, (stored_at, _) in self._results.items() if now - stored_at >= self.ttl]:
+            del self._results[stale]
+        self._results[key] = (now, result)
+
+    async def _single_flight(self, key: Tuple[str, str],
+                             fetch: Callable[[], Awaitable[Optional[SearchResult]]]) -> Optional[SearchResult]:
+        cached = self._results.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            logger.info(f"Using cached {key[0]} result ({len(cached[1].objects)} objects)")
+            return self._copy(cached[1])
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fetch())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._store(key, done))
+        else:
+            logger.info(f"Joining in-flight {key[0]} request")
+
+        # Shielded so a cancelled caller doesn't cancel the fetch for the others
+        result = await asyncio.shield(future)
+        return self._copy(result) if result is not None else None
+
+    @staticmethod
+    def _copy(result: SearchResult) -> SearchResult:
+        """Copy of a shared result, so callers can't change the cached object list"""
+        return SearchResult(list(result.objects), result.complete)
+
+    async def fetch_abandoned_objects(self, payload: Dict = None) -> Optional[SearchResult]:
+        """Fetch all objects for a payload, sharing in-flight and recent results"""
+        return await self._single_flight(
+            self._key('full', payload), lambda: self.api.fetch_abandoned_objects(payload)
+        )
+
+    async def fetch_new_objects(self, is_known: Callable[[Dict], bool], payload: Dict = None,
+                                stop_date: str = None) -> Optional[SearchResult]:
+        """
+        Incrementally fetch unseen objects, sharing in-flight and recent results
+
+        Callers that join an in-flight request get the result computed with the
+        first caller's is_known predicate and stop_date; new objects are filtered against the
+        state store afterwards anyway, so this only affects what is re-checked.
+        """
+        return await self._single_flight(
+            self._key('incremental', payload), lambda: self.api.fetch_new_objects(is_known, payload, stop_date)
+        )
+
+    def invalidate(self):
+        """Forget cached results (in-flight requests are still shared)"""
+        self._results.clear()
@@ -1,92 +1,453 @@
-import requests
+import asyncio
+import aiohttp
 import json
 import logging
-# time and random imports removed - no delays needed
-from typing import List, Dict, Optional
-from config import API_URL, VIEW_URL_BASE, SEARCH_PAYLOAD, HTTP_PROXY, HTTPS_PROXY
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Optional, AsyncIterator, Awaitable, Callable
+from config import (
+    API_URL, VIEW_URL_BASE, SEARCH_PAYLOAD, HTTP_PROXY, HTTPS_PROXY,
+    FETCH_CONCURRENCY, MAX_PAGES, ERI_REQUEST_TIMEOUT, ERI_STREAM_JSON,
+    ERI_CAPTURE_FILE, ERI_REPLAY_FILE, ERI_REPLAY_SPEED,
+    ERI_BREAKER_THRESHOLD, ERI_BREAKER_BASE_SECONDS, ERI_BREAKER_MAX_SECONDS
+)
+from http_transport import HttpTransport
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from eri_capture import CaptureWriter, CaptureReplay
+from json_stream import SearchResponseParser
+from metrics import ERI_REQUESTS, ERI_REQUEST_SECONDS
+from change_detection import CHANGE_FIELDS
+from object_details import DETAIL_FIELDS
 
 logger = logging.getLogger(__name__)
 
+# Failures that open the circuit at once: the endpoint is refusing us
+TRIP_AT_ONCE = ('forbidden', 'rate_limited')
+# Object fields kept by the streaming decoder: everything the bot reads
+STREAM_FIELDS = tuple(dict.fromkeys(('id', 'position', 'eventDate') + CHANGE_FIELDS + DETAIL_FIELDS))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def classify_error(e: Exception) -> str:
+    """
+    Classify a fetch failure
+    
+    Returns:
+        'forbidden', 'rate_limited', 'server', 'client', 'timeout',
+        'network', 'parse', 'circuit_open' or 'unexpected'
+    """
+    if isinstance(e, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(e, aiohttp.ClientResponseError):
+        if e.status == 403:
+            return 'forbidden'
+        if e.status == 429:
+            return 'rate_limited'
+        return 'server' if e.status >= 500 else 'client'
+    if isinstance(e, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(e, aiohttp.ClientError):
+        return 'network'
+    if isinstance(e, json.JSONDecodeError):
+        return 'parse'
+    return 'unexpected'
+
+
+@dataclass
+class SearchResult:
+    """Objects returned by a search"""
+
+    objects: List[Dict]
+    # False if objects of the result set may be missing: only the unseen head was
+    # fetched, MAX_PAGES cut it short or it changed while the pages were read
+    complete: bool = True
+
 
 class AbandonedObjectsAPI:
     """Client for working with abandoned objects API"""
     
-    def __init__(self):
+    def __init__(self, transport: HttpTransport = None, concurrency: int = FETCH_CONCURRENCY,
+                 stream_json: bool = ERI_STREAM_JSON, capture: CaptureWriter = None,
+                 replay: CaptureReplay = None):
         self.api_url = API_URL
         self.view_url_base = VIEW_URL_BASE
         # Use configured search payload
         self.payload = SEARCH_PAYLOAD.copy()
-        # Create session for connection reuse
-        self.session = requests.Session()
+        self.concurrency = max(1, concurrency)
+        # Decode search responses incrementally, keeping only STREAM_FIELDS
+        self.stream_json = stream_json
+        # Shared connection pool (created lazily on first request)
+        self.transport = transport or HttpTransport()
+        # Stops requests to eri2.nca.by while it is blocking us or down. Detail (forView)
+        # requests have their own, a slow detail endpoint must not stop checks or raise outage alerts
+        self.breaker = CircuitBreaker('eri2.nca.by', ERI_BREAKER_THRESHOLD,
+                                      ERI_BREAKER_BASE_SECONDS, ERI_BREAKER_MAX_SECONDS)
+        self.detail_breaker = CircuitBreaker('eri2.nca.by details', ERI_BREAKER_THRESHOLD,
+                                             ERI_BREAKER_BASE_SECONDS, ERI_BREAKER_MAX_SECONDS)
+        self.last_error: Optional[str] = None
+        # Recording of every exchange, and recorded responses served instead of the API
+        self.capture = capture or (CaptureWriter(ERI_CAPTURE_FILE) if ERI_CAPTURE_FILE else None)
+        self.replay = replay or (CaptureReplay(ERI_REPLAY_FILE, ERI_REPLAY_SPEED) if ERI_REPLAY_FILE else None)
+        if self.replay is not None:
+            logger.info(f"Replaying ERI responses from {self.replay.path} at {self.replay.speed}x")
     
-    def fetch_abandoned_objects(self) -> Optional[List[Dict]]:
+    def _build_headers(self) -> Dict[str, str]:
+        """Browser-like headers expected by eri2.nca.by"""
+        return {
+            'Content-Type': 'application/json',
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'application/json, text/plain, */*',
+            'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Origin': 'https://eri2.nca.by',
+            'Referer': 'https://eri2.nca.by/',
+            'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+            'Sec-Ch-Ua-Mobile': '?0',
+            'Sec-Ch-Ua-Platform': '"Windows"',
+            'Sec-Fetch-Dest': 'empty',
+            'Sec-Fetch-Mode': 'cors',
+            'Sec-Fetch-Site': 'same-origin',
+            'DNT': '1',
+            'Cache-Control': 'no-cache',
+            'Pragma': 'no-cache'
+        }
+    
+    def _get_proxy(self) -> Optional[str]:
+        """Proxy for eri2.nca.by requests, None if not configured"""
+        if self.api_url.startswith('https'):
+            return HTTPS_PROXY or HTTP_PROXY
+        return HTTP_PROXY
+    
+    async def fetch_page(self, page_number: int, payload: Dict = None) -> Dict:
         """
-        Fetch abandoned objects from the API
+        Fetch a single page of search results
         
+        Args:
+            page_number: Zero-based page number
+            payload: Search payload, the configured one if None
+            
         Returns:
-            List of abandoned objects or None if error occurred
+            The 'data' section of the API response (content, totalElements, ...)
+            
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError on failure,
+            CircuitOpenError without a request while the circuit is open
         """
+        return await self._call_guarded(lambda: self._request_page(page_number, payload))
+    
+    async def _call_guarded(self, request: Callable[[], Awaitable], endpoint: str = 'search'):
+        """Run a request through the endpoint's circuit breaker and report its outcome and latency"""
+        breaker = self.detail_breaker if endpoint == 'details' else self.breaker
         try:
-            # No delay - removed as requested
-            headers = {
-                'Content-Type': 'application/json',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Origin': 'https://eri2.nca.by',
-                'Referer': 'https://eri2.nca.by/',
-                'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-                'Sec-Ch-Ua-Mobile': '?0',
-                'Sec-Ch-Ua-Platform': '"Windows"',
-                'Sec-Fetch-Dest': 'empty',
-                'Sec-Fetch-Mode': 'cors',
-                'Sec-Fetch-Site': 'same-origin',
-                'DNT': '1',
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache'
-            }
-            
-            # Convert payload to JSON string with proper formatting
-            json_payload = json.dumps(self.payload)
-            logger.info(f"Sending request with payload: {json_payload}")
-
-            # Setup proxies if configured
-            proxies = {}
-            if HTTP_PROXY:
-                proxies['http'] = HTTP_PROXY
-            if HTTPS_PROXY:
-                proxies['https'] = HTTPS_PROXY
+            breaker.before_request()
+        except CircuitOpenError:
+            ERI_REQUESTS.inc(endpoint=endpoint, outcome='circuit_open')
+            raise
+        start = time.perf_counter()
+        try:
+            result = await request()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            kind = classify_error(e)
+            ERI_REQUESTS.inc(endpoint=endpoint, outcome=kind)
+            ERI_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            if kind == 'client':
+                # The endpoint answered, the request itself is wrong
+                breaker.record_success()
+            else:
+                breaker.record_failure(kind, trip=kind in TRIP_AT_ONCE)
+            raise
+        ERI_REQUESTS.inc(endpoint=endpoint, outcome='ok')
+        ERI_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        breaker.record_success()
+        return result
+    
+    async def _request_page(self, page_number: int, payload: Dict = None) -> Dict:
+        """Send a single search request, see fetch_page"""
+        payload = dict(payload or self.payload, pageNumber=page_number)
+        json_payload = json.dumps(payload)
+        logger.info(f"Sending request with payload: {json_payload}")
+        if self.replay is not None:
+            data = json.loads(await self.replay.search(payload, self.api_url))
+            return data.get('data') or {}
+        
+        proxy = self._get_proxy()
+        if proxy:
+            logger.info(f"Using proxy: {proxy}")
+        
+        start = time.perf_counter()
+        session = await self.transport.get_session()
+        async with session.post(
+            self.api_url,
+            data=json_payload,
+            headers=self._build_headers(),
+            proxy=proxy,
+            timeout=aiohttp.ClientTimeout(total=ERI_REQUEST_TIMEOUT)
+        ) as response:
+            if self.capture is not None:
+                # The raw body is recorded, so it is read whole even with stream_json
+                body = await response.text()
+                self.capture.record('search', payload, response.status, body, time.perf_counter() - start)
+                response.raise_for_status()
+            else:
+                response.raise_for_status()
+                if self.stream_json:
+                    return await self._read_streamed(response)
+                body = await response.text()
+        
+        data = json.loads(body)
+        return data.get('data') or {}
+    
+    @staticmethod
+    async def _read_streamed(response: aiohttp.ClientResponse) -> Dict:
+        """
+        Decode a search response from the stream without buffering the body
+        
+        Only the raw body and the unused fields are dropped: the slimmed
+        objects are still collected into the page's content list.
+        """
+        parser = SearchResponseParser(STREAM_FIELDS)
+        content = []
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            content.extend(parser.feed(chunk))
+        data = parser.close()
+        data['content'] = content
+        return data
+    
+    async def fetch_object_details(self, object_id: int, etag: str = None,
+                                   last_modified: str = None) -> Optional[Dict]:
+        """
+        Fetch the detail record of an object from its forView endpoint
+        
+        With validators of a cached copy the request is conditional and an
+        unchanged record costs a 304 without a body.
+        
+        Args:
+            object_id: ID of the abandoned object
+            etag: ETag of the cached copy
+            last_modified: Last-Modified of the cached copy
             
-            if proxies:
-                logger.info(f"Using proxies: {proxies}")
-
-            response = self.session.post(
-                self.api_url,
-                data=json_payload,
-                headers=headers,
-                proxies=proxies if proxies else None,
-                timeout=30
-            )
+        Returns:
+            {'data': record or None if not modified, 'etag': ..., 'last_modified': ...}
+            or None if the request failed
+        """
+        try:
+            return await self._call_guarded(lambda: self._request_details(object_id, etag, last_modified),
+                                           endpoint='details')
+        except Exception as e:
+            logger.warning(f"Could not fetch details of object {object_id} ({classify_error(e)}): {e}")
+            return None
+    
+    async def _request_details(self, object_id: int, etag: str = None, last_modified: str = None) -> Dict:
+        """Send a single detail request, see fetch_object_details"""
+        headers = self._build_headers()
+        del headers['Content-Type']
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
+        if self.replay is not None:
+            status, body, validators = await self.replay.details(object_id, self.get_view_url(object_id), etag)
+            if status == 304:
+                return {'data': None, 'etag': etag, 'last_modified': last_modified}
+            return self._parse_details(body, validators.get('ETag'), validators.get('Last-Modified'))
+        
+        start = time.perf_counter()
+        session = await self.transport.get_session()
+        async with session.get(
+            self.get_view_url(object_id),
+            headers=headers,
+            proxy=self._get_proxy(),
+            timeout=aiohttp.ClientTimeout(total=ERI_REQUEST_TIMEOUT)
+        ) as response:
+            validators = {name: response.headers[name] for name in ('ETag', 'Last-Modified')
+                          if name in response.headers}
+            if self.capture is not None:
+                body = None if response.status == 304 else await response.text()
+                self.capture.record('details', {'id': object_id}, response.status, body,
+                                    time.perf_counter() - start, validators)
+            if response.status == 304:
+                return {'data': None, 'etag': etag, 'last_modified': last_modified}
             response.raise_for_status()
+            if self.capture is None:
+                body = await response.text()
+        
+        return self._parse_details(body, validators.get('ETag'), validators.get('Last-Modified'))
+    
+    @staticmethod
+    def _parse_details(body: str, etag: Optional[str], last_modified: Optional[str]) -> Dict:
+        """Decode a detail response body, see fetch_object_details"""
+        data = json.loads(body)
+        # Same envelope as search responses if present
+        if isinstance(data, dict) and isinstance(data.get('data'), dict):
+            data = data['data']
+        return {'data': data, 'etag': etag, 'last_modified': last_modified}
+    
+    def _get_total_pages(self, first_page: Dict, payload: Dict = None) -> int:
+        """
+        Work out the number of result pages from the first response
+        
+        Args:
+            first_page: 'data' section of the page 0 response
+            payload: Search payload the page was fetched with
             
-            data = response.json()
-            logger.info(f"API response received successfully")
+        Returns:
+            Total number of pages, capped by MAX_PAGES
+        """
+        page_size = (payload or self.payload).get('pageSize') or len(first_page.get('content') or []) or 1
+        total_pages = first_page.get('totalPages')
+        if total_pages is None:
+            total_elements = first_page.get('totalElements') or 0
+            total_pages = -(-total_elements // page_size)
+        if total_pages > MAX_PAGES:
+            logger.warning(f"Result set has {total_pages} pages, fetching only the first {MAX_PAGES}")
+            total_pages = MAX_PAGES
+        return max(total_pages, 1)
+    
+    async def iter_pages(self, payload: Dict = None) -> AsyncIterator[Dict]:
+        """
+        Fetch every page of the search result, yielding pages in order
+        
+        Page 0 is requested first to learn the total count, the remaining
+        pages are then fetched concurrently (at most FETCH_CONCURRENCY at a time).
+        
+        Args:
+            payload: Search payload, the configured one if None
+        
+        Yields:
+            'data' sections of the pages (content, totalElements, ...)
+            
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError on failure
+        """
+        first_page = await self.fetch_page(0, payload)
+        yield first_page
+        
+        total_pages = self._get_total_pages(first_page, payload)
+        if total_pages <= 1:
+            return
+        
+        logger.info(f"Fetching {total_pages - 1} more pages with concurrency {self.concurrency}")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def fetch_limited(page_number: int) -> Dict:
+            async with semaphore:
+                return await self.fetch_page(page_number, payload)
+        
+        tasks = [asyncio.create_task(fetch_limited(n)) for n in range(1, total_pages)]
+        try:
+            # Await in page order so pages can be consumed as they arrive
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def fetch_abandoned_objects(self, payload: Dict = None) -> Optional[SearchResult]:
+        """
+        Fetch abandoned objects from all result pages of the API
+        
+        The result is complete only if every page reports the same
+        totalElements and that many distinct objects were read: pages beyond
+        MAX_PAGES, or objects skipped because the result set changed between
+        page requests, make it incomplete. So does a response without
+        totalElements, an empty result included.
+        
+        Args:
+            payload: Search payload, the configured one if None
+            
+        Returns:
+            SearchResult or None if error occurred
+        """
+        try:
+            objects = []
+            seen_ids = set()
+            totals = set()
+            async for page in self.iter_pages(payload):
+                totals.add(page.get('totalElements'))
+                for obj in page.get('content') or []:
+                    # Objects may shift between pages while we read them
+                    if obj.get('id') in seen_ids:
+                        continue
+                    seen_ids.add(obj.get('id'))
+                    objects.append(obj)
             
-            if data.get('data') and data['data'].get('content'):
-                content = data['data']['content']
-                if content:  # Check if content is not empty/null
-                    logger.info(f"Found {len(content)} objects")
-                    return content
-                else:
-                    logger.info("API returned empty content - no objects match the search criteria")
-                    return []
+            total = next(iter(totals)) if len(totals) == 1 else None
+            complete = total is not None and len(objects) >= total
+            
+            self.last_error = None
+            logger.info(f"API response received successfully")
+            if objects:
+                logger.info(f"Found {len(objects)} objects")
             else:
-                logger.info("No content found in API response")
-                return []
+                logger.info("API returned empty content - no objects match the search criteria")
+            if not complete:
+                logger.warning(f"Incomplete result: {len(objects)} objects read, totalElements reported: "
+                               f"{sorted(totals, key=str)}; removed objects are not detected in this check")
+            return SearchResult(objects, complete)
+                
+        except Exception as e:
+            self._log_fetch_error(e)
+            return None
+    
+    async def fetch_new_objects(self, is_known: Callable[[Dict], bool], payload: Dict = None,
+                                stop_date: str = None) -> Optional[SearchResult]:
+        """
+        Incrementally fetch objects newer than the ones already seen
+        
+        Results are sorted newest-first, so pages are requested one by one
+        and paging stops at the first page that contains a known object or
+        an object older than stop_date. Every unknown object of the pages
+        read is returned, older ones included.
+        
+        Args:
+            is_known: Predicate telling whether an object was seen before
+            payload: Search payload, the configured one if None
+            stop_date: Event date (ISO format) to stop paging at, None to
+                stop at known objects only
+            
+        Returns:
+            SearchResult of the objects not known yet (never complete) or None if error occurred
+        """
+        try:
+            objects = []
+            page_number = 0
+            while True:
+                page = await self.fetch_page(page_number, payload)
+                content = page.get('content') or []
+                fresh = [obj for obj in content if not is_known(obj)]
+                objects.extend(fresh)
                 
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 403:
+                if len(fresh) < len(content) or not content:
+                    break
+                if stop_date and any(obj.get('eventDate') and obj['eventDate'] < stop_date for obj in content):
+                    break
+                if page_number + 1 >= self._get_total_pages(page, payload):
+                    break
+                page_number += 1
+            
+            self.last_error = None
+            logger.info(f"Incremental fetch: {len(objects)} unseen objects in {page_number + 1} page(s)")
+            return SearchResult(objects, complete=False)
+            
+        except Exception as e:
+            self._log_fetch_error(e)
+            return None
+    
+    def _log_fetch_error(self, e: Exception):
+        """Log a fetch failure with a hint about its likely cause"""
+        if isinstance(e, CircuitOpenError):
+            # Keep the cause of the outage rather than the fail-fast itself
+            self.last_error = e.last_failure
+        else:
+            self.last_error = classify_error(e)
+        if isinstance(e, CircuitOpenError):
+            logger.warning(f"Skipping request: {e}")
+        elif isinstance(e, aiohttp.ClientResponseError):
+            if e.status == 403:
                 logger.error(f"API access forbidden (403). This might be due to:")
                 logger.error("1. Server geolocation restrictions")
                 logger.error("2. Rate limiting or bot detection")
@@ -94,16 +455,14 @@ class AbandonedObjectsAPI:
                 logger.error("Consider using a VPS in Belarus or proxy if needed")
             else:
                 logger.error(f"HTTP error from API: {e}")
-            return None
-        except requests.exceptions.RequestException as e:
+        elif isinstance(e, asyncio.TimeoutError):
+            logger.error(f"Timeout fetching data from API after {ERI_REQUEST_TIMEOUT}s")
+        elif isinstance(e, aiohttp.ClientError):
             logger.error(f"Error fetching data from API: {e}")
-            return None
-        except json.JSONDecodeError as e:
+        elif isinstance(e, json.JSONDecodeError):
             logger.error(f"Error parsing JSON response: {e}")
-            return None
-        except Exception as e:
+        else:
             logger.error(f"Unexpected error: {e}")
-            return None
     
     def get_view_url(self, object_id: int) -> str:
         """
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for eri2.nca.by and the Telegram Bot API
+
+Usage:
+    python benchmarks/fake_servers.py --port 8780 --objects 10000 --latency 0.05
+
+Both APIs are served from one port:
+    POST /eri/search               search with pagination (pageNumber / pageSize, newest first)
+    GET  /eri/{id}/forView         object details with ETag / Last-Modified and 304 support
+    POST /bot{token}/getMe         bot info
+    POST /bot{token}/sendMessage   accepts messages, answers 429 with retry_after at --tg-429-rate
+    POST /bot{token}/getUpdates    long poll over updates queued with /_control
+    POST /bot{token}/{other}       {"ok": true, "result": true}
+    GET  /_stats                   request counters and the time of the first long poll
+    POST /_control                 change settings at runtime, e.g. {"objects": 10020},
+                                   or queue a command: {"command": "/status", "chat_id": 1},
+                                   {"reset_stats": true} clears the counters
+
+Objects are generated from their ID, so memory use does not depend on --objects.
+Point the bot at it with API_URL=http://127.0.0.1:8780/eri/search,
+VIEW_URL_BASE=http://127.0.0.1:8780/eri and TELEGRAM_API_BASE=http://127.0.0.1:8780.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BASE_EVENT_DATE = 1_700_000_000_000
+
+
+def make_object(object_id: int) -> dict:
+    """Search result entry with the shape of a real eri2.nca.by record"""
+    return {
+        'id': object_id,
+        'position': f"Минский р-н, д. Тестовая, ул. Лесная, {object_id}",
+        'eventDate': BASE_EVENT_DATE + object_id * 60_000,
+        'stateTypeId': 1 + object_id % 3,
+        'abandonedObjectTypeId': 1,
+        'ateId': 19824,
+        'moneyAmount': None,
+        'deterioration': None,
+        'emergency': False,
+        'destroyed': False,
+    }
+
+
+def make_details(object_id: int) -> dict:
+    return dict(make_object(object_id),
+                moneyAmount=round(37 + object_id % 100 * 0.5, 2),
+                deterioration=40 + object_id % 60,
+                inspectionDate=BASE_EVENT_DATE - (object_id % 365) * 86_400_000)
+
+
+class FakeServers:
+    """Settings, counters and handlers of both fake APIs"""
+
+    def __init__(self, objects: int, latency: float, error_rate: float, tg_latency: float,
+                 tg_429_rate: float, retry_after: int):
+        self.settings = {
+            'objects': objects,
+            'latency': latency,
+            'error_rate': error_rate,
+            'tg_latency': tg_latency,
+            'tg_429_rate': tg_429_rate,
+            'retry_after': retry_after,
+        }
+        self.stats = Counter()
+        self.updates = []
+        # Updates below this ID were dropped with drop_pending_updates
+        self.first_pending_update = 1
+        self._update_event = asyncio.Event()
+
+    async def _delay(self, key: str):
+        latency = self.settings[key]
+        if latency:
+            # Exponential around the mean, like a real upstream
+            await asyncio.sleep(random.expovariate(1 / latency))
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.stats['eri_search'] += 1
+        await self._delay('latency')
+        if random.random() < self.settings['error_rate']:
+            self.stats['eri_errors'] += 1
+            return web.Response(status=503, text='Service Unavailable')
+        payload = await request.json()
+        page_size = max(1, int(payload.get('pageSize') or 10))
+        page_number = int(payload.get('pageNumber') or 0)
+        total = self.settings['objects']
+        # Newest (highest ID) first, like sortBy=1 / sortDesc=true
+        first = total - page_number * page_size
+        ids = range(first, max(first - page_size, 0), -1)
+        return web.json_response({'data': {
+            'content': [make_object(object_id) for object_id in ids],
+            'totalElements': total,
+            'totalPages': -(-total // page_size),
+            'number': page_number,
+            'size': page_size,
+        }})
+
+    async def details(self, request: web.Request) -> web.Response:
+        self.stats['eri_details'] += 1
+        await self._delay('latency')
+        if random.random() < self.settings['error_rate']:
+            self.stats['eri_errors'] += 1
+            return web.Response(status=503, text='Service Unavailable')
+        object_id = int(request.match_info['object_id'])
+        etag = f'"{object_id}-1"'
+        if request.headers.get('If-None-Match') == etag:
+            self.stats['eri_not_modified'] += 1
+            return web.Response(status=304)
+        return web.json_response({'data': make_details(object_id)},
+                                 headers={'ETag': etag, 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+
+    async def telegram(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.stats[f'tg_{method}'] += 1
+        try:
+            params = await request.json()
+        except ValueError:
+            params = {}
+
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': {'id': 1, 'is_bot': True, 'username': 'fake_eri_bot'}})
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self._get_updates(params)})
+        if method in ('deleteWebhook', 'setWebhook') and params.get('drop_pending_updates'):
+            self.first_pending_update = len(self.updates) + 1
+        if method == 'sendMessage':
+            await self._delay('tg_latency')
+            if random.random() < self.settings['tg_429_rate']:
+                self.stats['tg_429'] += 1
+                retry_after = self.settings['retry_after']
+                return web.json_response({
+                    'ok': False, 'error_code': 429,
+                    'description': f'Too Many Requests: retry after {retry_after}',
+                    'parameters': {'retry_after': retry_after},
+                }, status=429)
+            self.stats['tg_delivered'] += 1
+            return web.json_response({'ok': True, 'result': {
+                'message_id': self.stats['tg_delivered'], 'chat': {'id': params.get('chat_id')},
+                'date': int(time.time()), 'text': params.get('text', ''),
+            }})
+        return web.json_response({'ok': True, 'result': True})
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = max(params.get('offset') or 0, self.first_pending_update)
+        if params.get('timeout'):
+            # When the bot started listening for commands, for cold start measurements
+            self.stats.setdefault('tg_first_long_poll_at', time.time())
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        while True:
+            updates = [update for update in self.updates if update['update_id'] >= offset][:params.get('limit', 100)]
+            remaining = deadline - time.monotonic()
+            if updates or remaining <= 0:
+                return updates
+            self._update_event.clear()
+            try:
+                await asyncio.wait_for(self._update_event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def control(self, request: web.Request) -> web.Response:
+        changes = await request.json()
+        if changes.pop('reset_stats', False):
+            self.stats.clear()
+        command = changes.pop('command', None)
+        chat_id = changes.pop('chat_id', 1)
+        unknown = set(changes) - set(self.settings)
+        if unknown:
+            return web.json_response({'error': f"unknown settings {sorted(unknown)}"}, status=400)
+        self.settings.update(changes)
+        if command:
+            update_id = len(self.updates) + 1
+            self.updates.append({'update_id': update_id, 'message': {
+                'message_id': update_id, 'date': int(time.time()), 'text': command,
+                'chat': {'id': chat_id, 'type': 'private'},
+            }})
+            self._update_event.set()
+        return web.json_response(self.settings)
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats, **self.settings))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/eri/search', self.search)
+        app.router.add_get('/eri/{object_id}/forView', self.details)
+        app.router.add_post('/bot{token}/{method}', self.telegram)
+        app.router.add_post('/_control', self.control)
+        app.router.add_get('/_stats', self.get_stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--objects', type=int, default=1000, help='Objects in the search result')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean ERI response latency, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of ERI requests answered 503')
+    parser.add_argument('--tg-latency', type=float, default=0.0, help='Mean sendMessage latency, seconds')
+    parser.add_argument('--tg-429-rate', type=float, default=0.0, help='Fraction of sendMessage answered 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after of 429 responses, seconds')
+    args = parser.parse_args()
+
+    async def run():
+        servers = FakeServers(args.objects, args.latency, args.error_rate, args.tg_latency,
+                              args.tg_429_rate, args.retry_after)
+        runner = web.AppRunner(servers.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, args.host, args.port).start()
+        print(f"Fake ERI and Telegram APIs listening on http://{args.host}:{args.port}", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
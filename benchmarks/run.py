@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Scenario benchmarks of the check pipeline against local fake servers
+
+Usage:
+    python benchmarks/run.py                           # full matrix: 10..100k objects x 1..1000 chats
+    python benchmarks/run.py --quick --output bench.json
+    python benchmarks/run.py --quick --baseline bench.json --tolerance 0.5
+    python benchmarks/run.py --objects 1000 --chats 1 --latency 0.3 --tg-latency 0.1   # slow upstreams
+
+Every scenario runs in a fresh process and temporary working directory:
+    1. seed: full fetch and diff of --objects objects into an empty state (no notifications)
+    2. notify: --new objects appear, a scheduled check fetches, diffs, renders and sends
+       them to every one of --chats chats
+    3. idle: a check that finds nothing new
+and reports the latency of each step, messages per second of the notify step and the
+peak RSS of the bot process. Telegram rate limits are lifted (see --telegram-rate) so the
+numbers reflect the bot, not the sleeps of its rate limiter.
+
+Cold start is measured per --objects size as well: simple_bot.py is started as a
+process, once with empty state (first start) and once more with the state it saved
+(restart), and the time until its first getUpdates long poll is reported.
+
+With --baseline the results are compared with a previous --output file and the exit
+code is 1 if a scenario got slower, lower in throughput or bigger by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULT_PREFIX = 'BENCH_RESULT '
+# Metrics compared with the baseline: name -> True if higher is better
+COMPARED = {
+    'seed_seconds': False,
+    'notify_seconds': False,
+    'idle_seconds': False,
+    'messages_per_second': True,
+    'peak_rss_mb': False,
+    'first_start_seconds': False,
+    'restart_seconds': False,
+}
+# Latency changes smaller than this are timer noise, not regressions
+MIN_SECONDS_DELTA = 0.05
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _control(base_url: str, **settings):
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{base_url}/_control", json=settings) as response:
+            response.raise_for_status()
+
+
+async def run_single(args) -> dict:
+    """Run one scenario inside this process (cwd is a scratch directory)"""
+    chat_ids = list(range(1, args.chats + 1))
+    with open('subscribers.json', 'w', encoding='utf-8') as f:
+        json.dump({str(chat_id): {'profiles': ['default']} for chat_id in chat_ids}, f)
+
+    sys.path.insert(0, str(ROOT))
+    import simple_bot
+    from metrics import MESSAGES
+
+    bot = simple_bot.SimpleEriBot()
+    try:
+        await _control(args.base_url, objects=args.objects)
+        started = time.perf_counter()
+        fetch_result = await bot.fetch_current_objects()
+        if fetch_result is None:
+            raise RuntimeError(f"Seed fetch failed: {bot.api_client.last_error}")
+        bot.detect_changes(fetch_result)
+        seed_seconds = time.perf_counter() - started
+
+        await _control(args.base_url, objects=args.objects + args.new)
+        sent_before = MESSAGES.value(result='sent')
+        failed_before = MESSAGES.value(result='failed')
+        started = time.perf_counter()
+        await bot.check_and_notify()
+        notify_seconds = time.perf_counter() - started
+        sent = MESSAGES.value(result='sent') - sent_before
+        failed = MESSAGES.value(result='failed') - failed_before
+
+        started = time.perf_counter()
+        await bot.check_and_notify()
+        idle_seconds = time.perf_counter() - started
+    finally:
+        await bot.send_queue.stop()
+        await bot.transport.close()
+
+    return {
+        'objects': args.objects,
+        'chats': args.chats,
+        'new': args.new,
+        'seed_seconds': round(seed_seconds, 4),
+        'notify_seconds': round(notify_seconds, 4),
+        'idle_seconds': round(idle_seconds, 4),
+        'messages': int(sent),
+        'failed_messages': int(failed),
+        'messages_per_second': round(sent / notify_seconds, 1) if notify_seconds else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def scenario_env(args, base_url: str) -> dict:
+    rate = str(args.telegram_rate or 1_000_000)
+    env = {key: value for key, value in os.environ.items() if key not in ('HTTP_PROXY', 'HTTPS_PROXY')}
+    env.update({
+        'API_URL': f"{base_url}/eri/search",
+        'VIEW_URL_BASE': f"{base_url}/eri",
+        'TELEGRAM_API_BASE': base_url,
+        'TELEGRAM_BOT_TOKEN': 'bench',
+        'TELEGRAM_CHAT_ID': '1',
+        'PAGE_SIZE': str(args.page_size),
+        'MAX_PAGES': str(10**6),
+        'STATE_BACKEND': args.backend,
+        'ERI_STREAM_JSON': 'true' if args.stream else 'false',
+        'INCREMENTAL_FETCH': 'false',
+        # A cached seed result would hide the new objects
+        'ERI_CACHE_TTL': '0',
+        'TELEGRAM_GLOBAL_RATE': rate,
+        'TELEGRAM_CHAT_RATE': rate,
+        'TELEGRAM_GROUP_RATE': rate,
+        'METRICS_PORT': '0',
+        'SLOW_CHECK_SECONDS': '0',
+    })
+    return env
+
+
+def run_scenario(args, base_url: str, objects: int, chats: int) -> dict:
+    command = [sys.executable, str(Path(__file__).resolve()), '--single', '--base-url', base_url,
+               '--objects', str(objects), '--chats', str(chats), '--new', str(args.new)]
+    with tempfile.TemporaryDirectory(prefix='eri-bench-') as workdir:
+        completed = subprocess.run(command, cwd=workdir, env=scenario_env(args, base_url),
+                                   capture_output=True, text=True, timeout=args.timeout)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    tail = '\n'.join((completed.stderr or completed.stdout).splitlines()[-20:])
+    raise RuntimeError(f"Scenario {objects} objects x {chats} chats failed:\n{tail}")
+
+
+def _stats(base_url: str) -> dict:
+    # Straight to localhost, whatever proxies the environment configures
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    with opener.open(f"{base_url}/_stats") as response:
+        return json.loads(response.read())
+
+
+def time_to_first_poll(args, base_url: str, workdir: str) -> float:
+    """Start simple_bot.py in workdir and return seconds until its first long poll"""
+    asyncio.run(_control(base_url, reset_stats=True))
+    started = time.time()
+    process = subprocess.Popen([sys.executable, str(ROOT / 'simple_bot.py')], cwd=workdir,
+                               env=scenario_env(args, base_url),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.time() - started < args.timeout:
+            first_poll_at = _stats(base_url).get('tg_first_long_poll_at')
+            if first_poll_at:
+                return first_poll_at - started
+            if process.poll() is not None:
+                raise RuntimeError(f"simple_bot.py exited with code {process.returncode} before polling")
+            time.sleep(0.02)
+        raise RuntimeError('simple_bot.py did not start polling in time')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run_cold_start(args, base_url: str, objects: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix='eri-bench-') as workdir:
+        asyncio.run(_control(base_url, objects=objects))
+        first_start = time_to_first_poll(args, base_url, workdir)
+        restart = time_to_first_poll(args, base_url, workdir)
+    return {
+        'scenario': 'cold_start',
+        'objects': objects,
+        'first_start_seconds': round(first_start, 4),
+        'restart_seconds': round(restart, 4),
+    }
+
+
+def _key(item: dict) -> tuple:
+    return item.get('scenario', 'check'), item['objects'], item.get('chats')
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Regressions of results against baseline, as human readable lines"""
+    previous = {_key(item): item for item in baseline}
+    regressions = []
+    for item in results:
+        old = previous.get(_key(item))
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            if not old.get(metric) or metric not in item:
+                continue
+            if metric.endswith('_seconds') and abs(item[metric] - old[metric]) < MIN_SECONDS_DELTA:
+                continue
+            change = item[metric] / old[metric] - 1
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{_describe(item)}: {metric} "
+                                   f"{old[metric]} -> {item[metric]} ({change:+.0%})")
+    return regressions
+
+
+def _describe(item: dict) -> str:
+    if item.get('scenario') == 'cold_start':
+        return f"cold start with {item['objects']} objects"
+    return f"{item['objects']} objects x {item['chats']} chats"
+
+
+def print_table(results: list):
+    header = ('objects', 'chats', 'seed s', 'notify s', 'idle s', 'msgs', 'msg/s', 'peak MB')
+    print(' '.join(f"{title:>9}" for title in header))
+    for item in results:
+        if item.get('scenario') == 'cold_start':
+            continue
+        row = (item['objects'], item['chats'], item['seed_seconds'], item['notify_seconds'],
+               item['idle_seconds'], item['messages'], item['messages_per_second'], item['peak_rss_mb'])
+        print(' '.join(f"{value:>9}" for value in row))
+    cold_starts = [item for item in results if item.get('scenario') == 'cold_start']
+    if not cold_starts:
+        # --no-cold-start
+        return
+    print()
+    print(f"{'objects':>9} {'first start s':>14} {'restart s':>10}   (time to first poll)")
+    for item in cold_starts:
+        print(f"{item['objects']:>9} {item['first_start_seconds']:>14} {item['restart_seconds']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', default='10,1000,10000,100000', help='Comma separated result sizes')
+    parser.add_argument('--chats', default='1,100,1000', help='Comma separated subscriber counts')
+    parser.add_argument('--quick', action='store_true', help='Small matrix for CI: 10,1000 objects x 1,100 chats')
+    parser.add_argument('--new', type=int, default=20, help='New objects in the notify step')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--backend', default='json', choices=('json', 'sqlite', 'index'))
+    parser.add_argument('--stream', action='store_true', help='Use the streaming JSON decoder')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean ERI latency of the fake server, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of ERI requests failing with 503')
+    parser.add_argument('--tg-latency', type=float, default=0.0, help='Mean sendMessage latency, seconds')
+    parser.add_argument('--tg-429-rate', type=float, default=0.0, help='Fraction of sendMessage answered 429')
+    parser.add_argument('--telegram-rate', type=float, default=0.0,
+                        help='Bot send rate limits, messages/s (0 lifts them)')
+    parser.add_argument('--no-cold-start', action='store_true', help='Skip the cold start measurements')
+    parser.add_argument('--timeout', type=float, default=1800, help='Seconds per scenario')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--baseline', help='Results JSON to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative regression')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        args.objects, args.chats = int(args.objects), int(args.chats)
+        print(RESULT_PREFIX + json.dumps(asyncio.run(run_single(args))), flush=True)
+        return
+
+    if args.quick:
+        args.objects, args.chats = '10,1000', '1,100'
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / 'benchmarks' / 'fake_servers.py'), '--port', str(port),
+         '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+         '--tg-latency', str(args.tg_latency), '--tg-429-rate', str(args.tg_429_rate)],
+        stdout=subprocess.PIPE, text=True
+    )
+    results = []
+    try:
+        server.stdout.readline()  # Wait until it listens
+        for objects in (int(value) for value in args.objects.split(',')):
+            for chats in (int(value) for value in args.chats.split(',')):
+                result = run_scenario(args, base_url, objects, chats)
+                results.append(result)
+                print(f"{objects} objects x {chats} chats: notify {result['notify_seconds']}s, "
+                      f"{result['messages_per_second']} msg/s, peak {result['peak_rss_mb']} MB", flush=True)
+            if not args.no_cold_start:
+                result = run_cold_start(args, base_url, objects)
+                results.append(result)
+                print(f"cold start with {objects} objects: first poll after {result['first_start_seconds']}s, "
+                      f"{result['restart_seconds']}s on restart", flush=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print()
+    print_table(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding='utf-8')
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding='utf-8')), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# Fields whose changes are reported for known objects, at most 64 // FIELD_HASH_BITS
+CHANGE_FIELDS = ('stateTypeId', 'moneyAmount', 'deterioration', 'eventDate')
+# Every field gets its own slice of the 64-bit content hash, so a changed hash
+# also tells which fields changed without storing old values
+FIELD_HASH_BITS = 16
+_FIELD_MASK = (1 << FIELD_HASH_BITS) - 1
+
+
+def _field_hash(value) -> int:
+    digest = hashlib.blake2b(repr(value).encode(), digest_size=FIELD_HASH_BITS // 8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def content_hash(obj: Dict) -> int:
+    """
+    Compact hash of the CHANGE_FIELDS of an object
+
+    Returns:
+        Signed 64-bit integer (fits SQLite INTEGER and array('q'))
+    """
+    value = 0
+    for position, key in enumerate(CHANGE_FIELDS):
+        value |= _field_hash(obj.get(key)) << (position * FIELD_HASH_BITS)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def changed_fields(old_hash: int, new_hash: int) -> List[str]:
+    """Names of the fields whose slices differ between two content hashes"""
+    diff = (old_hash ^ new_hash) & ((1 << 64) - 1)
+    return [key for position, key in enumerate(CHANGE_FIELDS)
+            if (diff >> (position * FIELD_HASH_BITS)) & _FIELD_MASK]
+
+
+@dataclass
+class ChangeSet:
+    """Result of comparing a fetch with saved state"""
+
+    new: List[Dict] = field(default_factory=list)
+    # Known objects whose fields changed, with the names of the changed fields
+    updated: List[Tuple[Dict, List[str]]] = field(default_factory=list)
+    # IDs that were tracked but are no longer returned (full fetches only)
+    removed: List[int] = field(default_factory=list)
+    # Removed ID -> names of the profiles that last returned it (IDs saved
+    # before profiles were tracked are left out)
+    removed_profiles: Dict[int, List[str]] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.new or self.updated or self.removed)
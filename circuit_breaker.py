@@ -0,0 +1,107 @@
+import logging
+import random
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit is open"""
+
+    def __init__(self, name: str, retry_in: float, last_failure: Optional[str]):
+        super().__init__(f"Circuit '{name}' is open after {last_failure} errors, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+        self.last_failure = last_failure
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker with exponential backoff
+
+    After failure_threshold consecutive failures (or one failure reported
+    with trip=True) the circuit opens and requests fail fast. The open period
+    doubles with every consecutive opening, from base_delay up to max_delay,
+    and is randomised by jitter. When it ends a single probe request is let
+    through; success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name: str, failure_threshold: int, base_delay: float, max_delay: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openings = 0
+        self.open_until = 0.0
+        self.last_failure: Optional[str] = None
+        self._probe_in_flight = False
+
+    @property
+    def retry_in(self) -> float:
+        """Seconds until requests are allowed again (0 if they are allowed now)"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_until - time.monotonic())
+
+    def before_request(self):
+        """
+        Check that a request may be sent
+
+        Raises:
+            CircuitOpenError if the circuit is open or a half-open probe is in flight
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() < self.open_until:
+                raise CircuitOpenError(self.name, self.retry_in, self.last_failure)
+            self.state = self.HALF_OPEN
+            logger.info(f"Circuit '{self.name}' half-open, sending a probe request")
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.name, 0.0, self.last_failure)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        if self.state == self.OPEN:
+            # A request started before the circuit opened, the probe decides
+            return
+        if self.state == self.HALF_OPEN:
+            logger.info(f"Circuit '{self.name}' closed, endpoint recovered")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openings = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, kind: str, trip: bool = False):
+        """
+        Register a failed request
+
+        Args:
+            kind: Failure class, e.g. 'forbidden' or 'timeout'
+            trip: Open the circuit right away regardless of the threshold
+        """
+        self.last_failure = kind
+        if self.state == self.OPEN:
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or trip or self.failures >= self.failure_threshold:
+            self._open()
+
+    def release(self):
+        """Forget a request that ended without a result (e.g. it was cancelled)"""
+        self._probe_in_flight = False
+
+    def _open(self):
+        delay = min(self.max_delay, self.base_delay * 2 ** self.openings) * random.uniform(0.5, 1.0)
+        self.openings += 1
+        self.state = self.OPEN
+        self.open_until = time.monotonic() + delay
+        self.failures = 0
+        self._probe_in_flight = False
+        logger.warning(f"Circuit '{self.name}' opened after {self.last_failure} error, "
+                       f"retry in {delay:.0f}s")
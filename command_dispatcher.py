@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import COMMAND_CONCURRENCY
+from metrics import COMMANDS, COMMAND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def parse_command(text: str) -> Tuple[str, List[str]]:
+    """Split a command message: "/start@bot_name arg" (as sent in groups) -> ("/start", ["arg"])"""
+    parts = text.split()
+    if not parts:
+        return '', []
+    return parts[0].split('@')[0], parts[1:]
+
+
+@dataclass
+class Command:
+    """Registered bot command"""
+
+    name: str
+    # Called with (chat_id, args)
+    handler: Callable[[Any, List[str]], Awaitable]
+    # Available to chats that are not subscribed
+    public: bool = False
+
+
+class CommandDispatcher:
+    """
+    Command registry that runs every command as its own task
+
+    Commands of one chat run one at a time in arrival order, at most
+    `concurrency` run at once over all chats, so a slow command (e.g. /check
+    waiting for eri2.nca.by) holds up only later commands of its own chat.
+    A command identical to one of the same chat that is still queued or
+    running is folded into it instead of running again.
+    """
+
+    def __init__(self, concurrency: int = COMMAND_CONCURRENCY,
+                 authorize: Optional[Callable[[Any], Awaitable[bool]]] = None,
+                 on_error: Optional[Callable[[Any, str, Exception], Awaitable]] = None):
+        """
+        Args:
+            concurrency: Commands running at once over all chats
+            authorize: Called before non-public commands, returns False to skip the command
+            on_error: Called with (chat_id, command, exception) when a handler fails
+        """
+        self.commands: Dict[str, Command] = {}
+        self.authorize = authorize
+        self.on_error = on_error
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        # Per chat: lock serializing its commands and the number of tasks using it
+        self._chats: Dict[str, List] = {}
+        # (chat, command text) -> queued or running task
+        self._pending: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def register(self, name: str, handler: Callable[[Any, List[str]], Awaitable], public: bool = False):
+        self.commands[name] = Command(name, handler, public)
+
+    def names(self) -> List[str]:
+        return list(self.commands)
+
+    def running(self) -> int:
+        """Commands queued or running"""
+        return len(self._pending)
+
+    def dispatch(self, chat_id, text: str) -> Optional[asyncio.Task]:
+        """
+        Start a command without waiting for it
+
+        Args:
+            chat_id: Chat that sent the command
+            text: Message text, e.g. "/start@bot_name default"
+
+        Returns:
+            Task running the command (the existing one if it was folded), None if unknown
+        """
+        name, args = parse_command(text)
+        command = self.commands.get(name)
+        if command is None:
+            logger.debug(f"Ignoring unknown command {name} from chat {chat_id}")
+            return None
+
+        key = (str(chat_id), ' '.join([name] + args))
+        task = self._pending.get(key)
+        if task is not None:
+            COMMANDS.inc(command=name, result='debounced')
+            logger.info(f"Command {key[1]} from chat {chat_id} is already pending, not repeating it")
+            return task
+
+        task = asyncio.create_task(self._run(command, chat_id, args, key))
+        self._pending[key] = task
+        return task
+
+    async def _run(self, command: Command, chat_id, args: List[str], key: Tuple[str, str]):
+        chat = self._chats.setdefault(key[0], [asyncio.Lock(), 0])
+        chat[1] += 1
+        try:
+            # Chat first: a chat's queued commands must not take global slots while waiting
+            async with chat[0], self._semaphore:
+                await self._execute(command, chat_id, args)
+        finally:
+            chat[1] -= 1
+            if not chat[1]:
+                del self._chats[key[0]]
+            self._pending.pop(key, None)
+
+    async def _execute(self, command: Command, chat_id, args: List[str]):
+        start = time.perf_counter()
+        result = 'ok'
+        try:
+            if not command.public and self.authorize is not None and not await self.authorize(chat_id):
+                result = 'denied'
+                return
+            await command.handler(chat_id, args)
+        except asyncio.CancelledError:
+            result = 'cancelled'
+            raise
+        except Exception as e:
+            result = 'error'
+            logger.error(f"Error handling command {command.name}: {e}")
+            if self.on_error is not None:
+                await self.on_error(chat_id, command.name, e)
+        finally:
+            COMMANDS.inc(command=command.name, result=result)
+            COMMAND_SECONDS.observe(time.perf_counter() - start, command=command.name)
@@ -3,6 +3,10 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Directory of the files the bot writes and must keep across restarts (state, subscribers).
+# The docker-compose setup mounts ./data there as /app/data
+DATA_DIR = os.getenv('DATA_DIR', '.')
+
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
@@ -10,7 +14,75 @@ TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 # API Configuration
 API_URL = os.getenv('API_URL', 'https://eri2.nca.by/api/guest/abandonedObject/search')
 VIEW_URL_BASE = os.getenv('VIEW_URL_BASE', 'https://eri2.nca.by/api/guest/abandonedObject')
-CHECK_INTERVAL_HOURS = int(os.getenv('CHECK_INTERVAL_HOURS', 1))
+CHECK_INTERVAL_HOURS = float(os.getenv('CHECK_INTERVAL_HOURS', 1))
+# Optional cron spec in Minsk time ("minute hour day month weekday"), replaces the interval,
+# e.g. "*/30 8-20 * * 1-5". Each check is delayed by up to CHECK_JITTER_SECONDS at random
+CHECK_SCHEDULE = os.getenv('CHECK_SCHEDULE')
+CHECK_JITTER_SECONDS = float(os.getenv('CHECK_JITTER_SECONDS', 30))
+# Adaptive interval: learn when objects are published (per profile and hour of week)
+# and check more often then, keeping the weekly number of requests of the interval.
+# Applies to interval schedules only, cron windows are kept as configured
+ADAPTIVE_SCHEDULE = os.getenv('ADAPTIVE_SCHEDULE', 'false').lower() in ('1', 'true', 'yes')
+CHECK_MIN_INTERVAL_HOURS = float(os.getenv('CHECK_MIN_INTERVAL_HOURS', 0.25))
+CHECK_MAX_INTERVAL_HOURS = float(os.getenv('CHECK_MAX_INTERVAL_HOURS', 4))
+# Profiles on their own schedules are checked separately, and such partial checks
+# never detect removed objects: every FULL_CHECK_HOURS all profiles are checked
+# together (this also notifies their new objects). 0 disables it
+FULL_CHECK_HOURS = float(os.getenv('FULL_CHECK_HOURS', 24))
+ERI_REQUEST_TIMEOUT = int(os.getenv('ERI_REQUEST_TIMEOUT', 30))
+# Seconds a successful search result is reused by later checks (0 disables the cache,
+# concurrent checks with the same payload always share one request)
+ERI_CACHE_TTL = float(os.getenv('ERI_CACHE_TTL', 60))
+# Circuit breaker: stop requesting eri2.nca.by after ERI_BREAKER_THRESHOLD failures in a row
+# (403 and 429 at once) for ERI_BREAKER_BASE_SECONDS, doubling up to ERI_BREAKER_MAX_SECONDS
+ERI_BREAKER_THRESHOLD = int(os.getenv('ERI_BREAKER_THRESHOLD', 3))
+ERI_BREAKER_BASE_SECONDS = float(os.getenv('ERI_BREAKER_BASE_SECONDS', 60))
+ERI_BREAKER_MAX_SECONDS = float(os.getenv('ERI_BREAKER_MAX_SECONDS', 3600))
+
+# Object details (price, deterioration, inspection date) added to notifications.
+# Fetched DETAIL_CONCURRENCY at a time, at most DETAIL_MAX_PER_CHECK per notification,
+# cached in DETAIL_CACHE_FILE and revalidated (ETag / Last-Modified) after DETAIL_REVALIDATE_HOURS.
+# A notification waits at most DETAIL_DEADLINE_SECONDS for them (0: no limit)
+ENRICH_DETAILS = os.getenv('ENRICH_DETAILS', 'true').lower() in ('1', 'true', 'yes')
+DETAIL_CACHE_FILE = os.getenv('DETAIL_CACHE_FILE', os.path.join(DATA_DIR, 'object_details.json'))
+DETAIL_CONCURRENCY = int(os.getenv('DETAIL_CONCURRENCY', 4))
+DETAIL_MAX_PER_CHECK = int(os.getenv('DETAIL_MAX_PER_CHECK', 50))
+DETAIL_REVALIDATE_HOURS = float(os.getenv('DETAIL_REVALIDATE_HOURS', 24))
+DETAIL_DEADLINE_SECONDS = float(os.getenv('DETAIL_DEADLINE_SECONDS', 15))
+
+# Telegram Bot API base URL (can point to a local Bot API server)
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org')
+# Long-polling timeout for getUpdates in seconds
+TELEGRAM_POLL_TIMEOUT = int(os.getenv('TELEGRAM_POLL_TIMEOUT', 50))
+# Commands older than this are ignored; long enough for commands sent during a restart
+# (the update offset is saved, so they are picked up once the bot is back)
+COMMAND_MAX_AGE_SECONDS = int(os.getenv('COMMAND_MAX_AGE_SECONDS', 600))
+# Commands run concurrently, one at a time per chat and at most COMMAND_CONCURRENCY overall
+COMMAND_CONCURRENCY = int(os.getenv('COMMAND_CONCURRENCY', 16))
+
+# Outbound message limits (messages per second): overall, per private chat, per group.
+# Failed sends (network errors, 5xx) are retried up to SEND_MAX_ATTEMPTS times
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+TELEGRAM_GROUP_RATE = float(os.getenv('TELEGRAM_GROUP_RATE', 20 / 60))
+SEND_MAX_ATTEMPTS = int(os.getenv('SEND_MAX_ATTEMPTS', 5))
+
+# Subscribed chats (JSON), TELEGRAM_CHAT_ID is always subscribed and receives error alerts.
+# Notifications are delivered to at most FANOUT_CONCURRENCY chats at a time
+SUBSCRIBERS_FILE = os.getenv('SUBSCRIBERS_FILE', os.path.join(DATA_DIR, 'subscribers.json'))
+FANOUT_CONCURRENCY = int(os.getenv('FANOUT_CONCURRENCY', 20))
+
+# Webhook mode (optional): set WEBHOOK_URL to the public HTTPS URL that proxies to
+# WEBHOOK_HOST:WEBHOOK_PORT/WEBHOOK_PATH. Without WEBHOOK_URL the bot uses long polling
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+
+# Shared HTTP connection pool: total connections and connections per host
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 20))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 8))
 
 # Proxy Configuration (optional)
 HTTP_PROXY = os.getenv('HTTP_PROXY')
@@ -44,5 +116,57 @@ SEARCH_PAYLOAD = {
     "toMoneyAmount": None
 }
 
+# Pagination: page size sent to the API, how many pages are fetched in
+# parallel and an upper bound on pages per check (safety net for huge results)
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 10))
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', 4))
+MAX_PAGES = int(os.getenv('MAX_PAGES', 100))
+SEARCH_PAYLOAD['pageSize'] = PAGE_SIZE
+# Decode search responses from the stream object by object, keeping only the
+# fields the bot uses, instead of loading the whole body (for large page sizes).
+# The slimmed objects are still collected into the page before the diff runs
+ERI_STREAM_JSON = os.getenv('ERI_STREAM_JSON', 'false').lower() in ('1', 'true', 'yes')
+# Record every ERI request and raw response to ERI_CAPTURE_FILE (NDJSON, gzip if it ends
+# in .gz), or answer requests from such a recording instead of eri2.nca.by, with the
+# recorded time running ERI_REPLAY_SPEED times faster than real time
+ERI_CAPTURE_FILE = os.getenv('ERI_CAPTURE_FILE', '')
+ERI_REPLAY_FILE = os.getenv('ERI_REPLAY_FILE', '')
+ERI_REPLAY_SPEED = float(os.getenv('ERI_REPLAY_SPEED', 1))
+
+# Incremental mode: page only until the first already-seen object (or one older
+# than the newest seen so far) instead of re-reading the whole result set on
+# every check
+INCREMENTAL_FETCH = os.getenv('INCREMENTAL_FETCH', 'false').lower() in ('1', 'true', 'yes')
+
+# Named search profiles (JSON list), see subscriptions.example.json.
+# Without the file a single 'default' profile built from SEARCH_PAYLOAD is used
+SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE', 'subscriptions.json')
+DEFAULT_PROFILE = 'default'
+
+# Notify about known objects whose state, price, deterioration or event date changed
+# and about objects that disappeared from the search results
+NOTIFY_CHANGES = os.getenv('NOTIFY_CHANGES', 'true').lower() in ('1', 'true', 'yes')
+
 # Data persistence
-DATA_FILE = 'last_check_data.json'
+DATA_FILE = os.path.join(DATA_DIR, 'last_check_data.json')
+# State backend: 'json' (DATA_FILE), 'sqlite' (STATE_DB_FILE) or 'index' (compact binary
+# STATE_INDEX_FILE for very large histories); sqlite and index import DATA_FILE on first start
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'json').lower()
+STATE_DB_FILE = os.getenv('STATE_DB_FILE', os.path.join(DATA_DIR, 'eri_bot.db'))
+STATE_INDEX_FILE = os.getenv('STATE_INDEX_FILE', os.path.join(DATA_DIR, 'seen_ids.idx'))
+# Bloom filter bits per ID for the index backend, e.g. 10 (0 disables the pre-check)
+ID_INDEX_BLOOM_BITS = int(os.getenv('ID_INDEX_BLOOM_BITS', 0))
+
+# Metrics: Prometheus text format on METRICS_HOST:METRICS_PORT/metrics and /healthz for the
+# docker healthcheck (METRICS_PORT=0 disables). /healthz fails when no check succeeded
+# for HEALTH_MAX_CHECK_AGE_HOURS hours
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+HEALTH_MAX_CHECK_AGE_HOURS = float(os.getenv('HEALTH_MAX_CHECK_AGE_HOURS', 6))
+
+# Tracing: checks running longer than SLOW_CHECK_SECONDS get stack samples and a trace file
+# in TRACE_DIR (0 disables); PROFILE_SLOW_CHECKS=true also runs cProfile over every check
+# and keeps the profile of slow ones next to the trace
+SLOW_CHECK_SECONDS = float(os.getenv('SLOW_CHECK_SECONDS', 30))
+PROFILE_SLOW_CHECKS = os.getenv('PROFILE_SLOW_CHECKS', 'false').lower() in ('1', 'true', 'yes')
+TRACE_DIR = os.getenv('TRACE_DIR', 'traces')
@@ -1,8 +1,8 @@
-import json
-import os
 import logging
-from typing import List, Dict, Set
-from config import DATA_FILE
+from typing import List, Dict, Set, Callable, Tuple
+from config import DATA_FILE, DEFAULT_PROFILE, STATE_BACKEND
+from storage import StateStore, create_store
+from change_detection import ChangeSet, content_hash, changed_fields
 
 logger = logging.getLogger(__name__)
 
@@ -10,89 +10,218 @@ logger = logging.getLogger(__name__)
 class DataManager:
     """Manager for handling data persistence and comparison"""
     
-    def __init__(self, data_file: str = DATA_FILE):
+    def __init__(self, data_file: str = DATA_FILE, store: StateStore = None):
         self.data_file = data_file
+        # Pluggable backend: JSON file (default) or SQLite, see STATE_BACKEND.
+        # Backends keep state in memory, so it is loaded once here
+        self.store = store or create_store(STATE_BACKEND, data_file)
+        self.get_last_update_info()
     
     def load_last_ids(self) -> Set[int]:
         """
-        Load last saved object IDs from file
+        Load last saved object IDs
         
         Returns:
             Set of previously saved object IDs
         """
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Поддерживаем оба формата: новый (last_checked_ids) и старый (last_ids)
-                    ids = data.get('last_checked_ids', data.get('last_ids', []))
-                    return set(ids)
-            else:
-                logger.info(f"Data file {self.data_file} does not exist, starting fresh")
-                return set()
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"Error loading data file: {e}")
-            return set()
+            return self.store.load_ids()
         except Exception as e:
             logger.error(f"Unexpected error loading data: {e}")
             return set()
     
-    def save_current_ids(self, object_ids: List[int]) -> bool:
+    def load_watermarks(self) -> Dict[str, Dict]:
+        """
+        Load high-water marks (newest object seen so far) of all search profiles
+        
+        Returns:
+            Dictionary of profile name -> {'id': ..., 'event_date': ...}
+        """
+        try:
+            watermarks = dict(self.store.get_meta('high_water_marks') or {})
+            # Поддерживаем старый формат с одной отметкой
+            legacy = self.store.get_meta('high_water_mark')
+            if legacy and DEFAULT_PROFILE not in watermarks:
+                watermarks[DEFAULT_PROFILE] = legacy
+            return watermarks
+        except Exception as e:
+            logger.error(f"Error loading high-water marks: {e}")
+        return {}
+    
+    def load_watermark(self, profile: str = DEFAULT_PROFILE) -> Dict:
+        """
+        Load the high-water mark of one search profile
+        
+        Args:
+            profile: Search profile name
+            
+        Returns:
+            Dictionary with 'id' and 'event_date' (both None if unknown)
+        """
+        watermark = self.load_watermarks().get(profile) or {}
+        return {'id': watermark.get('id'), 'event_date': watermark.get('event_date')}
+    
+    def get_known_checker(self, profile: str = DEFAULT_PROFILE) -> Callable[[Dict], bool]:
         """
-        Save current object IDs to file
+        Build a predicate for incremental fetching
+        
+        An object is known only if its ID was saved before (removed objects
+        included). Its eventDate says nothing: an object may be published
+        with a date older than the newest one seen.
+        
+        Args:
+            profile: Search profile name
+            
+        Returns:
+            Function taking an object and returning True if it was seen already
+        """
+        def is_known(obj: Dict) -> bool:
+            return bool(obj.get('id') and self.store.known_ids([obj['id']]))
+        
+        return is_known
+    
+    def get_stop_date(self, profiles: List[str]) -> str:
+        """
+        Event date below which incremental paging of the profiles may stop
+        
+        Only the oldest watermark of the profiles is safe to stop at; objects
+        on the pages read are still filtered by their IDs only.
+        
+        Args:
+            profiles: Names of search profiles sharing one request
+            
+        Returns:
+            Event date (ISO format) or None if any profile has no watermark
+        """
+        watermarks = self.load_watermarks()
+        dates = [(watermarks.get(profile) or {}).get('event_date') for profile in profiles]
+        if not dates or not all(dates):
+            return None
+        return min(dates)
+    
+    def _compute_watermarks(self, objects: List[Dict], previous: Dict[str, Dict],
+                            matches: Dict[int, List[str]] = None) -> Dict[str, Dict]:
+        """
+        Advance per-profile watermarks with the given objects
+        
+        Args:
+            objects: Fetched objects
+            previous: Current watermarks by profile name
+            matches: Object ID -> names of profiles that returned it
+                (all objects belong to the default profile if None)
+            
+        Returns:
+            Updated watermarks by profile name
+        """
+        watermarks = dict(previous)
+        for obj in objects:
+            event_date = obj.get('eventDate')
+            if not event_date:
+                continue
+            profiles = matches.get(obj.get('id'), []) if matches is not None else [DEFAULT_PROFILE]
+            for profile in profiles:
+                current = watermarks.get(profile) or {}
+                if not current.get('event_date') or event_date > current['event_date']:
+                    watermarks[profile] = {'id': obj.get('id'), 'event_date': event_date}
+        return watermarks
+    
+    def save_current_ids(self, object_ids: List[int], watermarks: Dict[str, Dict] = None) -> bool:
+        """
+        Save current object IDs, replacing the saved set
         
         Args:
             object_ids: List of current object IDs
+            watermarks: High-water marks by profile, keeps the saved ones if None
             
         Returns:
             True if saved successfully, False otherwise
         """
+        return self._save_ids(object_ids, True, watermarks)
+    
+    def _save_ids(self, object_ids, replace: bool, watermarks: Dict[str, Dict] = None,
+                  hashes: Dict[int, int] = None, profiles: Dict[int, List[str]] = None) -> bool:
         try:
-            data = {
-                'last_checked_ids': list(set(object_ids)),  # Remove duplicates
-                'last_update': self._get_current_timestamp(),
-                'objects_count': len(set(object_ids))
-            }
-            
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            logger.info(f"Saved {len(object_ids)} IDs to {self.data_file}")
+            meta = {'high_water_marks': watermarks} if watermarks is not None else None
+            self.store.save_ids(object_ids, replace, self._get_current_timestamp(), meta, hashes, profiles)
+            logger.info(f"Saved {len(object_ids)} IDs ({'replace' if replace else 'merge'})")
             return True
             
         except Exception as e:
             logger.error(f"Error saving data file: {e}")
             return False
     
-    def get_new_objects(self, current_objects: List[Dict]) -> List[Dict]:
+    def get_new_objects(self, current_objects: List[Dict], incremental: bool = False,
+                        matches: Dict[int, List[str]] = None) -> List[Dict]:
         """
         Compare current objects with last saved and return only new ones
         
         Args:
             current_objects: List of current abandoned objects
+            incremental: True if current_objects is only the unseen head of the
+                result set, so saved IDs are extended instead of replaced
+            matches: Object ID -> names of search profiles that returned it
             
         Returns:
             List of new objects not seen before
         """
-        if not current_objects:
-            return []
+        return self.detect_changes(current_objects, incremental, matches).new
+    
+    def detect_changes(self, current_objects: List[Dict], incremental: bool = False,
+                       matches: Dict[int, List[str]] = None) -> ChangeSet:
+        """
+        Compare current objects with saved state: new, updated and removed objects
         
-        last_ids = self.load_last_ids()
-        current_ids = {obj.get('id') for obj in current_objects if obj.get('id')}
+        A content hash of every fetched object is compared with the stored one,
+        only objects whose hash differs are diffed field by field. Removed
+        objects are reported for complete fetches only, an incremental, partial
+        or truncated result says nothing about objects it doesn't contain.
+        An empty complete result removes everything tracked. Removed objects
+        stay known, so one that comes back is not reported as new. The
+        profiles that returned each object are saved with it, so removals can
+        be reported to the chats that follow those profiles.
+        
+        Args:
+            current_objects: List of current abandoned objects
+            incremental: True if current_objects may be only part of the result
+                set, so saved IDs are extended instead of replaced
+            matches: Object ID -> names of search profiles that returned it
+            
+        Returns:
+            ChangeSet of the check
+        """
+        hashes = {obj['id']: content_hash(obj) for obj in current_objects if obj.get('id')}
+        current_ids = set(hashes)
+        if not current_ids and incremental:
+            # Nothing to add, and nothing can be concluded about the objects not fetched
+            return ChangeSet()
         
         # Find new IDs that weren't in the last check
-        new_ids = current_ids - last_ids
+        known_ids = self.store.known_ids(current_ids)
+        new_ids = current_ids - known_ids
+        changes = ChangeSet(new=[obj for obj in current_objects if obj.get('id') in new_ids])
+        
+        # Known objects saved before hashes were tracked have no stored hash and are skipped
+        stored_hashes = self.store.load_hashes(known_ids)
+        for obj in current_objects:
+            stored_hash = stored_hashes.get(obj.get('id'))
+            if stored_hash is not None and stored_hash != hashes[obj['id']]:
+                fields = changed_fields(stored_hash, hashes[obj['id']])
+                if fields:
+                    changes.updated.append((obj, fields))
         
-        # Filter objects to only include new ones
-        new_objects = [obj for obj in current_objects if obj.get('id') in new_ids]
+        if not incremental:
+            changes.removed = self.store.missing_ids(current_ids)
+            changes.removed_profiles = self.store.load_profiles(changes.removed)
         
-        logger.info(f"Found {len(new_objects)} new objects out of {len(current_objects)} total")
+        logger.info(f"Found {len(changes.new)} new, {len(changes.updated)} updated and "
+                    f"{len(changes.removed)} removed objects out of {len(current_objects)} total")
         
         # Save current state for next comparison
-        if current_ids:
-            self.save_current_ids(list(current_ids))
+        watermarks = self._compute_watermarks(current_objects, self.load_watermarks(), matches)
+        profiles = matches if matches is not None else {object_id: [DEFAULT_PROFILE] for object_id in current_ids}
+        self._save_ids(current_ids, not incremental, watermarks, hashes, profiles)
         
-        return new_objects
+        return changes
     
     def _get_current_timestamp(self) -> str:
         """Get current timestamp as ISO string in Minsk timezone (UTC+3)"""
@@ -110,17 +239,7 @@ class DataManager:
             True if saved successfully, False otherwise
         """
         try:
-            # Load existing data
-            data = {'last_checked_ids': [], 'objects_count': 0}
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            
-            # Update only the timestamp
-            data['last_update'] = self._get_current_timestamp()
-            
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.store.set_meta('last_update', self._get_current_timestamp())
             
             logger.info("Updated last check time")
             return True
@@ -137,17 +256,77 @@ class DataManager:
             Dictionary with last update information
         """
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Поддерживаем оба формата
-                    ids = data.get('last_checked_ids', data.get('last_ids', []))
-                    return {
-                        'last_update': data.get('last_update'),
-                        'objects_count': data.get('objects_count', len(ids))
-                    }
-            else:
-                return {'last_update': None, 'objects_count': 0}
+            return {
+                'last_update': self.store.get_meta('last_update'),
+                'objects_count': self.store.count_ids()
+            }
         except Exception as e:
             logger.error(f"Error getting last update info: {e}")
             return {'last_update': None, 'objects_count': 0}
+    
+    def load_arrival_stats(self) -> Dict:
+        """Arrival statistics of the adaptive schedule, empty if not recorded yet"""
+        try:
+            return self.store.get_meta('arrival_stats') or {}
+        except Exception as e:
+            logger.error(f"Error loading arrival statistics: {e}")
+            return {}
+    
+    def save_arrival_stats(self, stats: Dict):
+        """Persist arrival statistics of the adaptive schedule"""
+        try:
+            self.store.set_meta('arrival_stats', stats)
+        except Exception as e:
+            logger.error(f"Error saving arrival statistics: {e}")
+    
+    def load_update_checkpoint(self) -> Tuple[int, Dict[str, int]]:
+        """
+        Telegram update position saved by the previous run
+        
+        Returns:
+            (last handled update_id or 0, last command time per chat)
+        """
+        try:
+            checkpoint = self.store.get_meta('telegram_updates') or {}
+            return int(checkpoint.get('offset', 0)), dict(checkpoint.get('last_command_times') or {})
+        except Exception as e:
+            logger.error(f"Error loading update checkpoint: {e}")
+            return 0, {}
+    
+    def save_update_checkpoint(self, offset: int, last_command_times: Dict[str, int]) -> bool:
+        """Persist the last handled update_id and the last command time per chat"""
+        try:
+            self.store.set_meta('telegram_updates', {'offset': offset, 'last_command_times': last_command_times})
+            return True
+        except Exception as e:
+            logger.error(f"Error saving update checkpoint: {e}")
+            return False
+    
+    def load_schedule_deadlines(self) -> Dict[str, str]:
+        """Next deadline per scheduler job (ISO format) saved by the previous run"""
+        try:
+            return dict(self.store.get_meta('schedule_deadlines') or {})
+        except Exception as e:
+            logger.error(f"Error loading schedule deadlines: {e}")
+            return {}
+    
+    def save_schedule_deadlines(self, deadlines: Dict[str, str]):
+        """Persist the next deadline per scheduler job"""
+        try:
+            self.store.set_meta('schedule_deadlines', deadlines)
+        except Exception as e:
+            logger.error(f"Error saving schedule deadlines: {e}")
+    
+    def record_check_run(self, status: str, objects_count: int = 0, new_count: int = 0):
+        """
+        Append a check result to the check-run log of the backend
+        
+        Args:
+            status: 'ok' or 'error'
+            objects_count: Number of fetched objects
+            new_count: Number of new objects
+        """
+        try:
+            self.store.record_check_run(self._get_current_timestamp(), status, objects_count, new_count)
+        except Exception as e:
+            logger.error(f"Error recording check run: {e}")
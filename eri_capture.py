@@ -0,0 +1,226 @@
+import asyncio
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+logger = logging.getLogger(__name__)
+
+
+def _open(path: str, mode: str):
+    """Files ending in .gz are gzip streams, anything else plain NDJSON"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def request_key(kind: str, request: Dict) -> str:
+    """Identity of a request: the search payload (with page) or the detail object ID"""
+    return kind + ' ' + json.dumps(request, sort_keys=True, ensure_ascii=False)
+
+
+class Exchange:
+    """One recorded request and response"""
+
+    __slots__ = ('t', 'kind', 'request', 'status', 'elapsed', 'body', 'headers')
+
+    def __init__(self, t: float, kind: str, request: Dict, status: int, elapsed: float,
+                 body: Optional[str], headers: Dict[str, str]):
+        self.t = t
+        self.kind = kind
+        self.request = request
+        self.status = status
+        self.elapsed = elapsed
+        self.body = body
+        self.headers = headers
+
+
+class CaptureWriter:
+    """
+    Append-only log of ERI requests and raw responses
+
+    One JSON line per exchange: {"t", "kind", "request", "status", "elapsed",
+    "headers", "body"}. A body identical to the previous response to the same
+    request is replaced by "unchanged": true, so checks that find nothing new
+    cost a few bytes. Every line is flushed at once (a gzip sync flush), a crash
+    loses at most the exchange being written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._last_digest: Dict[str, bytes] = {}
+
+    def record(self, kind: str, request: Dict, status: int, body: Optional[str],
+               elapsed: float, headers: Dict[str, str] = None):
+        """
+        Append one exchange, errors are logged and never reach the request
+
+        Args:
+            kind: 'search' or 'details'
+            request: Search payload or {'id': object ID}
+            status: HTTP status of the response
+            body: Raw response body (None for bodiless responses such as 304)
+            elapsed: Seconds the request took
+            headers: Response headers worth replaying (ETag, Last-Modified)
+        """
+        try:
+            entry = {'t': round(time.time(), 3), 'kind': kind, 'request': request, 'status': status,
+                     'elapsed': round(elapsed, 4)}
+            if headers:
+                entry['headers'] = headers
+            if body is not None:
+                key = request_key(kind, request)
+                digest = hashlib.sha1(body.encode('utf-8')).digest()
+                if self._last_digest.get(key) == digest:
+                    entry['unchanged'] = True
+                else:
+                    self._last_digest[key] = digest
+                    entry['body'] = body
+            if self._file is None:
+                self._file = _open(self.path, 'a')
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+        except Exception as e:
+            logger.error(f"Error writing ERI capture to {self.path}: {e}")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path: str) -> Iterator[Exchange]:
+    """
+    Exchanges of a capture file in recorded order
+
+    "unchanged" bodies are resolved to the previous body of the same request;
+    a truncated last line or gzip stream (the writer was killed) ends the file.
+    """
+    last_body: Dict[str, str] = {}
+    # Identical bodies share one string in memory
+    interned: Dict[str, str] = {}
+    with _open(path, 'r') as f:
+        try:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping damaged line in {path}")
+                    continue
+                key = request_key(entry['kind'], entry['request'])
+                body = entry.get('body')
+                if body is not None:
+                    body = interned.setdefault(body, body)
+                    last_body[key] = body
+                elif entry.get('unchanged'):
+                    body = last_body.get(key)
+                    if body is None:
+                        continue
+                yield Exchange(entry['t'], entry['kind'], entry['request'], entry['status'],
+                               entry.get('elapsed', 0.0), body, entry.get('headers') or {})
+        except EOFError:
+            logger.warning(f"{path} ends with a truncated gzip stream")
+
+
+class ReplayMissError(LookupError):
+    """The capture has no response for a request"""
+
+
+class CaptureReplay:
+    """
+    Serve recorded responses back to AbandonedObjectsAPI
+
+    Replay runs on a virtual clock that starts at the first recorded exchange
+    and advances `speed` times faster than real time (0 freezes it, only seek()
+    moves it). A request is answered with the latest response to the same
+    request recorded at or before the virtual time, or the earliest one if the
+    clock has not reached it yet, after sleeping its recorded latency / speed.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self._exchanges: Dict[str, List[Exchange]] = {}
+        # Detail responses with a body, per object ID, for conditional requests
+        self._details: Dict[int, List[Exchange]] = {}
+        self.exchanges: List[Exchange] = []
+        for exchange in read_capture(path):
+            self.exchanges.append(exchange)
+            self._exchanges.setdefault(request_key(exchange.kind, exchange.request), []).append(exchange)
+            if exchange.kind == 'details' and exchange.body is not None:
+                self._details.setdefault(exchange.request.get('id'), []).append(exchange)
+        # Recording times per list, for bisecting
+        self._times = {id(exchanges): [exchange.t for exchange in exchanges]
+                       for exchanges in list(self._exchanges.values()) + list(self._details.values())}
+        self.start_time = self.exchanges[0].t if self.exchanges else time.time()
+        self.end_time = self.exchanges[-1].t if self.exchanges else self.start_time
+        self._origin = (self.start_time, time.monotonic())
+        logger.info(f"Loaded {len(self.exchanges)} recorded ERI exchanges from {path}")
+
+    def now(self) -> float:
+        """Current virtual (recorded) Unix time"""
+        recorded, real = self._origin
+        return recorded + (time.monotonic() - real) * self.speed
+
+    def seek(self, t: float):
+        """Move the virtual clock to recorded time t"""
+        self._origin = (t, time.monotonic())
+
+    def _pick(self, exchanges: List[Exchange]) -> Exchange:
+        index = bisect.bisect_right(self._times[id(exchanges)], self.now())
+        return exchanges[max(index - 1, 0)]
+
+    async def _wait(self, exchange: Exchange):
+        if self.speed > 0 and exchange.elapsed:
+            await asyncio.sleep(exchange.elapsed / self.speed)
+
+    async def search(self, payload: Dict, url: str) -> str:
+        """
+        Recorded body of a search request
+
+        Raises:
+            ReplayMissError if the payload was never recorded,
+            aiohttp.ClientResponseError for recorded error responses
+        """
+        exchanges = self._exchanges.get(request_key('search', payload))
+        if not exchanges:
+            raise ReplayMissError(f"No recorded search response for {payload}")
+        exchange = self._pick(exchanges)
+        await self._wait(exchange)
+        self._raise_for_status(exchange, url, 'POST')
+        return exchange.body
+
+    async def details(self, object_id: int, url: str, etag: str = None) -> Tuple[int, Optional[str], Dict[str, str]]:
+        """
+        Recorded detail response: (status, body, headers)
+
+        The latest recorded record of the object is returned, or 304 if the
+        caller's ETag matches it, whatever the original request's validators were.
+        """
+        exchanges = self._details.get(object_id) or self._exchanges.get(request_key('details', {'id': object_id}))
+        if not exchanges:
+            raise ReplayMissError(f"No recorded details of object {object_id}")
+        exchange = self._pick(exchanges)
+        await self._wait(exchange)
+        self._raise_for_status(exchange, url, 'GET')
+        if exchange.body is None or (etag and exchange.headers.get('ETag') == etag):
+            return 304, None, exchange.headers
+        return exchange.status, exchange.body, exchange.headers
+
+    @staticmethod
+    def _raise_for_status(exchange: Exchange, url: str, method: str):
+        """Raise what aiohttp would have raised for the recorded response"""
+        if exchange.status >= 400:
+            request_info = aiohttp.RequestInfo(URL(url), method, CIMultiDictProxy(CIMultiDict()), URL(url))
+            raise aiohttp.ClientResponseError(
+                request_info, (), status=exchange.status, message=f"recorded {exchange.status} response")
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+
+from config import HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST
+
+logger = logging.getLogger(__name__)
+
+
+class HttpTransport:
+    """Shared pooled aiohttp session for eri2.nca.by and Telegram API calls"""
+
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared session, creating it on first use
+
+        The session is created lazily because aiohttp needs a running event loop.
+        The per-host limit keeps a slow host from taking every pooled connection.
+
+        Returns:
+            Open aiohttp client session
+        """
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit=self.limit,
+                        limit_per_host=self.limit_per_host,
+                        ttl_dns_cache=300
+                    )
+                    # trust_env=False: proxies are passed explicitly per request,
+                    # so Telegram calls never go through the eri2.nca.by proxy
+                    self._session = aiohttp.ClientSession(connector=connector, trust_env=False)
+                    logger.info(f"HTTP pool created: limit={self.limit}, per host={self.limit_per_host}")
+        return self._session
+
+    async def close(self):
+        """Close the shared session and its pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,237 @@
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import compress
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+# File layout: header, sorted int64 IDs, int64 content hashes (same order), Bloom filter bits.
+# Version 1 files have no hashes
+_MAGIC = b'ERIIDX2\x00'
+_MAGIC_V1 = b'ERIIDX1\x00'
+_HEADER = struct.Struct('<8sBQQB')  # magic, little-endian flag, ID count, bloom bytes, bloom hashes
+_LITTLE = sys.byteorder == 'little'
+_MASK64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    """Bloom filter over integer IDs (double hashing, no external deps)"""
+
+    def __init__(self, size_bytes: int, hashes: int, bits: bytearray = None):
+        self.size_bits = max(size_bytes, 1) * 8
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray(max(size_bytes, 1))
+
+    @classmethod
+    def for_capacity(cls, capacity: int, bits_per_id: int) -> 'BloomFilter':
+        """Size a filter for capacity IDs; k = 0.7 * bits per ID is near optimal"""
+        size_bytes = max(capacity * bits_per_id // 8, 64)
+        return cls(size_bytes, max(1, round(bits_per_id * 0.7)))
+
+    def _positions(self, object_id: int) -> Iterator[int]:
+        h1 = (object_id * 0x9E3779B97F4A7C15) & _MASK64
+        h2 = ((object_id ^ (h1 >> 29)) * 0xBF58476D1CE4E5B9) & _MASK64 | 1
+        for i in range(self.hashes):
+            yield ((h1 + i * h2) & _MASK64) % self.size_bits
+
+    def add(self, object_id: int):
+        for pos in self._positions(object_id):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, object_id: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(object_id))
+
+
+class IdIndex:
+    """
+    Compact set of object IDs with their content hashes
+
+    IDs are kept in a sorted array('q') (8 bytes per ID) and looked up with
+    bisect; content hashes live in a parallel array('q') at the same
+    positions, 0 meaning no hash. An optional Bloom filter answers most
+    misses without a search, which is the common case when diffing freshly
+    fetched objects.
+    """
+
+    def __init__(self, ids: Iterable[int] = (), bloom_bits_per_id: int = 0, hashes: Dict[int, int] = None):
+        self.bloom_bits_per_id = bloom_bits_per_id
+        self._ids = array('q', sorted(set(ids)))
+        hashes = hashes or {}
+        self._hashes = array('q', (hashes.get(object_id, 0) for object_id in self._ids))
+        self._bloom = None
+        self._rebuild_bloom()
+
+    def _rebuild_bloom(self):
+        if not self.bloom_bits_per_id:
+            self._bloom = None
+            return
+        # Leave room to grow before the false positive rate degrades
+        self._bloom = BloomFilter.for_capacity(len(self._ids) * 2, self.bloom_bits_per_id)
+        for object_id in self._ids:
+            self._bloom.add(object_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def _position(self, object_id: int) -> int:
+        """Position of object_id in the arrays, -1 if absent"""
+        if self._bloom is not None and object_id not in self._bloom:
+            return -1
+        i = bisect_left(self._ids, object_id)
+        return i if i < len(self._ids) and self._ids[i] == object_id else -1
+
+    def __contains__(self, object_id: int) -> bool:
+        return self._position(object_id) >= 0
+
+    def _positions(self, ids: Iterable[int]) -> Dict[int, int]:
+        """Positions of the ids that are present; a large batch is merged with the index instead of searched"""
+        ids = sorted(set(ids))
+        stored = self._ids
+        if len(ids) * 16 < len(stored):
+            found = ((object_id, self._position(object_id)) for object_id in ids)
+            return {object_id: i for object_id, i in found if i >= 0}
+        positions = {}
+        i, count = 0, len(stored)
+        for object_id in ids:
+            while i < count and stored[i] < object_id:
+                i += 1
+            if i < count and stored[i] == object_id:
+                positions[object_id] = i
+        return positions
+
+    def intersection(self, ids: Iterable[int]) -> Set[int]:
+        """The ids that are present"""
+        return set(self._positions(ids))
+
+    def get_hash(self, object_id: int) -> Optional[int]:
+        """Content hash stored with object_id, None if absent or stored without one"""
+        i = self._position(object_id)
+        return (self._hashes[i] or None) if i >= 0 else None
+
+    def add_many(self, ids: Iterable[int], hashes: Dict[int, int] = None):
+        """
+        Add IDs to the sorted array
+
+        Args:
+            ids: IDs to add
+            hashes: Content hashes of (some of) the ids, for new and already present ones
+        """
+        hashes = hashes or {}
+        ids = set(ids)
+        positions = self._positions(ids)
+        for object_id, i in positions.items():
+            if object_id in hashes:
+                self._hashes[i] = hashes[object_id]
+        new_ids = sorted(ids.difference(positions))
+        if not new_ids:
+            return
+        # One pass over both sorted runs, the old arrays are copied in slices
+        ids_out, hashes_out = array('q'), array('q')
+        pos = 0
+        for object_id in new_ids:
+            end = bisect_left(self._ids, object_id, pos)
+            ids_out.extend(self._ids[pos:end])
+            hashes_out.extend(self._hashes[pos:end])
+            ids_out.append(object_id)
+            hashes_out.append(hashes.get(object_id, 0))
+            pos = end
+        ids_out.extend(self._ids[pos:])
+        hashes_out.extend(self._hashes[pos:])
+        self._ids, self._hashes = ids_out, hashes_out
+        if self._bloom is not None and len(self._ids) * self.bloom_bits_per_id > self._bloom.size_bits:
+            self._rebuild_bloom()
+        elif self._bloom is not None:
+            for object_id in new_ids:
+                self._bloom.add(object_id)
+
+    def replace(self, ids: Iterable[int], hashes: Dict[int, int] = None):
+        """Make ids the whole content of the index, IDs that stay keep their hashes unless given"""
+        hashes = dict(hashes or {})
+        new_ids = array('q', sorted(set(ids)))
+        kept = self._positions(object_id for object_id in new_ids if object_id not in hashes)
+        hashes.update((object_id, self._hashes[i]) for object_id, i in kept.items())
+        self._hashes = array('q', (hashes.get(object_id, 0) for object_id in new_ids))
+        self._ids = new_ids
+        self._rebuild_bloom()
+
+    def _without(self, ids: Iterable[int]) -> Tuple[array, array]:
+        """Both arrays with ids left out, in one pass over the index"""
+        ids = ids if isinstance(ids, (set, frozenset)) else set(ids)
+        keep = [object_id not in ids for object_id in self._ids]
+        return array('q', compress(self._ids, keep)), array('q', compress(self._hashes, keep))
+
+    def difference(self, ids: Iterable[int]) -> array:
+        """IDs of the index that are not in ids, ascending, without building a set of the index"""
+        return self._without(ids)[0]
+
+    def hashes_of(self, ids: Iterable[int]) -> Dict[int, int]:
+        """Stored content hashes of ids (IDs without a hash are left out)"""
+        stored = self._hashes
+        return {object_id: stored[i] for object_id, i in self._positions(ids).items() if stored[i]}
+
+    def discard_many(self, ids: Iterable[int]):
+        """Remove IDs (and their hashes) from the index"""
+        ids_out, hashes_out = self._without(ids)
+        if len(ids_out) != len(self._ids):
+            self._ids, self._hashes = ids_out, hashes_out
+            self._rebuild_bloom()
+
+    def save(self, path: str):
+        """Write the index atomically in the binary format"""
+        bloom_bytes = bytes(self._bloom.bits) if self._bloom is not None else b''
+        hashes = self._bloom.hashes if self._bloom is not None else 0
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, int(_LITTLE), len(self._ids), len(bloom_bytes), hashes))
+            self._ids.tofile(f)
+            self._hashes.tofile(f)
+            f.write(bloom_bytes)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, bloom_bits_per_id: int = 0) -> 'IdIndex':
+        """
+        Load an index written by save() with a single read
+
+        Args:
+            path: Index file path
+            bloom_bits_per_id: Bloom filter size used if the file has none
+
+        Returns:
+            Loaded IdIndex
+
+        Raises:
+            ValueError if the file is not an ID index
+        """
+        with open(path, 'rb') as f:
+            # Sections are copied out of the buffer once, without intermediate slices
+            raw = memoryview(f.read())
+        magic, little, count, bloom_size, hashes = _HEADER.unpack_from(raw)
+        if magic not in (_MAGIC, _MAGIC_V1):
+            raise ValueError(f"{path} is not an ID index file")
+
+        index = cls.__new__(cls)
+        index.bloom_bits_per_id = bloom_bits_per_id
+        offset = _HEADER.size
+        index._ids = array('q')
+        index._ids.frombytes(raw[offset:offset + count * 8])
+        offset += count * 8
+        index._hashes = array('q')
+        if magic == _MAGIC:
+            index._hashes.frombytes(raw[offset:offset + count * 8])
+            offset += count * 8
+        else:
+            index._hashes.frombytes(bytes(count * 8))
+        if bool(little) != _LITTLE:
+            index._ids.byteswap()
+            index._hashes.byteswap()
+        if bloom_size and bloom_bits_per_id:
+            index._bloom = BloomFilter(bloom_size, hashes, bytearray(raw[offset:offset + bloom_size]))
+        else:
+            index._rebuild_bloom()
+        return index
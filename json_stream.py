@@ -0,0 +1,186 @@
+import codecs
+import json
+from typing import Dict, Iterator, List, Optional, Sequence
+
+_WHITESPACE = ' \t\n\r'
+# Consumed input is cut off the buffer once it grows past this many characters
+_COMPACT_AT = 64 * 1024
+
+
+class _NeedMore(Exception):
+    """The buffer ends before the current token does"""
+
+
+class SearchResponseParser:
+    """
+    Incremental decoder of search responses {"data": {"content": [...], ...}}
+
+    Feed the body chunk by chunk; objects of data.content are returned as
+    soon as each one is complete, reduced to the given fields. Only the
+    current object and the unread tail of the input are held in memory,
+    never the whole body or the whole parsed tree. Other keys of the data
+    section (totalElements, totalPages, ...) are collected in self.data.
+
+    Usage:
+        parser = SearchResponseParser(fields)
+        for chunk in chunks:
+            for obj in parser.feed(chunk):
+                ...
+        data = parser.close()
+    """
+
+    def __init__(self, fields: Optional[Sequence[str]] = None):
+        self.fields = fields
+        self.data: Dict = {}
+        self.count = 0
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        # Containers entered on the way to data.content: 'root', 'data', 'content'
+        self._stack: List[str] = []
+        # What comes next in the current container: 'first' item or its end,
+        # 'item' after a comma, 'separator' (comma or end) after an item
+        self._expect = 'first'
+        self._done = False
+
+    def feed(self, chunk: bytes) -> List[Dict]:
+        """
+        Add a chunk of the body
+
+        Returns:
+            Objects of data.content completed by this chunk
+
+        Raises:
+            json.JSONDecodeError if the body is not a valid search response
+        """
+        self._buffer += self._text.decode(chunk)
+        return self._parse()
+
+    def close(self) -> Dict:
+        """
+        Finish the body
+
+        Returns:
+            The data section without content
+
+        Raises:
+            json.JSONDecodeError if the body is incomplete or invalid
+        """
+        self._buffer += self._text.decode(b'', final=True)
+        self._eof = True
+        self._parse()
+        if not self._done:
+            raise json.JSONDecodeError("Unexpected end of search response", self._buffer, self._pos)
+        return self.data
+
+    def iter_objects(self, chunks) -> Iterator[Dict]:
+        """Parse an iterable of byte chunks, yielding objects one at a time"""
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        self.close()
+
+    def _parse(self) -> List[Dict]:
+        objects = []
+        try:
+            while not self._done:
+                obj = self._step()
+                if obj is not None:
+                    objects.append(obj)
+        except _NeedMore:
+            if self._eof:
+                raise json.JSONDecodeError("Unexpected end of search response", self._buffer, self._pos)
+        if self._pos > _COMPACT_AT:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        return objects
+
+    def _peek(self) -> str:
+        """Next non-whitespace character, without consuming it"""
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        if self._pos >= len(self._buffer):
+            raise _NeedMore()
+        return self._buffer[self._pos]
+
+    def _value(self):
+        """Decode a complete value at the current position"""
+        self._peek()
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            # Truncated value (or garbage, which is reported once the input ends)
+            raise _NeedMore()
+        if end >= len(self._buffer) and not self._eof:
+            # A number at the end of the buffer may continue in the next chunk
+            raise _NeedMore()
+        self._pos = end
+        return value
+
+    def _error(self, message: str):
+        raise json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def _step(self) -> Optional[Dict]:
+        """Consume one token of the envelope or one content object"""
+        char = self._peek()
+        if not self._stack:
+            if char != '{':
+                self._error("Search response is not a JSON object")
+            self._pos += 1
+            self._enter('root')
+            return None
+
+        container = self._stack[-1]
+        closing = ']' if container == 'content' else '}'
+        if self._expect != 'item' and char == closing:
+            self._pos += 1
+            self._stack.pop()
+            self._expect = 'separator'
+            self._done = not self._stack
+            return None
+        if self._expect == 'separator':
+            if char != ',':
+                self._error(f"Expected ',' or '{closing}'")
+            self._pos += 1
+            self._expect = 'item'
+            return None
+
+        if container == 'content':
+            item = self._value()
+            self._expect = 'separator'
+            self.count += 1
+            if isinstance(item, dict) and self.fields is not None:
+                item = {key: item[key] for key in self.fields if key in item}
+            return item
+
+        # Object member: key and value are consumed together, a chunk
+        # boundary between them retries from the key
+        start = self._pos
+        try:
+            key = self._value()
+            if not isinstance(key, str):
+                self._error("Expected an object key")
+            if self._peek() != ':':
+                self._error("Expected ':'")
+            self._pos += 1
+            opening = self._peek()
+            target = 'data' if container == 'root' else 'content'
+            if key == target and opening == ('{' if target == 'data' else '['):
+                self._pos += 1
+                self._enter(target)
+                return None
+            value = self._value()
+        except _NeedMore:
+            self._pos = start
+            raise
+        if container == 'data':
+            self.data[key] = value
+        self._expect = 'separator'
+        return None
+
+    def _enter(self, container: str):
+        self._stack.append(container)
+        self._expect = 'first'
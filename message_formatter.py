@@ -1,52 +1,167 @@
 import logging
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Tuple
 from datetime import datetime
 from api_client import AbandonedObjectsAPI
 
 logger = logging.getLogger(__name__)
 
+# Telegram message limit
+MESSAGE_LIMIT = 4096
+
+# Names of changed fields (change_detection.CHANGE_FIELDS) in update notifications
+FIELD_LABELS = {
+    'stateTypeId': "состояние",
+    'moneyAmount': "цена",
+    'deterioration': "износ",
+    'eventDate': "дата события",
+}
+
+# Fetch failure classes (api_client.classify_error) as shown to users
+FETCH_ERROR_DESCRIPTIONS = {
+    'forbidden': "Доступ к API запрещён (403): геоблокировка или защита от ботов",
+    'rate_limited': "Слишком много запросов к API (429)",
+    'server': "Ошибка сервера eri2.nca.by (5xx)",
+    'client': "API отклонил запрос (4xx)",
+    'timeout': "API не отвечает (таймаут)",
+    'network': "Сетевая ошибка при обращении к API",
+    'parse': "Некорректный ответ API",
+}
+
+
+def _message_length(text: str) -> int:
+    """Length as Telegram counts it (UTF-16 code units, emoji take two)"""
+    return len(text.encode('utf-16-le')) // 2
+
 
 class MessageFormatter:
     """Formatter for Telegram messages about abandoned objects"""
     
-    def __init__(self):
-        self.api_client = AbandonedObjectsAPI()
+    def __init__(self, api_client=None):
+        # Only needed for object URLs, so the bot passes its own client
+        self.api_client = api_client or AbandonedObjectsAPI()
     
-    def format_new_objects_message(self, new_objects: List[Dict]) -> str:
+    def iter_new_objects_messages(self, new_objects: List[Dict]) -> Iterator[str]:
         """
-        Format a message about new abandoned objects
+        Format new abandoned objects as one or more Telegram messages
         
         Args:
             new_objects: List of new abandoned objects
             
-        Returns:
-            Formatted message string
+        Yields:
+            Message parts in sending order
         """
         if not new_objects:
-            return "🔍 Новых заброшенных объектов не найдено."
+            yield "🔍 Новых заброшенных объектов не найдено."
+            return
         
         count = len(new_objects)
         header = f"🏠 Найдено {count} нов{'ый' if count == 1 else 'ых'} заброшенн{'ый объект' if count == 1 else 'ых объекта' if count < 5 else 'ых объектов'} в Минском районе:\n\n"
+        items = (self._format_single_object(obj, i) for i, obj in enumerate(new_objects, 1))
+        yield from self._pack_messages(header, items, "🏠")
+    
+    def iter_change_messages(self, updated: List[Tuple[Dict, List[str]]], removed: List[int]) -> Iterator[str]:
+        """
+        Format changes of known objects as one or more Telegram messages
+        
+        Args:
+            updated: Objects with the names of their changed fields
+            removed: IDs of objects no longer returned by the search
+            
+        Yields:
+            Message parts in sending order, nothing if there are no changes
+        """
+        if not updated and not removed:
+            return
+        
+        header = "✏️ Изменения в отслеживаемых объектах:\n\n"
+        items = [self._format_updated_object(obj, fields, i) for i, (obj, fields) in enumerate(updated, 1)]
+        items.extend(
+            f"{i}. 🗑 Объект {object_id} больше не найден в поиске\n"
+            f"🔗 [Последняя карточка]({self.api_client.get_view_url(object_id)})"
+            for i, object_id in enumerate(removed, len(updated) + 1)
+        )
+        yield from self._pack_messages(header, items, "✏️")
+    
+    def _pack_messages(self, header: str, items: Iterable[str], icon: str) -> Iterator[str]:
+        """
+        Pack formatted items into messages of at most MESSAGE_LIMIT characters
         
-        items = []
-        for i, obj in enumerate(new_objects, 1):
-            item = self._format_single_object(obj, i)
-            items.append(item)
+        Items are packed using running length counters, so every item is
+        delivered and the work is linear in the number of items. The header
+        goes on the first part, the check time footer on the last one.
         
+        Args:
+            header: Text of the first part before the items
+            items: Formatted items in order
+            icon: Icon of the continuation header of the following parts
+            
+        Yields:
+            Message parts in sending order
+        """
         # Add footer with timestamp in Minsk time (with empty line before it)
         from datetime import timezone, timedelta
         minsk_tz = timezone(timedelta(hours=3))
         minsk_time = datetime.now(minsk_tz)
         footer = f"\n\n🕐 Проверка выполнена: {minsk_time.strftime('%d.%m.%Y %H:%M')}"
         
-        message = header + "\n\n".join(items) + footer
+        separator = "\n\n"
+        part_number = 1
+        chunks = [header]
+        length = _message_length(header)
+        has_items = False
         
-        # Telegram message limit is 4096 characters
-        if len(message) > 4000:
-            # Split into multiple messages if too long
-            return self._split_long_message(new_objects)
+        for item in items:
+            item_length = _message_length(item) + (_message_length(separator) if has_items else 0)
+            
+            if has_items and length + item_length > MESSAGE_LIMIT:
+                yield "".join(chunks)
+                part_number += 1
+                continuation = f"{icon} Продолжение ({part_number}):\n\n"
+                chunks = [continuation]
+                length = _message_length(continuation)
+                has_items = False
+                item_length = _message_length(item)
+            
+            if length + item_length > MESSAGE_LIMIT:
+                # A single oversized item: cut it to what is left of the part
+                item = self._shorten_item(item, MESSAGE_LIMIT - length)
+                item_length = _message_length(item)
+            
+            if has_items:
+                chunks.append(separator)
+            chunks.append(item)
+            length += item_length
+            has_items = True
         
-        return message
+        if length + _message_length(footer) > MESSAGE_LIMIT:
+            yield "".join(chunks)
+            chunks = [footer.lstrip("\n")]
+        else:
+            chunks.append(footer)
+        yield "".join(chunks)
+    
+    @staticmethod
+    def _shorten_item(item: str, budget: int) -> str:
+        """
+        Cut an item to budget UTF-16 code units, keeping its link whole
+        
+        Items end with the object link line; only the description above it
+        is shortened, a link cut in the middle would lose the URL and leave
+        unbalanced Markdown that Telegram rejects.
+        """
+        body, newline, link = item.rpartition("\n")
+        if not newline or "](" not in link:
+            # No link line, all of the item is description
+            body, link = item, ""
+        elif _message_length(link) + 2 > budget:
+            # Not even the link fits: it is dropped, never cut
+            link = ""
+        suffix = "…" + (f"\n{link}" if link else "")
+        room = budget - _message_length(suffix)
+        body = body[:max(0, room)]
+        while body and _message_length(body) > room:
+            body = body[:-1]
+        return body + suffix
     
     def _format_single_object(self, obj: Dict, index: int) -> str:
         """
@@ -65,12 +180,50 @@ class MessageFormatter:
         # Generate view URL
         view_url = self.api_client.get_view_url(object_id)
         
-        # Create simplified formatted item - only address and link
         item = f"{index}. 📍 {position}\n"
+        # Detail fields, present when the object was enriched
+        if obj.get('moneyAmount') is not None:
+            item += f"💰 Цена: {self._format_field(obj, 'moneyAmount')}\n"
+        if obj.get('deterioration') is not None:
+            item += f"🏚 Износ: {self._format_field(obj, 'deterioration')}\n"
+        inspection_date = self._format_timestamp(obj.get('inspectionDate'))
+        if inspection_date:
+            item += f"📅 Обследование: {inspection_date}\n"
         item += f"🔗 [Подробнее]({view_url})"
         
         return item
     
+    def _format_field(self, obj: Dict, key: str) -> str:
+        """Display value of an object field shown in notifications"""
+        value = obj.get(key)
+        if value is None:
+            return "не указано"
+        if key == 'moneyAmount' and isinstance(value, (int, float)):
+            return f"{value:.2f}".rstrip('0').rstrip('.') + " руб."
+        if key == 'deterioration':
+            return f"{value}%"
+        if key in ('eventDate', 'inspectionDate'):
+            return self._format_timestamp(value) or str(value)
+        return str(value)
+    
+    def _format_updated_object(self, obj: Dict, fields: List[str], index: int) -> str:
+        """
+        Format a known object whose fields changed
+        
+        Args:
+            obj: Current object data
+            fields: Names of the changed fields
+            index: Item number in the list
+            
+        Returns:
+            Formatted string for the object
+        """
+        changes = ", ".join(f"{FIELD_LABELS.get(key, key)} → {self._format_field(obj, key)}" for key in fields)
+        item = f"{index}. 📍 {obj.get('position', 'Адрес не указан')}\n"
+        item += f"✏️ Изменено: {changes}\n"
+        item += f"🔗 [Подробнее]({self.api_client.get_view_url(obj.get('id', 'N/A'))})"
+        return item
+    
     def _format_timestamp(self, timestamp) -> str:
         """
         Format timestamp to readable date
@@ -90,47 +243,57 @@ class MessageFormatter:
             pass
         return ""
     
-    def _split_long_message(self, objects: List[Dict]) -> str:
+    def format_error_message(self, error: str) -> str:
         """
-        Handle case when message is too long for Telegram
+        Format error message
         
         Args:
-            objects: List of objects
+            error: Error description
             
         Returns:
-            Truncated message with indication of total count
+            Formatted error message
         """
-        count = len(objects)
-        header = f"🏠 Найдено {count} новых заброшенных объектов в Минском районе (показаны первые 5):\n\n"
-        
-        items = []
-        for i, obj in enumerate(objects[:5], 1):
-            item = self._format_single_object(obj, i)
-            items.append(item)
-        
-        footer = f"\n\n... и еще {count - 5} объектов\n\n"
         from datetime import timezone, timedelta
         minsk_tz = timezone(timedelta(hours=3))
         minsk_time = datetime.now(minsk_tz)
-        footer += f"🕐 Проверка выполнена: {minsk_time.strftime('%d.%m.%Y %H:%M')}"
-        
-        return header + "\n\n".join(items) + footer
+        timestamp = minsk_time.strftime('%d.%m.%Y %H:%M')
+        return f"❌ Ошибка при проверке объектов:\n{error}\n\n🕐 {timestamp}"
     
-    def format_error_message(self, error: str) -> str:
+    def describe_fetch_error(self, kind: str = None) -> str:
+        """User-facing description of a fetch failure class"""
+        return FETCH_ERROR_DESCRIPTIONS.get(kind, "Не удалось получить данные с API")
+    
+    def format_outage_message(self, error: str, retry_in: float = 0) -> str:
         """
-        Format error message
+        Format the single alert sent when checks start failing
         
         Args:
             error: Error description
+            retry_in: Seconds until the API is requested again (0 if unknown)
             
         Returns:
-            Formatted error message
+            Formatted alert message
+        """
+        message = self.format_error_message(error)
+        hint = "\n\n🔕 Повторные ошибки не присылаются, сообщу, когда проверки снова заработают."
+        if retry_in >= 60:
+            hint += f"\n🔁 Следующий запрос к API не раньше чем через {retry_in / 60:.0f} мин."
+        return message + hint
+    
+    def format_recovery_message(self, since: datetime) -> str:
+        """
+        Format the message sent when checks work again after an outage
+        
+        Args:
+            since: When the outage started
+            
+        Returns:
+            Formatted recovery message
         """
         from datetime import timezone, timedelta
         minsk_tz = timezone(timedelta(hours=3))
-        minsk_time = datetime.now(minsk_tz)
-        timestamp = minsk_time.strftime('%d.%m.%Y %H:%M')
-        return f"❌ Ошибка при проверке объектов:\n{error}\n\n🕐 {timestamp}"
+        minutes = max(1, round((datetime.now(minsk_tz) - since).total_seconds() / 60))
+        return f"✅ Проверки снова работают (сбой длился {minutes} мин)."
     
     def format_status_message(self, objects_count: int, last_update: str = None) -> str:
         """
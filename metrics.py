@@ -0,0 +1,217 @@
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a fast local diff to a slow full crawl
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Long polls are held open by Telegram for up to TELEGRAM_POLL_TIMEOUT seconds
+POLL_BUCKETS = (0.1, 0.5, 1, 5, 10, 25, 30, 35, 60)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _Metric:
+    """Base of a named metric family with a fixed set of label names"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(sample name, rendered labels, value) of every series"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.label_names, key), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, set directly or read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the (unlabelled) value from function on every scrape"""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                # A broken source must not break the whole scrape
+                return []
+            return [] if value is None else [(self.name, '', value)]
+        with self._lock:
+            return [(self.name, _format_labels(self.label_names, key), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: per-bucket counts (last one is +Inf), sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    labels = _format_labels(self.label_names + ('le',), key + (_format_value(bound),))
+                    samples.append((f"{self.name}_bucket", labels, cumulative))
+                labels = _format_labels(self.label_names, key)
+                samples.append((f"{self.name}_sum", labels, total[0]))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Registry:
+    """Metric families exposed together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
+# Fallback start time where /proc is not available
+_IMPORTED_AT = time.time()
+
+
+def process_start_time() -> float:
+    """Unix time this process started (on Linux from /proc, elsewhere when metrics was imported)"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name; starttime is field 22, in clock ticks after boot
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _IMPORTED_AT
+
+
+# Check pipeline
+CHECKS = Counter('eri_bot_checks_total', 'Finished checks by kind and result', ('kind', 'result'))
+CHECK_SECONDS = Histogram('eri_bot_check_seconds', 'Duration of whole check cycles (time to notify)', ('kind',))
+STAGE_SECONDS = Histogram('eri_bot_stage_seconds', 'Duration of check stages: fetch, diff, enrich, render, send',
+                          ('stage',))
+NEW_OBJECTS = Counter('eri_bot_new_objects_total', 'New objects found by checks')
+LAST_SUCCESS = Gauge('eri_bot_last_success_timestamp_seconds', 'Unix time of the last successful check')
+
+# eri2.nca.by
+ERI_REQUESTS = Counter('eri_bot_eri_requests_total', 'Requests to eri2.nca.by by endpoint and outcome',
+                       ('endpoint', 'outcome'))
+ERI_REQUEST_SECONDS = Histogram('eri_bot_eri_request_seconds', 'Latency of requests to eri2.nca.by', ('endpoint',))
+
+# Telegram
+MESSAGES = Counter('eri_bot_messages_total', 'Outgoing Telegram messages by result', ('result',))
+SEND_SECONDS = Histogram('eri_bot_telegram_send_seconds', 'Time from queueing a message to its delivery')
+POLL_SECONDS = Histogram('eri_bot_telegram_poll_seconds', 'Duration of getUpdates long polls', buckets=POLL_BUCKETS)
+COMMANDS = Counter('eri_bot_commands_total', 'Bot commands by command and result (ok, error, denied, debounced)',
+                   ('command', 'result'))
+COMMAND_SECONDS = Histogram('eri_bot_command_seconds', 'Time bot commands take to handle', ('command',))
+
+# State
+SEEN_IDS = Gauge('eri_bot_seen_ids', 'Object IDs tracked in the state store')
+SEND_QUEUE_DEPTH = Gauge('eri_bot_send_queue_depth', 'Messages waiting in the Telegram send queue')
+
+# Process
+STARTUP_SECONDS = Gauge('eri_bot_startup_seconds',
+                        'Seconds from process start until the bot listened for commands')
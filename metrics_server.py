@@ -0,0 +1,57 @@
+import logging
+from typing import Callable, Optional, Tuple
+
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT
+from metrics import REGISTRY, Registry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint with /metrics (Prometheus text format) and /healthz
+
+    /healthz answers 200 or 503 depending on the health callback and is
+    what the docker-compose healthcheck polls; /readyz does the same with
+    the readiness callback (the health one if not given).
+    """
+
+    def __init__(self, health: Callable[[], Tuple[bool, str]], registry: Registry = REGISTRY,
+                 host: str = METRICS_HOST, port: int = METRICS_PORT,
+                 ready: Optional[Callable[[], Tuple[bool, str]]] = None):
+        self.health = health
+        self.ready = ready or health
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        healthy, detail = self.health()
+        return web.Response(status=200 if healthy else 503, text=detail + '\n')
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        ready, detail = self.ready()
+        return web.Response(status=200 if ready else 503, text=detail + '\n')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.router.add_get('/healthz', self.handle_health)
+        app.router.add_get('/readyz', self.handle_ready)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
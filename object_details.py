@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from config import (
+    DETAIL_CACHE_FILE, DETAIL_CONCURRENCY, DETAIL_REVALIDATE_HOURS, DETAIL_MAX_PER_CHECK,
+    DETAIL_DEADLINE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Detail fields copied into notified objects, shown by MessageFormatter
+DETAIL_FIELDS = ('moneyAmount', 'deterioration', 'inspectionDate')
+# Cache entries not fetched or revalidated for this long are dropped on save
+MAX_ENTRY_AGE_SECONDS = 30 * 24 * 3600
+
+
+class DetailCache:
+    """
+    Object detail records on disk, keyed by object ID
+
+    Stored as {"<id>": {"data": {...}, "etag": ..., "last_modified": ..., "fetched_at": ...}}
+    in a JSON file. Only DETAIL_FIELDS of each record are kept.
+    """
+
+    def __init__(self, data_file: str = DETAIL_CACHE_FILE):
+        self.data_file = data_file
+        self._entries: Dict[str, Dict] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.data_file):
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+                logger.info(f"Loaded {len(self._entries)} cached object details from {self.data_file}")
+        except Exception as e:
+            logger.error(f"Error loading detail cache: {e}")
+            self._entries = {}
+
+    def get(self, object_id) -> Optional[Dict]:
+        return self._entries.get(str(object_id))
+
+    def put(self, object_id, data: Optional[Dict], etag: str = None, last_modified: str = None):
+        """Store a fetched record, or only refresh the timestamp of a revalidated one if data is None"""
+        entry = self._entries.get(str(object_id)) or {}
+        if data is not None:
+            entry['data'] = {key: data[key] for key in DETAIL_FIELDS if data.get(key) is not None}
+        entry.update(etag=etag, last_modified=last_modified, fetched_at=time.time())
+        self._entries[str(object_id)] = entry
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            cutoff = time.time() - MAX_ENTRY_AGE_SECONDS
+            self._entries = {key: entry for key, entry in self._entries.items()
+                             if entry.get('fetched_at', 0) >= cutoff}
+            tmp_file = f"{self.data_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_file, self.data_file)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Error saving detail cache: {e}")
+
+
+class DetailEnricher:
+    """
+    Adds detail fields (price, deterioration, inspection date) to new objects
+
+    Details are fetched through a bounded pool of concurrent requests. Each
+    ID is requested at most once: fresh cache entries are used as is, older
+    ones are revalidated with ETag / Last-Modified, and concurrent requests
+    for the same ID share one fetch.
+    """
+
+    def __init__(self, api_client, cache: DetailCache = None, concurrency: int = DETAIL_CONCURRENCY,
+                 revalidate_hours: float = DETAIL_REVALIDATE_HOURS, max_objects: int = DETAIL_MAX_PER_CHECK,
+                 deadline: float = DETAIL_DEADLINE_SECONDS):
+        self.api_client = api_client
+        self.cache = cache or DetailCache()
+        self.revalidate_seconds = revalidate_hours * 3600
+        self.max_objects = max_objects
+        # Seconds enrich() waits for details, 0 without limit
+        self.deadline = deadline
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def _fetch(self, object_id) -> Optional[Dict]:
+        """Cached or freshly fetched detail fields of an object"""
+        entry = self.cache.get(object_id)
+        if entry is not None and time.time() - entry.get('fetched_at', 0) < self.revalidate_seconds:
+            return entry.get('data')
+
+        async with self._semaphore:
+            result = await self.api_client.fetch_object_details(
+                object_id,
+                etag=entry.get('etag') if entry else None,
+                last_modified=entry.get('last_modified') if entry else None
+            )
+        if result is None:
+            # Keep showing the stale copy rather than nothing
+            return entry.get('data') if entry else None
+        self.cache.put(object_id, result['data'], result['etag'], result['last_modified'])
+        return self.cache.get(object_id).get('data')
+
+    async def _fetch_once(self, object_id) -> Optional[Dict]:
+        key = str(object_id)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(object_id))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._fetch_done(key))
+        return await asyncio.shield(future)
+
+    def _fetch_done(self, key: str):
+        self._in_flight.pop(key, None)
+        # Fetches that outlive enrich()'s deadline are saved once the last one finishes
+        if not self._in_flight:
+            self.cache.save()
+
+    async def close(self):
+        """Cancel the fetches still running and save the cache"""
+        futures = list(self._in_flight.values())
+        for future in futures:
+            future.cancel()
+        await asyncio.gather(*futures, return_exceptions=True)
+        self.cache.save()
+
+    async def enrich(self, objects: List[Dict]):
+        """
+        Copy detail fields into objects that don't have them yet
+
+        At most max_objects objects are enriched per call, the rest are
+        notified without details. Failures are logged and never block
+        the notification, and neither do slow requests: after `deadline`
+        seconds the objects whose details are still missing are left as
+        they are. Their requests go on and fill the cache for later, which
+        is saved when the last of them finishes.
+        """
+        targets = [obj for obj in objects if obj.get('id') and any(obj.get(key) is None for key in DETAIL_FIELDS)]
+        if len(targets) > self.max_objects:
+            logger.info(f"Enriching only {self.max_objects} of {len(targets)} objects")
+            targets = targets[:self.max_objects]
+        if not targets:
+            return
+
+        tasks = {asyncio.ensure_future(self._fetch_once(obj['id'])): obj for obj in targets}
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline or None)
+        for task in pending:
+            # Only the waiting is cancelled, the shared fetch is shielded
+            task.cancel()
+        if pending:
+            logger.warning(f"Details of {len(pending)} of {len(targets)} objects not ready "
+                           f"after {self.deadline}s, notifying without them")
+        enriched = 0
+        for task in done:
+            obj = tasks[task]
+            details = task.exception() or task.result()
+            if isinstance(details, Exception):
+                logger.error(f"Error enriching object {obj.get('id')}: {details}")
+                continue
+            if details:
+                for key, value in details.items():
+                    if obj.get(key) is None:
+                        obj[key] = value
+                enriched += 1
+        self.cache.save()
+        logger.info(f"Enriched {enriched} of {len(targets)} objects with details")
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, FrozenSet, Optional
+
+logger = logging.getLogger(__name__)
+
+MINSK_TZ = timezone(timedelta(hours=3))
+# Upper bound for a single sleep so wall clock adjustments are picked up
+MAX_SLEEP_SECONDS = 3600
+
+
+def format_hours(hours: float) -> str:
+    """Human readable duration, e.g. '15 мин' or '2 ч'"""
+    if hours < 1:
+        return f"{hours * 60:g} мин"
+    return f"{hours:g} ч"
+
+
+class IntervalSchedule:
+    """Fires every N hours"""
+
+    def __init__(self, hours: float):
+        if hours <= 0:
+            raise ValueError(f"Check interval must be positive, got {hours}")
+        self.hours = hours
+        self.interval = timedelta(hours=hours)
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + self.interval
+
+    def describe(self) -> str:
+        if self.hours == 1:
+            return "каждый час"
+        return f"каждые {format_hours(self.hours)}"
+
+
+class CronSchedule:
+    """
+    Fires on minutes matching a 5-field cron spec (Minsk time)
+
+    Supports '*', numbers, ranges 'a-b', lists 'a,b' and steps '*/n' or 'a-b/n',
+    e.g. "*/30 8-20 * * 1-5" is every 30 minutes from 8:00 to 20:30 on weekdays.
+    As in cron, a day matches either field when both day of month and day
+    of week are restricted.
+    """
+
+    # (min, max) of minute, hour, day of month, month, day of week (0 and 7 are Sunday)
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, spec: str):
+        fields = spec.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron spec must have 5 fields, got {spec!r}")
+        self.spec = spec
+        minutes, hours, days, months, weekdays = (
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        )
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.days = days
+        self.months = months
+        # Cron counts weekdays from Sunday=0, datetime.weekday() from Monday=0
+        self.weekdays = frozenset((day - 1) % 7 for day in weekdays)
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> FrozenSet[int]:
+        values = set()
+        for item in field.split(','):
+            part, _, step = item.partition('/')
+            step = int(step) if step else 1
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = end = int(part)
+            if not (low <= start <= end <= high) or step < 1:
+                raise ValueError(f"Invalid cron field {field!r}")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        day_ok = day.day in self.days
+        weekday_ok = day.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        start = (moment + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        day = start.replace(hour=0, minute=0)
+        # Five years covers every satisfiable spec, including Feb 29
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"Cron spec {self.spec!r} never fires")
+
+    def describe(self) -> str:
+        return f"по расписанию `{self.spec}`"
+
+
+def create_schedule(interval_hours: Optional[float] = None, cron: Optional[str] = None):
+    """
+    Build a schedule from an interval or a cron spec
+
+    Args:
+        interval_hours: Check interval in hours
+        cron: Cron spec, takes precedence over the interval
+
+    Returns:
+        CronSchedule or IntervalSchedule
+
+    Raises:
+        ValueError if the spec is invalid
+    """
+    if cron:
+        return CronSchedule(cron)
+    return IntervalSchedule(interval_hours)
+
+
+@dataclass
+class Job:
+    """Periodic coroutine with its schedule and next deadline"""
+
+    name: str
+    run: Callable[[], Awaitable]
+    schedule: object
+    jitter: float = 0.0
+    # Deadline without jitter, next deadlines are computed from it so jitter doesn't drift
+    due: Optional[datetime] = None
+    next_run: Optional[datetime] = None
+    task: Optional[asyncio.Task] = None
+
+
+class Scheduler:
+    """
+    Runs periodic jobs as independent tasks
+
+    The scheduler sleeps until the earliest deadline instead of polling the
+    clock. Each run of a job is delayed by a random jitter of up to
+    job.jitter seconds; a run is skipped if the previous one is still going.
+    on_reschedule is called with deadlines() after every run moves a job's
+    deadline, so they can be saved and resumed with first_run after a restart.
+    """
+
+    def __init__(self, on_reschedule: Optional[Callable[[Dict[str, str]], None]] = None):
+        self.jobs: Dict[str, Job] = {}
+        self.on_reschedule = on_reschedule
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def add(self, name: str, run: Callable[[], Awaitable], schedule,
+            jitter: float = 0.0, first_run: Optional[datetime] = None) -> Job:
+        """
+        Register a job
+
+        Args:
+            name: Unique job name
+            run: Coroutine function called on every run
+            schedule: IntervalSchedule or CronSchedule
+            jitter: Maximum random delay of each run in seconds
+            first_run: First deadline, the first scheduled time from now if None
+
+        Returns:
+            Registered job
+        """
+        job = Job(name, run, schedule, jitter)
+        self._set_due(job, first_run or schedule.next_after(datetime.now(MINSK_TZ)))
+        self.jobs[name] = job
+        logger.info(f"Scheduled job '{name}' {schedule.describe()}, first run at "
+                    f"{job.next_run.strftime('%d.%m.%Y %H:%M:%S')}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def _set_due(self, job: Job, due: datetime):
+        job.due = due
+        job.next_run = due + timedelta(seconds=random.uniform(0, job.jitter)) if job.jitter else due
+
+    def deadlines(self) -> Dict[str, str]:
+        """Next deadline (without jitter) per job, in ISO format"""
+        return {name: job.due.isoformat() for name, job in self.jobs.items()}
+
+    def _rescheduled(self):
+        if self.on_reschedule is not None:
+            try:
+                self.on_reschedule(self.deadlines())
+            except Exception as e:
+                logger.error(f"Error saving schedule deadlines: {e}")
+
+    def next_run(self) -> Optional[datetime]:
+        """Earliest deadline of all jobs"""
+        return min((job.next_run for job in self.jobs.values()), default=None)
+
+    def _start(self, job: Job, now: datetime):
+        if job.task is not None and not job.task.done():
+            logger.warning(f"Job '{job.name}' is still running, skipping this run")
+        else:
+            job.task = asyncio.create_task(self._run_job(job))
+
+        due = job.schedule.next_after(job.due)
+        if due <= now:
+            # Deadlines were missed (e.g. the host was suspended), don't catch up
+            due = job.schedule.next_after(now)
+        self._set_due(job, due)
+        self._rescheduled()
+
+    @staticmethod
+    async def _run_job(job: Job):
+        try:
+            await job.run()
+        except Exception as e:
+            logger.error(f"Job '{job.name}' failed: {e}")
+
+    async def run(self):
+        """Run jobs until cancelled"""
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                now = datetime.now(MINSK_TZ)
+                for job in list(self.jobs.values()):
+                    if job.next_run <= now:
+                        self._start(job, now)
+
+                next_run = self.next_run()
+                timeout = MAX_SLEEP_SECONDS
+                if next_run is not None:
+                    timeout = min(timeout, max(0.0, (next_run - now).total_seconds()))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for job in self.jobs.values():
+                if job.task is not None:
+                    job.task.cancel()
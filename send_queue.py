@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_GROUP_RATE, SEND_MAX_ATTEMPTS
+)
+from metrics import MESSAGES, SEND_SECONDS
+from tracing import trace_id_var
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket refilled at a constant rate"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+    async def acquire(self):
+        """Wait for a token and take it"""
+        while True:
+            delay = self.delay()
+            if delay <= 0:
+                self.consume()
+                return
+            await asyncio.sleep(delay)
+
+
+class _Pending:
+    __slots__ = ('text', 'future', 'attempts', 'queued_at', 'trace_id')
+
+    def __init__(self, text: str, future: asyncio.Future):
+        self.text = text
+        self.future = future
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        # Delivery runs in the worker's tasks, keep the sender's correlation ID for its logs
+        self.trace_id = trace_id_var.get()
+
+
+class SendQueue:
+    """
+    Outbound Telegram message queue
+
+    Messages are delivered in order per chat while respecting the global
+    and per-chat Telegram limits. 429 responses pause sending for the given
+    retry_after and the message is retried without counting as a failure;
+    network errors and 5xx are retried with exponential backoff.
+    """
+
+    def __init__(self, telegram, global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_rate: float = TELEGRAM_CHAT_RATE, group_rate: float = TELEGRAM_GROUP_RATE,
+                 max_attempts: int = SEND_MAX_ATTEMPTS):
+        self.telegram = telegram
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_attempts = max_attempts
+        self._global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        # Pending messages per chat, rotated for round-robin fairness
+        self._chats: 'OrderedDict[str, deque]' = OrderedDict()
+        self._busy = set()
+        self._retry_at: Dict[str, float] = {}
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        # The loop keeps only weak references to tasks, in-flight deliveries are held here
+        self._deliveries = set()
+
+    @property
+    def depth(self) -> int:
+        """Number of messages waiting to be delivered"""
+        return sum(len(items) for items in self._chats.values())
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Negative chat IDs are groups and channels with a lower limit
+            rate = self.group_rate if chat_id.startswith('-') else self.chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate)
+        return bucket
+
+    def submit(self, chat_id, text: str) -> asyncio.Future:
+        """
+        Queue a message
+
+        Args:
+            chat_id: Target chat
+            text: Markdown message text
+
+        Returns:
+            Future resolved with True when delivered, False if it failed permanently
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self._chats.setdefault(str(chat_id), deque()).append(_Pending(text, future))
+        self._wakeup.set()
+        return future
+
+    async def send(self, chat_id, text: str) -> bool:
+        """Queue a message and wait until it is delivered"""
+        return await self.submit(chat_id, text)
+
+    async def stop(self):
+        """Stop taking queued messages and wait for the deliveries in flight"""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+    def _next_ready_chat(self):
+        """
+        Pick the next chat allowed to send
+
+        Returns:
+            (chat_id, None) if a chat can send now, otherwise (None, seconds to wait)
+        """
+        now = time.monotonic()
+        if self._paused_until > now:
+            return None, self._paused_until - now
+
+        min_wait = None
+        for chat_id, items in self._chats.items():
+            if not items or chat_id in self._busy:
+                continue
+            wait = max(self._chat_bucket(chat_id).delay(), self._retry_at.get(chat_id, 0) - now)
+            if wait <= 0:
+                self._chats.move_to_end(chat_id)
+                return chat_id, None
+            min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    async def _run(self):
+        while True:
+            chat_id, wait = self._next_ready_chat()
+            if chat_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._global_bucket.acquire()
+            self._chat_bucket(chat_id).consume()
+            self._busy.add(chat_id)
+            task = asyncio.create_task(self._deliver(chat_id))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    @staticmethod
+    def _settle(item: _Pending, result: bool):
+        MESSAGES.inc(result='sent' if result else 'failed')
+        SEND_SECONDS.observe(time.monotonic() - item.queued_at)
+        # The sender may have stopped waiting (e.g. its task was cancelled)
+        if not item.future.done():
+            item.future.set_result(result)
+
+    async def _deliver(self, chat_id: str):
+        """Send the head message of a chat and settle or reschedule it"""
+        items = self._chats[chat_id]
+        item = items[0]
+        trace_id_var.set(item.trace_id)
+        try:
+            response = await self.telegram.send_message(chat_id, item.text)
+            error_code = response.get('error_code') if response else None
+
+            if response and response.get('ok'):
+                items.popleft()
+                self._settle(item, True)
+            elif error_code == 429:
+                retry_after = (response.get('parameters') or {}).get('retry_after', 1)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                logger.warning(f"Telegram rate limit hit, pausing sends for {retry_after}s "
+                               f"({self.depth} messages queued)")
+            elif response is None or (error_code or 0) >= 500:
+                item.attempts += 1
+                if item.attempts >= self.max_attempts:
+                    logger.error(f"Giving up on message to {chat_id} after {item.attempts} attempts")
+                    items.popleft()
+                    self._settle(item, False)
+                else:
+                    backoff = min(60, 2 ** item.attempts) * random.uniform(0.5, 1.0)
+                    self._retry_at[chat_id] = time.monotonic() + backoff
+                    logger.warning(f"Transient send error to {chat_id}, retry in {backoff:.1f}s")
+            else:
+                # 400/403: the message or chat is invalid, retrying won't help
+                items.popleft()
+                self._settle(item, False)
+        except Exception as e:
+            logger.error(f"Error delivering message to {chat_id}: {e}")
+            items.popleft()
+            self._settle(item, False)
+        finally:
+            self._busy.discard(chat_id)
+            if not items:
+                self._chats.pop(chat_id, None)
+                self._retry_at.pop(chat_id, None)
+            self._wakeup.set()
@@ -6,16 +6,39 @@ ERI Bot - Simple version that works with current python-telegram-bot
 import asyncio
 import logging
 import sys
-import requests
-import json
 import os
-from datetime import datetime, timedelta
+import secrets
+import signal
+import time
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
 
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, INCREMENTAL_FETCH, TELEGRAM_POLL_TIMEOUT, COMMAND_MAX_AGE_SECONDS,
+    WEBHOOK_URL, WEBHOOK_SECRET, FANOUT_CONCURRENCY,
+    CHECK_INTERVAL_HOURS, CHECK_SCHEDULE, CHECK_JITTER_SECONDS,
+    ADAPTIVE_SCHEDULE, CHECK_MIN_INTERVAL_HOURS, CHECK_MAX_INTERVAL_HOURS, FULL_CHECK_HOURS, ENRICH_DETAILS,
+    NOTIFY_CHANGES, DEFAULT_PROFILE, METRICS_PORT, HEALTH_MAX_CHECK_AGE_HOURS
+)
 from api_client import AbandonedObjectsAPI
+from api_cache import CachedObjectsAPI
+from http_transport import HttpTransport
+from telegram_client import TelegramClient
+from send_queue import SendQueue
+from command_dispatcher import CommandDispatcher
+from webhook_server import WebhookServer
 from data_manager import DataManager
 from message_formatter import MessageFormatter
+from subscriptions import SubscriptionRegistry
+from subscribers import SubscriberRegistry
+from scheduler import Scheduler, IntervalSchedule, MINSK_TZ, create_schedule
+from adaptive_schedule import ArrivalModel, AdaptiveSchedule
+from object_details import DetailEnricher
+from metrics import (
+    NEW_OBJECTS, LAST_SUCCESS, POLL_SECONDS, SEEN_IDS, SEND_QUEUE_DEPTH, STARTUP_SECONDS, process_start_time
+)
+from metrics_server import MetricsServer
+from tracing import TraceIdFilter, span, trace_cycle
 
 # Configure logging with automatic rotation
 def setup_logging():
@@ -32,14 +55,15 @@ def setup_logging():
     # Create console handler
     console_handler = logging.StreamHandler(sys.stdout)
     
-    # Create formatter
+    # Create formatter, [trace_id] is the correlation ID of the check cycle ('-' outside of checks)
     formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
     )
     
     # Set formatter for both handlers
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+        handler.addFilter(TraceIdFilter())
     
     # Configure root logger
     logging.basicConfig(
@@ -59,18 +83,34 @@ class SimpleEriBot:
     def __init__(self):
         self.token = TELEGRAM_BOT_TOKEN
         self.chat_id = TELEGRAM_CHAT_ID
-        self.api_client = AbandonedObjectsAPI()
+        # One pooled async transport shared by eri2.nca.by and Telegram calls
+        self.transport = HttpTransport()
+        # Concurrent and back-to-back checks share one upstream fetch
+        self.api_client = CachedObjectsAPI(AbandonedObjectsAPI(self.transport))
         self.data_manager = DataManager()
-        self.formatter = MessageFormatter()
-        self.last_update_id = 0
-        self.last_command_time = 0  # Track last command time to prevent rapid duplicates
+        self.subscriptions = SubscriptionRegistry.load()
+        self.formatter = MessageFormatter(self.api_client)
+        self.enricher = DetailEnricher(self.api_client) if ENRICH_DETAILS else None
+        # Resume after the last update handled by the previous run; last command time
+        # per chat keeps commands that are delivered twice from running twice
+        self.last_update_id, self.last_command_times = self.data_manager.load_update_checkpoint()
+        self.handled_update_id = self.last_update_id
+        self._checkpointed_update_id = self.last_update_id
+        # Updates whose commands are still queued or running, the saved offset stays below them
+        self._running_updates = set()
         self.last_check_time = None  # Track last check time for status
         self.last_check_result = None  # Track last check result for status
-        
-        # Create separate session for Telegram API without proxy
-        self.telegram_session = requests.Session()
-        # Explicitly disable proxy for Telegram session
-        self.telegram_session.proxies = {}
+        self.outage_since = None  # Start of the current run of failed checks, alerted once
+        self._background_tasks = set()  # Checks running alongside polling
+        self.updates_queue = asyncio.Queue()  # Filled by consume_updates, drained by dispatch_updates
+        self.scheduler = Scheduler(on_reschedule=self.data_manager.save_schedule_deadlines)
+        # Publication statistics are collected even with a fixed schedule
+        self.arrival_model = ArrivalModel(self.data_manager.load_arrival_stats())
+        try:
+            self.check_schedule = create_schedule(CHECK_INTERVAL_HOURS, CHECK_SCHEDULE)
+        except ValueError as e:
+            logger.error(f"Invalid check schedule, falling back to hourly checks: {e}")
+            self.check_schedule = create_schedule(1)
         
         # Log proxy configuration
         http_proxy = os.getenv('HTTP_PROXY')
@@ -85,27 +125,38 @@ class SimpleEriBot:
         # Remove 'bot' prefix if present
         if self.token.startswith('bot'):
             self.token = self.token[3:]
+        
+        # Chats receiving notifications; TELEGRAM_CHAT_ID is always one of them
+        self.subscribers = SubscriberRegistry(default_chat_id=self.chat_id)
+        
+        self.telegram = TelegramClient(self.token, self.transport)
+        # All outgoing messages go through the rate-limited queue
+        self.send_queue = SendQueue(self.telegram)
+        # Commands run as their own tasks so a slow one never holds up the others
+        self.commands = CommandDispatcher(authorize=self.require_subscription, on_error=self.report_command_error)
+        self.register_commands()
+        
+        self.started_at = time.time()
+        self.last_success_at = None  # Unix time of the last successful check, for /healthz and /readyz
+        self.metrics_server = None
+        SEEN_IDS.set_function(self.data_manager.store.count_ids)
+        SEND_QUEUE_DEPTH.set_function(lambda: self.send_queue.depth)
     
-    async def send_message(self, text: str) -> bool:
-        """Send message via Telegram Bot API"""
+    def _spawn(self, coro):
+        """Run a coroutine as a background task so it never blocks polling"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+    
+    async def send_message(self, text: str, chat_id=None) -> bool:
+        """Send message via the rate-limited Telegram send queue"""
         try:
-            url = f"https://api.telegram.org/bot{self.token}/sendMessage"
-            data = {
-                'chat_id': self.chat_id,
-                'text': text,
-                'parse_mode': 'Markdown',
-                'disable_web_page_preview': True
-            }
-            
-            # Use session without proxy for Telegram API
-            response = self.telegram_session.post(url, json=data, timeout=30)
-            
-            if response.status_code == 200:
+            if await self.send_queue.send(chat_id or self.chat_id, text):
                 logger.info("Message sent successfully")
                 return True
-            else:
-                logger.error(f"Telegram API error: {response.status_code} - {response.text}")
-                return False
+            logger.error("Message could not be delivered")
+            return False
                 
         except Exception as e:
             logger.error(f"Error sending message: {e}")
@@ -114,55 +165,127 @@ class SimpleEriBot:
     async def test_connection(self) -> bool:
         """Test Telegram bot connection"""
         try:
-            url = f"https://api.telegram.org/bot{self.token}/getMe"
-            # Use session without proxy for Telegram API
-            response = self.telegram_session.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('ok'):
-                    bot_info = data.get('result', {})
-                    logger.info(f"Bot connected: @{bot_info.get('username', 'unknown')}")
-                    return True
+            bot_info = await self.telegram.get_me()
+            if bot_info is not None:
+                logger.info(f"Bot connected: @{bot_info.get('username', 'unknown')}")
+                return True
                     
-            logger.error(f"Bot connection failed: {response.text}")
+            logger.error("Bot connection failed")
             return False
             
         except Exception as e:
             logger.error(f"Error testing connection: {e}")
             return False
     
-    async def get_updates(self):
-        """Get updates from Telegram API to handle commands"""
-        try:
-            url = f"https://api.telegram.org/bot{self.token}/getUpdates"
-            params = {
-                'offset': self.last_update_id + 1,
-                'timeout': 1,  # Short timeout to not block
-                'allowed_updates': ['message'],
-                'limit': 10  # Limit number of updates
-            }
-            
-            # Use session without proxy for Telegram API
-            response = self.telegram_session.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('ok') and data.get('result'):
-                    updates = data['result']
-                    for update in updates:
-                        new_update_id = update['update_id']
-                        # Only process if this is a new update
-                        if new_update_id > self.last_update_id:
-                            self.last_update_id = new_update_id
-                            # Only process recent messages (within last 2 minutes)
-                            message = update.get('message', {})
-                            message_date = message.get('date', 0)
-                            current_time = datetime.now().timestamp()
-                            if current_time - message_date < 120:  # 2 minutes
-                                await self.handle_update(update)
-                        
-        except Exception as e:
-            logger.error(f"Error getting updates: {e}")
+    async def consume_updates(self):
+        """
+        Long-poll Telegram for updates and put them on the update queue
+        
+        getUpdates is held open by the server for up to TELEGRAM_POLL_TIMEOUT
+        seconds and returns as soon as an update arrives, so commands are
+        picked up within a network round-trip while idle traffic stays low.
+        """
+        self.record_listening()
+        while True:
+            try:
+                with POLL_SECONDS.time():
+                    updates = await self.telegram.get_updates(
+                        offset=self.last_update_id + 1,
+                        timeout=TELEGRAM_POLL_TIMEOUT,
+                        limit=100
+                    )
+                if updates is None:
+                    # Request failed - don't hammer the API
+                    await asyncio.sleep(5)
+                    continue
+                
+                for update in updates:
+                    self.enqueue_update(update)
+                            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error getting updates: {e}")
+                await asyncio.sleep(5)
+    
+    def enqueue_update(self, update):
+        """Queue an update from polling or the webhook for dispatch"""
+        new_update_id = update['update_id']
+        # Only process if this is a new update
+        if new_update_id > self.last_update_id:
+            self.last_update_id = new_update_id
+            # Only process recent messages
+            message = update.get('message', {})
+            message_date = message.get('date', 0)
+            current_time = datetime.now().timestamp()
+            if current_time - message_date < COMMAND_MAX_AGE_SECONDS:
+                self.updates_queue.put_nowait(update)
+    
+    async def start_update_sources(self):
+        """
+        Start receiving updates via webhook (if WEBHOOK_URL is set) or long polling
+        
+        Returns:
+            List of started tasks and the webhook server (None in polling mode)
+        """
+        tasks = [asyncio.create_task(self.dispatch_updates())]
+        
+        if WEBHOOK_URL:
+            secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+            server = WebhookServer(self.enqueue_update, secret)
+            await server.start()
+            # Pending updates are kept when resuming from a saved offset, see run_forever
+            if await self.telegram.set_webhook(WEBHOOK_URL, secret, drop_pending_updates=not self.last_update_id):
+                logger.info(f"Webhook registered: {WEBHOOK_URL}")
+                self.record_listening()
+            else:
+                logger.error("Failed to register webhook")
+            return tasks, server
+        
+        tasks.append(asyncio.create_task(self.consume_updates()))
+        return tasks, None
+    
+    async def dispatch_updates(self):
+        """
+        Take updates from the queue and hand them to the command handler
+        
+        The command handler only starts command tasks; see checkpoint_updates
+        for how commands that have not finished yet are kept for the next run.
+        """
+        while True:
+            update = await self.updates_queue.get()
+            try:
+                await self.handle_update(update)
+            finally:
+                self.handled_update_id = max(self.handled_update_id, update['update_id'])
+                self.updates_queue.task_done()
+            # One checkpoint per burst of commands: the JSON backend rewrites the whole file
+            if self.updates_queue.empty():
+                self.checkpoint_updates()
+    
+    def checkpoint_updates(self):
+        """
+        Save the update offset and command times if they changed since the last save
+        
+        The offset is the last handled update before the first one whose command
+        is still queued or running, so a restart fetches that command again.
+        Commands that finished after it are not repeated: their command times
+        are saved with the offset.
+        """
+        offset = min(self._running_updates) - 1 if self._running_updates else self.handled_update_id
+        if offset == self._checkpointed_update_id:
+            return
+        if self.data_manager.save_update_checkpoint(offset, self.last_command_times):
+            self._checkpointed_update_id = offset
+    
+    def _command_finished(self, task, update_id, chat_id, message_date):
+        """Mark the update of a finished command as handled (a cancelled one stays pending)"""
+        if task.cancelled():
+            return
+        self._running_updates.discard(update_id)
+        self.last_command_times[chat_id] = max(self.last_command_times.get(chat_id, 0), message_date)
+        if self.updates_queue.empty():
+            self.checkpoint_updates()
     
     async def handle_update(self, update):
         """Handle incoming Telegram update"""
@@ -172,282 +295,594 @@ class SimpleEriBot:
             chat_id = message.get('chat', {}).get('id')
             message_date = message.get('date', 0)
             
-            # Only respond to messages from our configured chat
-            if str(chat_id) != str(self.chat_id):
+            if chat_id is None:
                 return
             
-            # Only process commands that are newer than our last processed command
-            # and not older than 30 seconds to prevent processing old commands
+            # Only process commands that are newer than the last processed command of
+            # this chat and not older than COMMAND_MAX_AGE_SECONDS
             current_time = datetime.now().timestamp()
-            if text.startswith('/') and message_date > self.last_command_time and (current_time - message_date) < 30:
-                self.last_command_time = message_date
-                logger.info(f"Processing fresh command: {text.strip()} from {message_date}")
-                await self.handle_command(text.strip())
+            last_command_time = self.last_command_times.get(str(chat_id), 0)
+            if (text.startswith('/') and message_date > last_command_time
+                    and (current_time - message_date) < COMMAND_MAX_AGE_SECONDS):
+                logger.info(f"Processing fresh command: {text.strip()} from chat {chat_id} at {message_date}")
+                # Unknown commands don't count, they must not hide the next command of the chat;
+                # known ones count once they have finished
+                task = self.handle_command(text.strip(), chat_id)
+                if task is not None:
+                    self._running_updates.add(update['update_id'])
+                    task.add_done_callback(
+                        lambda done, update_id=update['update_id'], chat=str(chat_id), date=message_date:
+                        self._command_finished(done, update_id, chat, date)
+                    )
             elif text.startswith('/'):
                 logger.debug(f"Ignoring old/duplicate command: {text.strip()}, age: {current_time - message_date}s")
                 
         except Exception as e:
             logger.error(f"Error handling update: {e}")
     
-    async def handle_command(self, command):
-        """Handle bot commands"""
-        try:
-            if command == '/start':
-                welcome_message = (
-                    "🚀 Добро пожаловать в ERI Bot!\n\n"
-                    "🔍 Я отслеживаю появление новых заброшенных объектов в Минском районе за одну базовую "
-                    "и буду уведомлять вас о каждом новом объявлении.\n\n"
-                    "⏰ Проверка происходит каждый час.\n"
-                    "📱 Используйте /help для просмотра всех команд.\n\n"
-                    "✅ Мониторинг активен!"
-                )
-                await self.send_message(welcome_message)
-                logger.info("Start command executed")
+    def register_commands(self):
+        """Fill the command registry; /start and /help work for chats that are not subscribed"""
+        self.commands.register('/start', self.cmd_start, public=True)
+        self.commands.register('/help', self.cmd_help, public=True)
+        self.commands.register('/stop', self.cmd_stop)
+        self.commands.register('/status', self.cmd_status)
+        self.commands.register('/check', self.cmd_check)
+    
+    def handle_command(self, command, chat_id=None):
+        """
+        Start a bot command as its own task (see CommandDispatcher)
+        
+        Returns:
+            Task running the command, None for unknown commands
+        """
+        return self.commands.dispatch(chat_id or self.chat_id, command)
+    
+    async def require_subscription(self, chat_id):
+        """Let subscribed chats through, point the others to /start"""
+        if self.subscribers.get(chat_id) is not None:
+            return True
+        await self.send_message("ℹ️ Вы не подписаны на уведомления. Используйте /start", chat_id)
+        return False
+    
+    async def report_command_error(self, chat_id, command, error):
+        await self.send_message("❌ Ошибка при выполнении команды", chat_id)
+    
+    async def cmd_start(self, chat_id, args):
+        profiles = args or None
+        unknown = [name for name in args if name not in self.subscriptions.names()]
+        if unknown:
+            available = ", ".join(self.subscriptions.names())
+            await self.send_message(f"❌ Неизвестный профиль: {', '.join(unknown)}\nДоступные: {available}", chat_id)
+            return
+        self.subscribers.add(chat_id, profiles)
+        welcome_message = (
+            "🚀 Добро пожаловать в ERI Bot!\n\n"
+            "🔍 Я отслеживаю появление новых заброшенных объектов в Минском районе за одну базовую "
+            "и буду уведомлять вас о каждом новом объявлении.\n\n"
+            f"⏰ Проверка происходит {self.check_schedule.describe()}.\n"
+            "📱 Используйте /help для просмотра всех команд.\n\n"
+            "✅ Мониторинг активен!"
+        )
+        await self.send_message(welcome_message, chat_id)
+        logger.info("Start command executed")
+    
+    async def cmd_stop(self, chat_id, args):
+        self.subscribers.remove(chat_id)
+        await self.send_message("🔕 Вы отписались от уведомлений. Используйте /start, чтобы подписаться снова.", chat_id)
+        logger.info("Stop command executed")
+    
+    async def cmd_status(self, chat_id, args):
+        # Получаем данные из файла для актуального статуса
+        update_info = self.data_manager.get_last_update_info()
+        
+        if update_info.get('last_update'):
+            try:
+                from datetime import datetime, timezone, timedelta
+                last_update = datetime.fromisoformat(update_info['last_update'])
                 
-            elif command == '/status':
-                # Получаем данные из файла для актуального статуса
-                update_info = self.data_manager.get_last_update_info()
+                # Если время не имеет timezone info, предполагаем что это минское время
+                if last_update.tzinfo is None:
+                    minsk_tz = timezone(timedelta(hours=3))
+                    last_update = last_update.replace(tzinfo=minsk_tz)
                 
-                if update_info.get('last_update'):
-                    try:
-                        from datetime import datetime, timezone, timedelta
-                        last_update = datetime.fromisoformat(update_info['last_update'])
-                        
-                        # Если время не имеет timezone info, предполагаем что это минское время
-                        if last_update.tzinfo is None:
-                            minsk_tz = timezone(timedelta(hours=3))
-                            last_update = last_update.replace(tzinfo=minsk_tz)
-                        
-                        # Конвертируем в минское время для отображения
-                        minsk_tz = timezone(timedelta(hours=3))
-                        last_update_minsk = last_update.astimezone(minsk_tz)
-                        time_str = last_update_minsk.strftime("%d.%m.%Y в %H:%M")
-                        objects_count = update_info.get('objects_count', 0)
-                        
-                        status_message = (
-                            f"📊 Статус мониторинга ERI Bot\n\n"
-                            f"🕐 Последняя проверка: {time_str}\n"
-                            f"📋 Отслеживается объектов: {objects_count}\n\n"
-                            f"🔄 Интервал проверки: каждый час\n"
-                            f"🎯 Регион: Минский район за одну базовую\n"
-                            f"✅ Мониторинг активен"
-                        )
-                    except Exception as e:
-                        logger.error(f"Error parsing last update time: {e}")
-                        status_message = (
-                            f"📊 Статус мониторинга ERI Bot\n\n"
-                            f"🕐 Последняя проверка: данные повреждены\n"
-                            f"🔄 Интервал проверки: каждый час\n"
-                            f"🎯 Регион: Минский район за одну базовую\n"
-                            f"✅ Мониторинг активен"
-                        )
-                else:
-                    status_message = (
-                        f"📊 Статус мониторинга ERI Bot\n\n"
-                        f"🕐 Проверки еще не выполнялись\n"
-                        f"🔄 Интервал проверки: каждый час\n"
-                        f"🎯 Регион: Минский район за одну базовую\n"
-                        f"✅ Мониторинг активен"
-                    )
+                # Конвертируем в минское время для отображения
+                minsk_tz = timezone(timedelta(hours=3))
+                last_update_minsk = last_update.astimezone(minsk_tz)
+                time_str = last_update_minsk.strftime("%d.%m.%Y в %H:%M")
+                objects_count = update_info.get('objects_count', 0)
                 
-                await self.send_message(status_message)
-                logger.info("Status command executed")
+                status_message = (
+                    f"📊 Статус мониторинга ERI Bot\n\n"
+                    f"🕐 Последняя проверка: {time_str}\n"
+                    f"📋 Отслеживается объектов: {objects_count}\n"
+                    f"👥 Подписчиков: {len(self.subscribers)}\n\n"
+                    f"🔄 Интервал проверки: {self.check_schedule.describe()}\n"
+                    f"🎯 Регион: Минский район за одну базовую\n"
+                    f"✅ Мониторинг активен"
+                )
+            except Exception as e:
+                logger.error(f"Error parsing last update time: {e}")
+                status_message = (
+                    f"📊 Статус мониторинга ERI Bot\n\n"
+                    f"🕐 Последняя проверка: данные повреждены\n"
+                    f"🔄 Интервал проверки: {self.check_schedule.describe()}\n"
+                    f"🎯 Регион: Минский район за одну базовую\n"
+                    f"✅ Мониторинг активен"
+                )
+        else:
+            status_message = (
+                f"📊 Статус мониторинга ERI Bot\n\n"
+                f"🕐 Проверки еще не выполнялись\n"
+                f"🔄 Интервал проверки: {self.check_schedule.describe()}\n"
+                f"🎯 Регион: Минский район за одну базовую\n"
+                f"✅ Мониторинг активен"
+            )
+        
+        await self.send_message(status_message, chat_id)
+        logger.info("Status command executed")
+    
+    async def cmd_check(self, chat_id, args):
+        await self.manual_check(chat_id)
+    
+    async def cmd_help(self, chat_id, args):
+        help_message = (
+            "🤖 ERI Bot - Мониторинг заброшенных объектов\n\n"
+            "📋 Доступные команды:\n"
+            "• /start - Приветствие и информация о боте\n"
+            "• /status - Показать статус и время последней проверки\n"
+            "• /check - Запустить проверку вручную\n"
+            "• /stop - Отписаться от уведомлений\n"
+            "• /help - Показать это сообщение\n\n"
+            f"🔄 Бот автоматически проверяет новые объекты в Минском районе за одну базовую {self.check_schedule.describe()}.\n\n"
+            "ℹ️ Источник данных: eri2.nca.by"
+        )
+        await self.send_message(help_message, chat_id)
+        logger.info("Help command executed")
+
+    async def fetch_current_objects(self, profiles=None):
+        """Fetch the given (or all) search profiles, only the unseen heads in incremental mode"""
+        with span('fetch', profiles=profiles or 'all'):
+            return await self.subscriptions.fetch(self.api_client, self.data_manager, INCREMENTAL_FETCH, profiles)
+
+    def detect_changes(self, fetch_result, partial=False):
+        """
+        Diff a fetch result against saved state: new, updated and removed objects
+        
+        A partial result (only some profiles fetched) or an incomplete one (cut
+        short by MAX_PAGES, changed while read) is merged into the saved IDs:
+        it says nothing about the objects it lacks.
+        """
+        with span('diff', objects=len(fetch_result.objects)):
+            return self.data_manager.detect_changes(
+                fetch_result.objects, incremental=partial or not fetch_result.complete, matches=fetch_result.matches
+            )
+
+    async def _deliver(self, plan):
+        """
+        Send rendered messages to chats
+        
+        Delivery runs concurrently, at most FANOUT_CONCURRENCY chats at a time,
+        parts are sent to each chat in order.
+        
+        Args:
+            plan: List of (message parts, chat IDs)
+            
+        Returns:
+            Set of chat IDs the messages were addressed to
+        """
+        semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+        
+        async def deliver(chat_id, parts):
+            async with semaphore:
+                results = [await self.send_message(part, chat_id) for part in parts]
+                return all(results)
+        
+        deliveries = []
+        recipients = set()
+        for parts, chat_ids in plan:
+            deliveries.extend(deliver(chat_id, parts) for chat_id in chat_ids)
+            recipients.update(chat_ids)
+        
+        with span('send', chats=len(recipients)):
+            results = await asyncio.gather(*deliveries)
+        logger.info(f"Delivered notification to {sum(results)} of {len(results)} chats")
+        return recipients
+
+    async def notify_subscribers(self, new_objects, matches=None):
+        """
+        Deliver new objects to every subscribed chat
+        
+        Chats that should get the same objects share one rendered set of
+        message parts.
+        
+        Returns:
+            Set of chat IDs the notification was addressed to
+        """
+        if self.enricher is not None:
+            # Enrich copies: fetched objects may be reused (cache) and hashed again
+            new_objects = [dict(obj) for obj in new_objects]
+            # Once for all chat groups, before anything is rendered
+            with span('enrich', objects=len(new_objects)):
+                await self.enricher.enrich(new_objects)
+        
+        plan = []
+        with span('render', objects=len(new_objects)):
+            for objects, chat_ids in self.subscribers.plan_notifications(new_objects, matches):
+                parts = list(self.formatter.iter_new_objects_messages(objects))
+                if len(parts) > 1:
+                    logger.info(f"Notification about {len(objects)} objects split into {len(parts)} messages")
+                plan.append((parts, chat_ids))
+        return await self._deliver(plan)
+
+    async def notify_changes(self, changes, matches=None):
+        """
+        Deliver updated and removed objects to subscribed chats
+        
+        Updates go to the chats whose profiles returned the object, removals to
+        the chats whose profiles returned it last (the default profile's for
+        IDs saved before profiles were tracked).
+        
+        Returns:
+            Set of chat IDs the notification was addressed to
+        """
+        fields_by_id = {obj.get('id'): fields for obj, fields in changes.updated}
+        removed_ids = set(changes.removed)
+        routes = dict(matches or {})
+        routes.update((object_id, changes.removed_profiles.get(object_id) or [DEFAULT_PROFILE])
+                      for object_id in changes.removed)
+        objects = [obj for obj, _ in changes.updated] + [{'id': object_id} for object_id in changes.removed]
+        plan = []
+        with span('render', objects=len(objects)):
+            for chat_objects, chat_ids in self.subscribers.plan_notifications(objects, routes):
+                updated = [(obj, fields_by_id[obj['id']]) for obj in chat_objects if obj['id'] not in removed_ids]
+                removed = [obj['id'] for obj in chat_objects if obj['id'] in removed_ids]
+                plan.append((list(self.formatter.iter_change_messages(updated, removed)), chat_ids))
+        return await self._deliver(plan)
+
+    async def report_check_failure(self, error):
+        """Alert the admin chat about the first failed check of an outage only"""
+        if self.outage_since is not None:
+            logger.info(f"Check failed again ({error}), outage alert already sent")
+            return
+        self.outage_since = datetime.now(MINSK_TZ)
+        await self.send_message(self.formatter.format_outage_message(error, self.api_client.breaker.retry_in))
+
+    async def report_check_success(self):
+        """Tell the admin chat that checks work again after an alerted outage"""
+        if self.outage_since is None:
+            return
+        since, self.outage_since = self.outage_since, None
+        await self.send_message(self.formatter.format_recovery_message(since))
+
+    def record_check_success(self, new_objects):
+        """Update health and metrics after a check that fetched and diffed successfully"""
+        self.last_success_at = time.time()
+        LAST_SUCCESS.set(self.last_success_at)
+        NEW_OBJECTS.inc(len(new_objects))
+    
+    def record_listening(self):
+        """Report how long it took from process start until commands are received"""
+        startup_seconds = time.time() - process_start_time()
+        STARTUP_SECONDS.set(round(startup_seconds, 3))
+        logger.info(f"Listening for commands {startup_seconds:.2f}s after process start")
+    
+    def readiness_status(self):
+        """
+        Readiness for /readyz: the first check (or a later one) has succeeded
+        
+        Returns:
+            (ready, human readable detail)
+        """
+        if self.last_success_at is not None:
+            return True, f"last successful check {time.time() - self.last_success_at:.0f}s ago"
+        if self.api_client.last_error:
+            return False, f"no successful check yet, last error: {self.api_client.last_error}"
+        return False, "first check is running"
+    
+    def health_status(self):
+        """
+        Health for /healthz: a check succeeded within HEALTH_MAX_CHECK_AGE_HOURS
+        (counted from startup until the first success)
+        
+        Returns:
+            (healthy, human readable detail)
+        """
+        age = time.time() - (self.last_success_at or self.started_at)
+        healthy = age <= HEALTH_MAX_CHECK_AGE_HOURS * 3600
+        if self.last_success_at is None:
+            return healthy, f"no successful check yet, started {age:.0f}s ago"
+        return healthy, f"last successful check {age:.0f}s ago"
+    
+    def record_arrivals(self, profiles, new_objects, matches):
+        """
+        Feed the result of a successful check to the arrival model
+        
+        Args:
+            profiles: Names of the checked profiles, all if None
+            new_objects: New objects found by the check
+            matches: Object ID -> names of profiles that returned it
+        """
+        counts = {name: 0 for name in (profiles or self.subscriptions.names())}
+        for obj in new_objects:
+            for name in matches.get(obj.get('id'), ()):
+                if name in counts:
+                    counts[name] += 1
+        checked_at = datetime.now(MINSK_TZ)
+        for name, count in counts.items():
+            self.arrival_model.record(name, count, checked_at)
+        self.data_manager.save_arrival_stats(self.arrival_model.stats)
+
+    async def manual_check(self, chat_id=None):
+        """Perform a /check requested by the user and always report the result"""
+        chat_id = chat_id or self.chat_id
+        await self.send_message("🔍 Выполняю проверку новых объектов в Минском районе за одну базовую...", chat_id)
+        
+        async with trace_cycle('manual') as trace:
+            # Perform manual check with notification about results
+            try:
+                fetch_result = await self.fetch_current_objects()
                 
-            elif command == '/check':
-                await self.send_message("🔍 Выполняю проверку новых объектов в Минском районе за одну базовую...")
+                if fetch_result is None:
+                    # The requester always gets an answer, the outage alert is separate
+                    error_msg = self.formatter.format_error_message(
+                        self.formatter.describe_fetch_error(self.api_client.last_error)
+                    )
+                    await self.send_message(error_msg, chat_id)
+                    # Обновляем время последней попытки проверки даже при ошибке
+                    self.data_manager.update_last_check_time()
+                    self.data_manager.record_check_run('error')
+                    trace.result = 'fetch_failed'
+                    return False
                 
-                # Perform manual check with notification about results
-                try:
-                    current_objects = self.api_client.fetch_abandoned_objects()
-                    
-                    if current_objects is None:
-                        error_msg = self.formatter.format_error_message("Не удалось получить данные с API")
-                        await self.send_message(error_msg)
-                        # Обновляем время последней попытки проверки даже при ошибке
-                        self.data_manager.update_last_check_time()
-                        return
-                    
-                    # Get new objects
-                    new_objects = self.data_manager.get_new_objects(current_objects)
-                    
-                    # Обновляем время последней проверки
-                    if not new_objects:
-                        self.data_manager.update_last_check_time()
-                    
-                    if new_objects:
-                        message = self.formatter.format_new_objects_message(new_objects)
-                        await self.send_message(message)
-                        logger.info(f"Manual check: found {len(new_objects)} new objects")
-                    else:
-                        # For manual check, always send result
-                        no_objects_message = "🔍 Новых заброшенных объектов в Минском районе за одну базовую не найдено."
-                        await self.send_message(no_objects_message)
-                        logger.info("Manual check: no new objects found")
-                        
-                except Exception as e:
-                    logger.error(f"Error in manual check: {e}")
-                    error_msg = self.formatter.format_error_message(str(e))
-                    await self.send_message(error_msg)
+                await self.report_check_success()
+                # Get new objects
+                changes = self.detect_changes(fetch_result)
+                new_objects = changes.new
+                self.data_manager.record_check_run('ok', len(fetch_result.objects), len(new_objects))
+                self.record_arrivals(None, new_objects, fetch_result.matches)
+                self.record_check_success(new_objects)
                 
-                logger.info("Manual check command executed")
+                # Обновляем время последней проверки
+                if not new_objects:
+                    self.data_manager.update_last_check_time()
                 
-            elif command == '/help':
-                help_message = (
-                    "🤖 ERI Bot - Мониторинг заброшенных объектов\n\n"
-                    "📋 Доступные команды:\n"
-                    "• /start - Приветствие и информация о боте\n"
-                    "• /status - Показать статус и время последней проверки\n"
-                    "• /check - Запустить проверку вручную\n"
-                    "• /help - Показать это сообщение\n\n"
-                    "🔄 Бот автоматически проверяет новые объекты в Минском районе за одну базовую каждый час.\n\n"
-                    "ℹ️ Источник данных: eri2.nca.by"
-                )
-                await self.send_message(help_message)
-                logger.info("Help command executed")
+                # New objects go to every subscriber, not just the one who asked
+                recipients = await self.notify_subscribers(new_objects, fetch_result.matches) if new_objects else set()
+                if new_objects:
+                    logger.info(f"Manual check: found {len(new_objects)} new objects")
+                if NOTIFY_CHANGES and (changes.updated or changes.removed):
+                    await self.notify_changes(changes, fetch_result.matches)
                 
-        except Exception as e:
-            logger.error(f"Error handling command {command}: {e}")
-            await self.send_message("❌ Ошибка при выполнении команды")
-
-    async def check_and_notify(self):
-        """Check for new objects and send notifications"""
-        try:
-            logger.info("Starting scheduled check...")
-            
-            # Fetch current objects
-            current_objects = self.api_client.fetch_abandoned_objects()
-            
-            if current_objects is None:
-                error_msg = self.formatter.format_error_message("Не удалось получить данные с API")
-                await self.send_message(error_msg)
-                # Даже при ошибке обновляем время последней попытки проверки
-                self.data_manager.update_last_check_time()
-                return
-            
-            # Get new objects
-            new_objects = self.data_manager.get_new_objects(current_objects)
-            
-            # Update status tracking
-            self.last_check_time = datetime.now()
-            self.last_check_result = len(new_objects) if new_objects else 0
+                if str(chat_id) not in recipients:
+                    # For manual check, always send result
+                    no_objects_message = "🔍 Новых заброшенных объектов в Минском районе за одну базовую не найдено."
+                    await self.send_message(no_objects_message, chat_id)
+                    logger.info("Manual check: no new objects found for the requesting chat")
+                trace.result = 'ok'
+                    
+            except Exception as e:
+                logger.error(f"Error in manual check: {e}")
+                error_msg = self.formatter.format_error_message(str(e))
+                await self.send_message(error_msg, chat_id)
             
-            # Обновляем время последней проверки в файле (это делается автоматически в get_new_objects для новых объектов)
-            if not new_objects:
-                # Если новых объектов нет, все равно обновляем время последней проверки
-                self.data_manager.update_last_check_time()
+        logger.info("Manual check command executed")
+
+    async def check_and_notify(self, profiles=None):
+        """
+        Check for new objects and send notifications
+        
+        Args:
+            profiles: Names of the search profiles to check, all if None
             
-            if new_objects:
-                message = self.formatter.format_new_objects_message(new_objects)
-                success = await self.send_message(message)
+        Returns:
+            True if the objects were fetched and compared with the saved state
+        """
+        async with trace_cycle('scheduled') as trace:
+            try:
+                logger.info(f"Starting scheduled check{f' of {profiles}' if profiles else ''}...")
+                
+                # Fetch current objects
+                fetch_result = await self.fetch_current_objects(profiles)
+                
+                if fetch_result is None:
+                    await self.report_check_failure(self.formatter.describe_fetch_error(self.api_client.last_error))
+                    # Даже при ошибке обновляем время последней попытки проверки
+                    self.data_manager.update_last_check_time()
+                    self.data_manager.record_check_run('error')
+                    trace.result = 'fetch_failed'
+                    return
+                
+                await self.report_check_success()
+                # Get new objects
+                changes = self.detect_changes(fetch_result, partial=profiles is not None)
+                new_objects = changes.new
+                self.data_manager.record_check_run('ok', len(fetch_result.objects), len(new_objects))
+                self.record_arrivals(profiles, new_objects, fetch_result.matches)
+                self.record_check_success(new_objects)
+                
+                # Update status tracking
+                self.last_check_time = datetime.now()
+                self.last_check_result = len(new_objects) if new_objects else 0
                 
-                if success:
-                    logger.info(f"Sent notification about {len(new_objects)} new objects")
+                # Обновляем время последней проверки в файле (это делается автоматически в detect_changes для новых объектов)
+                if not new_objects:
+                    # Если новых объектов нет, все равно обновляем время последней проверки
+                    self.data_manager.update_last_check_time()
+                
+                if new_objects:
+                    recipients = await self.notify_subscribers(new_objects, fetch_result.matches)
+                    logger.info(f"Sent notification about {len(new_objects)} new objects to {len(recipients)} chats")
                 else:
-                    logger.error("Failed to send notification")
-            else:
-                logger.info("No new objects found")
+                    logger.info("No new objects found")
                 
-        except Exception as e:
-            logger.error(f"Error in check_and_notify: {e}")
-            error_msg = self.formatter.format_error_message(str(e))
-            await self.send_message(error_msg)
+                if NOTIFY_CHANGES and (changes.updated or changes.removed):
+                    await self.notify_changes(changes, fetch_result.matches)
+                trace.result = 'ok'
+                return True
+                    
+            except Exception as e:
+                logger.error(f"Error in check_and_notify: {e}")
+                await self.report_check_failure(str(e))
+                return False
+    
+    async def initial_check(self):
+        """First check after startup; its failure is reported with the likely causes"""
+        if await self.check_and_notify():
+            return
+        await self.send_message(
+            "⚠️ Внимание: API недоступен\n\n"
+            "Возможные причины:\n"
+            "• Геоблокировка (сервер не в Беларуси)\n"
+            "• Защита от ботов\n"
+            "• Изменения в API\n\n"
+            "Бот продолжит попытки подключения каждый час.\n"
+            "Используйте /check для ручной проверки."
+        )
+    
+    def schedule_checks(self):
+        """
+        Register periodic check jobs
+        
+        Profiles with their own interval_hours or schedule get a job each,
+        the rest are checked together on the global schedule. Seen IDs are
+        shared, so an object returned by profiles on different schedules is
+        announced by whichever check finds it first. Checks of some profiles
+        can't tell removed objects, so with several groups all profiles are
+        also checked together every FULL_CHECK_HOURS. Deadlines saved by the
+        previous run are resumed, so a restart does not postpone the next check.
+        """
+        saved_deadlines = self.data_manager.load_schedule_deadlines()
+        now = datetime.now(MINSK_TZ)
+        groups = self.subscriptions.schedule_groups()
+        for (interval_hours, cron), names in groups.items():
+            if interval_hours is None and cron is None:
+                schedule, job_name = self.check_schedule, 'check'
+            else:
+                try:
+                    schedule = create_schedule(interval_hours, cron)
+                except ValueError as e:
+                    logger.error(f"Invalid schedule of profiles {names}, using the global one: {e}")
+                    schedule = self.check_schedule
+                job_name = f"check:{','.join(names)}"
+            if ADAPTIVE_SCHEDULE and isinstance(schedule, IntervalSchedule):
+                schedule = AdaptiveSchedule(self.arrival_model, names, schedule.hours,
+                                            CHECK_MIN_INTERVAL_HOURS, CHECK_MAX_INTERVAL_HOURS)
+            # A single group covers every profile: check them all (and replace saved IDs)
+            profiles = None if len(groups) == 1 else names
+            self.scheduler.add(
+                job_name, lambda profiles=profiles: self.check_and_notify(profiles),
+                schedule, jitter=CHECK_JITTER_SECONDS,
+                first_run=self._resumed_deadline(saved_deadlines.get(job_name), schedule, now)
+            )
+        if len(groups) > 1 and FULL_CHECK_HOURS > 0:
+            schedule = IntervalSchedule(FULL_CHECK_HOURS)
+            self.scheduler.add(
+                'check:full', self.check_and_notify, schedule, jitter=CHECK_JITTER_SECONDS,
+                first_run=self._resumed_deadline(saved_deadlines.get('check:full'), schedule, now)
+            )
+        elif len(groups) > 1:
+            logger.warning("Profiles run on separate schedules and FULL_CHECK_HOURS=0: removed objects are not detected")
+        self.data_manager.save_schedule_deadlines(self.scheduler.deadlines())
+    
+    @staticmethod
+    def _resumed_deadline(saved, schedule, now):
+        """
+        Saved deadline of a job if it is still ahead and within the current schedule
+        (the schedule may have been shortened); a missed one is covered by the first check
+        """
+        if not saved:
+            return None
+        try:
+            due = datetime.fromisoformat(saved)
+        except (TypeError, ValueError):
+            return None
+        if now < due <= schedule.next_after(now):
+            return due
+        return None
     
     async def run_forever(self):
-        """Run the bot with hourly checks"""
+        """Run the bot with scheduled checks"""
         logger.info("Starting ERI Bot (Simple Version)...")
         logger.info("Log rotation configured: 10MB max size, 5 backup files")
         
-        # Test connection first
-        if not await self.test_connection():
+        # Metrics and /healthz are up before the first check so the healthcheck sees startup
+        if METRICS_PORT:
+            self.metrics_server = MetricsServer(self.health_status, ready=self.readiness_status)
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"Could not start metrics server: {e}")
+                self.metrics_server = None
+        
+        # Independent round trips run together: the token check and, in polling mode,
+        # removing a leftover webhook (it would make getUpdates fail). With an update
+        # offset saved by the previous run, commands sent while the bot was down are
+        # picked up from there; on the very first start they are dropped instead
+        resumed = bool(self.last_update_id)
+        if resumed:
+            logger.info(f"Resuming Telegram updates after update_id {self.last_update_id}")
+        if WEBHOOK_URL:
+            connected = await self.test_connection()
+        else:
+            connected, _ = await asyncio.gather(
+                self.test_connection(), self.telegram.delete_webhook(drop_pending_updates=not resumed)
+            )
+        if not connected:
             logger.error("Failed to connect to Telegram. Check your bot token.")
             return
         
-        # Clear ALL pending messages to avoid processing old commands
-        try:
-            logger.info("Clearing all pending messages...")
-            url = f"https://api.telegram.org/bot{self.token}/getUpdates"
-            
-            # Get all pending updates (use Telegram session without proxy)
-            response = self.telegram_session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('ok') and data.get('result'):
-                    updates = data['result']
-                    if updates:
-                        # Mark all as processed by setting offset to last update_id + 1
-                        last_id = updates[-1]['update_id']
-                        logger.info(f"Found {len(updates)} pending updates, clearing them...")
-                        
-                        # Clear all pending updates (use Telegram session without proxy)
-                        clear_response = self.telegram_session.get(
-                            url, 
-                            params={'offset': last_id + 1}, 
-                            timeout=10
-                        )
-                        
-                        self.last_update_id = last_id
-                        logger.info(f"Cleared all pending messages. Starting from update_id: {self.last_update_id}")
-                    else:
-                        logger.info("No pending messages found")
-        except Exception as e:
-            logger.warning(f"Could not clear pending messages: {e}")
+        # Commands are received and handled by dedicated tasks, from now on
+        update_tasks, webhook_server = await self.start_update_sources()
         
-        # Send startup message
+        # The startup message and the first check run in the background; the first
+        # check also tells /readyz whether eri2.nca.by is reachable
         startup_msg = "🚀 ERI Bot запущен и начинает мониторинг заброшенных объектов в Минском районе за одну базовую"
-        await self.send_message(startup_msg)
-        
-        # Initial check
-        await self.check_and_notify()
-        
-        # Check if API is accessible
-        test_result = self.api_client.fetch_abandoned_objects()
-        if test_result is None:
-            error_msg = (
-                "⚠️ Внимание: API недоступен\n\n"
-                "Возможные причины:\n"
-                "• Геоблокировка (сервер не в Беларуси)\n"
-                "• Защита от ботов\n"
-                "• Изменения в API\n\n"
-                "Бот продолжит попытки подключения каждый час.\n"
-                "Используйте /check для ручной проверки."
-            )
-            await self.send_message(error_msg)
+        self._spawn(self.send_message(startup_msg))
+        self._spawn(self.initial_check())
         
-        last_check_time = datetime.now()
+        # Checks run as independent tasks: a slow ERI response must not delay polling
+        self.schedule_checks()
         
-        while True:
-            try:
-                # Check for commands less frequently to avoid duplicates
-                await self.get_updates()
-                
-                # Check if it's time for scheduled check (every hour for production)
-                now = datetime.now()
-                if now - last_check_time >= timedelta(hours=1):
-                    await self.check_and_notify()
-                    last_check_time = now
-                
-                # Longer sleep to avoid command duplication
-                await asyncio.sleep(5)
-                
-            except KeyboardInterrupt:
-                logger.info("Received keyboard interrupt")
-                break
-            except Exception as e:
-                logger.error(f"Unexpected error: {e}")
-                await asyncio.sleep(10)  # Wait 10 seconds on error
+        try:
+            await self.scheduler.run()
+        finally:
+            for task in update_tasks:
+                task.cancel()
+            if webhook_server is not None:
+                await webhook_server.stop()
 
 
 async def main():
     """Main entry point"""
+    bot = None
+    # docker stop sends SIGTERM: shut down through the finally block below so the
+    # update offset is saved (not supported by the Windows event loop)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (NotImplementedError, AttributeError):
+        pass
     try:
         bot = SimpleEriBot()
         await bot.run_forever()
         
     except KeyboardInterrupt:
         logger.info("Program interrupted by user")
+    except asyncio.CancelledError:
+        logger.info("Stopping on SIGTERM")
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         sys.exit(1)
+    finally:
+        if bot is not None:
+            bot.checkpoint_updates()
+            await bot.send_queue.stop()
+            if bot.enricher is not None:
+                await bot.enricher.close()
+            if bot.metrics_server is not None:
+                await bot.metrics_server.stop()
+            if bot.api_client.capture is not None:
+                bot.api_client.capture.close()
+            await bot.transport.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,555 @@
+import json
+import logging
+import os
+import sqlite3
+import struct
+from typing import Dict, Iterable, List, Set, Any
+
+from config import DATA_FILE, STATE_BACKEND, STATE_DB_FILE, STATE_INDEX_FILE, ID_INDEX_BLOOM_BITS
+from id_index import IdIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _file_signature(path: str):
+    """Identify the current version of a file by inode, mtime and size"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class StateStore:
+    """Base class for state backends used by DataManager"""
+
+    def load_ids(self) -> Set[int]:
+        """Return all currently tracked object IDs"""
+        raise NotImplementedError
+
+    def known_ids(self, ids: Iterable[int]) -> Set[int]:
+        """Return the subset of ids seen before, tracked or removed"""
+        raise NotImplementedError
+
+    def missing_ids(self, ids: Iterable[int]) -> List[int]:
+        """Return the tracked IDs that are not among ids, ascending"""
+        raise NotImplementedError
+
+    def count_ids(self) -> int:
+        """Return the number of tracked object IDs"""
+        raise NotImplementedError
+
+    def save_ids(self, ids: Iterable[int], replace: bool, timestamp: str, meta: Dict = None,
+                 hashes: Dict[int, int] = None, profiles: Dict[int, List[str]] = None):
+        """
+        Store object IDs seen by a check
+
+        Args:
+            ids: Object IDs returned by the check
+            replace: True to make ids the whole tracked set, False to add them. IDs that
+                stop being tracked are kept as removed: known, with their hashes
+            timestamp: Check time, stored as 'last_update'
+            meta: Extra metadata keys written in the same transaction
+            hashes: Content hashes of (some of) the ids, stored with them
+            profiles: Names of the search profiles that returned (some of) the ids;
+                they replace the stored ones with replace, otherwise they are added
+        """
+        raise NotImplementedError
+
+    def load_hashes(self, ids: Iterable[int]) -> Dict[int, int]:
+        """Return the stored content hashes of tracked or removed ids (IDs without a hash are left out)"""
+        raise NotImplementedError
+
+    def load_profiles(self, ids: Iterable[int]) -> Dict[int, List[str]]:
+        """Return the profiles that last returned tracked ids (IDs saved without profiles are left out)"""
+        raise NotImplementedError
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set_meta(self, key: str, value: Any):
+        raise NotImplementedError
+
+    def record_check_run(self, timestamp: str, status: str, objects_count: int, new_count: int):
+        """Append an entry to the check-run log (no-op if unsupported)"""
+
+    def close(self):
+        """Release backend resources"""
+
+
+class JsonStateStore(StateStore):
+    """
+    State kept in a single JSON file (original last_check_data.json format)
+    
+    The parsed file is kept in memory and written through on change; it is
+    re-read only when the file's inode, mtime or size changes underneath us.
+    """
+
+    def __init__(self, data_file: str = DATA_FILE):
+        self.data_file = data_file
+        self._data = None
+        self._ids: Set[int] = set()
+        self._removed: Set[int] = set()
+        self._signature = None
+
+    def _read(self) -> Dict:
+        if not os.path.exists(self.data_file):
+            logger.info(f"Data file {self.data_file} does not exist, starting fresh")
+            return {}
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Error loading data file: {e}")
+            return {}
+
+    def _state(self) -> Dict:
+        """Return the cached file contents, reloading them if the file changed"""
+        signature = _file_signature(self.data_file)
+        if self._data is None or signature != self._signature:
+            if self._data is not None:
+                logger.info(f"Data file {self.data_file} changed on disk, reloading")
+            self._set_cache(self._read(), signature)
+        return self._data
+
+    def _set_cache(self, data: Dict, signature):
+        self._data = data
+        # Поддерживаем оба формата: новый (last_checked_ids) и старый (last_ids)
+        self._ids = set(data.get('last_checked_ids', data.get('last_ids', [])))
+        self._removed = set(data.get('removed_ids', []))
+        self._signature = signature
+
+    def _write(self, data: Dict):
+        # Write to a temp file and rename so a crash never leaves a torn file
+        tmp_file = f"{self.data_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.data_file)
+        self._set_cache(data, _file_signature(self.data_file))
+
+    def load_ids(self) -> Set[int]:
+        self._state()
+        return set(self._ids)
+
+    def known_ids(self, ids: Iterable[int]) -> Set[int]:
+        self._state()
+        return {object_id for object_id in ids if object_id in self._ids or object_id in self._removed}
+
+    def missing_ids(self, ids: Iterable[int]) -> List[int]:
+        self._state()
+        return sorted(self._ids.difference(ids))
+
+    def count_ids(self) -> int:
+        return self._state().get('objects_count', len(self._ids))
+
+    def save_ids(self, ids: Iterable[int], replace: bool, timestamp: str, meta: Dict = None,
+                 hashes: Dict[int, int] = None, profiles: Dict[int, List[str]] = None):
+        data = dict(self._state())
+        ids = set(ids)
+        removed = (self._removed | self._ids) - ids if replace else self._removed - ids
+        if not replace:
+            ids |= self._ids
+        data.pop('last_ids', None)
+        data['last_checked_ids'] = list(ids)
+        if removed or 'removed_ids' in data:
+            data['removed_ids'] = sorted(removed)
+        data['last_update'] = timestamp
+        data['objects_count'] = len(ids)
+        data.update(meta or {})
+        stored_hashes = data.get('content_hashes') or {}
+        if hashes or stored_hashes:
+            # Keys are strings in JSON; hashes of removed IDs are kept for when they come back
+            merged = {key: value for key, value in stored_hashes.items() if int(key) in ids or int(key) in removed}
+            merged.update((str(object_id), value) for object_id, value in (hashes or {}).items())
+            data['content_hashes'] = merged
+        stored_profiles = data.get('object_profiles') or {}
+        if profiles or stored_profiles:
+            # Only needed to route removals, so removed IDs drop theirs
+            merged = {key: value for key, value in stored_profiles.items() if int(key) in ids}
+            for object_id, names in (profiles or {}).items():
+                key = str(object_id)
+                merged[key] = sorted(set(names) if replace else set(names).union(merged.get(key, ())))
+            data['object_profiles'] = merged
+        self._write(data)
+
+    def load_hashes(self, ids: Iterable[int]) -> Dict[int, int]:
+        stored_hashes = self._state().get('content_hashes') or {}
+        return {object_id: stored_hashes[str(object_id)] for object_id in ids if str(object_id) in stored_hashes}
+
+    def load_profiles(self, ids: Iterable[int]) -> Dict[int, List[str]]:
+        stored_profiles = self._state().get('object_profiles') or {}
+        return {object_id: stored_profiles[str(object_id)] for object_id in ids if str(object_id) in stored_profiles}
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        return self._state().get(key, default)
+
+    def set_meta(self, key: str, value: Any):
+        data = dict(self._state())
+        data.setdefault('last_checked_ids', [])
+        data[key] = value
+        self._write(data)
+
+
+class SqliteStateStore(StateStore):
+    """
+    State kept in SQLite: indexed seen-IDs table, metadata and check-run log
+    
+    Active IDs, removed (inactive) IDs and metadata are cached in memory and written through;
+    the cache is reloaded when PRAGMA data_version shows a commit made
+    by another connection.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS seen_objects (
+            id INTEGER PRIMARY KEY,
+            first_seen TEXT,
+            last_seen TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            content_hash INTEGER,
+            profiles TEXT
+        );
+        CREATE INDEX IF NOT EXISTS seen_objects_active ON seen_objects (active);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS check_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            checked_at TEXT NOT NULL,
+            status TEXT NOT NULL,
+            objects_count INTEGER NOT NULL,
+            new_count INTEGER NOT NULL
+        );
+    """
+
+    # SQLite limits the number of bound parameters per statement
+    QUERY_CHUNK = 500
+
+    def __init__(self, db_file: str = STATE_DB_FILE, import_from: str = DATA_FILE):
+        self.db_file = db_file
+        self._ids: Set[int] = None
+        self._removed: Set[int] = set()
+        self._meta: Dict = {}
+        self._data_version = None
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(seen_objects)")}
+        if 'content_hash' not in columns:
+            # Databases created before content hashes were tracked
+            with self.conn:
+                self.conn.execute("ALTER TABLE seen_objects ADD COLUMN content_hash INTEGER")
+        if 'profiles' not in columns:
+            # Databases created before profiles were tracked per object
+            with self.conn:
+                self.conn.execute("ALTER TABLE seen_objects ADD COLUMN profiles TEXT")
+        if import_from and self.get_meta('imported_from') is None:
+            self._import_json(import_from)
+
+    def _import_json(self, data_file: str):
+        """Import state from the JSON file format on first start"""
+        if not os.path.exists(data_file):
+            self.set_meta('imported_from', '')
+            return
+        json_store = JsonStateStore(data_file)
+        ids = json_store.load_ids()
+        timestamp = json_store.get_meta('last_update')
+        meta = {'imported_from': data_file}
+        for key in ('high_water_marks', 'high_water_mark'):
+            if json_store.get_meta(key) is not None:
+                meta[key] = json_store.get_meta(key)
+        self.save_ids(ids, True, timestamp, meta, profiles=json_store.load_profiles(ids))
+        logger.info(f"Imported {len(ids)} IDs from {data_file} into {self.db_file}")
+
+    def _sync_cache(self):
+        """Load the cache on first use or after an external commit"""
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._ids is None or data_version != self._data_version:
+            if self._ids is not None:
+                logger.info(f"State database {self.db_file} changed externally, reloading")
+            self._ids, self._removed = set(), set()
+            for object_id, active in self.conn.execute("SELECT id, active FROM seen_objects"):
+                (self._ids if active else self._removed).add(object_id)
+            self._meta = {key: json.loads(value) for key, value in self.conn.execute("SELECT key, value FROM meta")}
+            self._data_version = data_version
+
+    def load_ids(self) -> Set[int]:
+        self._sync_cache()
+        return set(self._ids)
+
+    def known_ids(self, ids: Iterable[int]) -> Set[int]:
+        self._sync_cache()
+        return {object_id for object_id in ids if object_id in self._ids or object_id in self._removed}
+
+    def missing_ids(self, ids: Iterable[int]) -> List[int]:
+        self._sync_cache()
+        return sorted(self._ids.difference(ids))
+
+    def count_ids(self) -> int:
+        self._sync_cache()
+        return len(self._ids)
+
+    def save_ids(self, ids: Iterable[int], replace: bool, timestamp: str, meta: Dict = None,
+                 hashes: Dict[int, int] = None, profiles: Dict[int, List[str]] = None):
+        ids = list(set(ids))
+        hashes = hashes or {}
+        profiles = profiles or {}
+        self._sync_cache()
+        if profiles and not replace:
+            stored = self.load_profiles(profiles)
+            profiles = {object_id: set(names).union(stored.get(object_id, ())) for object_id, names in profiles.items()}
+        with self.conn:
+            if replace:
+                self.conn.execute("UPDATE seen_objects SET active = 0 WHERE active = 1")
+            self.conn.executemany(
+                "INSERT INTO seen_objects (id, first_seen, last_seen, active, content_hash, profiles) "
+                "VALUES (?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_seen = excluded.last_seen, active = 1, "
+                "content_hash = COALESCE(excluded.content_hash, content_hash), "
+                "profiles = COALESCE(excluded.profiles, profiles)",
+                ((object_id, timestamp, timestamp, hashes.get(object_id),
+                  json.dumps(sorted(profiles[object_id])) if object_id in profiles else None)
+                 for object_id in ids)
+            )
+            self._set_meta_items(dict(meta or {}, last_update=timestamp))
+        if replace:
+            self._removed = (self._removed | self._ids).difference(ids)
+            self._ids = set(ids)
+        else:
+            self._removed.difference_update(ids)
+            self._ids.update(ids)
+
+    def load_hashes(self, ids: Iterable[int]) -> Dict[int, int]:
+        ids = list(ids)
+        hashes = {}
+        for start in range(0, len(ids), self.QUERY_CHUNK):
+            chunk = ids[start:start + self.QUERY_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            hashes.update(self.conn.execute(
+                f"SELECT id, content_hash FROM seen_objects WHERE id IN ({placeholders}) "
+                f"AND content_hash IS NOT NULL", chunk
+            ))
+        return hashes
+
+    def load_profiles(self, ids: Iterable[int]) -> Dict[int, List[str]]:
+        ids = list(ids)
+        profiles = {}
+        for start in range(0, len(ids), self.QUERY_CHUNK):
+            chunk = ids[start:start + self.QUERY_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            profiles.update(
+                (object_id, json.loads(names)) for object_id, names in self.conn.execute(
+                    f"SELECT id, profiles FROM seen_objects WHERE id IN ({placeholders}) "
+                    f"AND active = 1 AND profiles IS NOT NULL", chunk
+                )
+            )
+        return profiles
+
+    def _set_meta_items(self, items: Dict):
+        self.conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            ((key, json.dumps(value, ensure_ascii=False)) for key, value in items.items())
+        )
+        self._meta.update(items)
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        self._sync_cache()
+        return self._meta.get(key, default)
+
+    def set_meta(self, key: str, value: Any):
+        self._sync_cache()
+        with self.conn:
+            self._set_meta_items({key: value})
+
+    def record_check_run(self, timestamp: str, status: str, objects_count: int, new_count: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO check_runs (checked_at, status, objects_count, new_count) VALUES (?, ?, ?, ?)",
+                (timestamp, status, objects_count, new_count)
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class IndexStateStore(StateStore):
+    """
+    Seen IDs in a compact binary IdIndex file, metadata in a small JSON sidecar
+    
+    Memory and load time stay flat for very large histories: 16 bytes per ID
+    (ID and content hash, plus the optional Bloom filter) and a single read on
+    load, another 16 for its profiles. IDs that left the results are kept in a second index with the same
+    layout. A third one stores, in place of the hash, a bitmask of the profiles
+    that returned each tracked ID (bit positions listed in the 'profile_slots'
+    metadata key). All files are cached in memory and reloaded only when they
+    change on disk.
+    """
+
+    # Profile bits stay clear of the sign bit of the int64 slot, 0 means no profiles
+    MAX_PROFILE_SLOTS = 63
+
+    def __init__(self, index_file: str = STATE_INDEX_FILE, import_from: str = DATA_FILE,
+                 bloom_bits_per_id: int = ID_INDEX_BLOOM_BITS):
+        self.index_file = index_file
+        self.removed_file = f"{index_file}.removed"
+        self.profiles_file = f"{index_file}.profiles"
+        self.meta_file = f"{index_file}.json"
+        self.bloom_bits_per_id = bloom_bits_per_id
+        # path -> (IdIndex, file signature)
+        self._indexes: Dict[str, tuple] = {}
+        self._meta: Dict = None
+        self._meta_signature = None
+        if import_from and not os.path.exists(index_file) and os.path.exists(import_from):
+            self._import_json(import_from)
+
+    def _import_json(self, data_file: str):
+        """Import state from the JSON file format on first start"""
+        json_store = JsonStateStore(data_file)
+        ids = json_store.load_ids()
+        meta = {key: json_store.get_meta(key) for key in ('high_water_marks', 'high_water_mark')
+                if json_store.get_meta(key) is not None}
+        self.save_ids(ids, True, json_store.get_meta('last_update'), meta, profiles=json_store.load_profiles(ids))
+        logger.info(f"Imported {len(ids)} IDs from {data_file} into {self.index_file}")
+
+    def _load_index(self, path: str) -> IdIndex:
+        signature = _file_signature(path)
+        cached = self._indexes.get(path)
+        if cached is not None and cached[1] == signature:
+            return cached[0]
+        try:
+            if signature is not None:
+                index = IdIndex.load(path, self.bloom_bits_per_id)
+            else:
+                index = IdIndex(bloom_bits_per_id=self.bloom_bits_per_id)
+        except (OSError, ValueError, struct.error) as e:
+            logger.error(f"Error loading ID index {path}: {e}")
+            index = IdIndex(bloom_bits_per_id=self.bloom_bits_per_id)
+        self._indexes[path] = (index, signature)
+        return index
+
+    def _save_index(self, path: str, index: IdIndex):
+        index.save(path)
+        self._indexes[path] = (index, _file_signature(path))
+
+    def _get_index(self) -> IdIndex:
+        return self._load_index(self.index_file)
+
+    def _get_removed(self) -> IdIndex:
+        return self._load_index(self.removed_file)
+
+    def _profile_masks(self, profiles: Dict[int, List[str]], slots: List[str]) -> Dict[int, int]:
+        """Profile names as bitmasks, new names get the next free slot"""
+        masks = {}
+        for object_id, names in profiles.items():
+            mask = 0
+            for name in names:
+                if name not in slots:
+                    if len(slots) >= self.MAX_PROFILE_SLOTS:
+                        logger.warning(f"Too many profiles to track per object, ignoring '{name}'")
+                        continue
+                    slots.append(name)
+                mask |= 1 << slots.index(name)
+            masks[object_id] = mask
+        return masks
+
+    def _get_meta(self) -> Dict:
+        signature = _file_signature(self.meta_file)
+        if self._meta is None or signature != self._meta_signature:
+            self._meta = JsonStateStore(self.meta_file)._read() if signature is not None else {}
+            self._meta_signature = signature
+        return self._meta
+
+    def _write_meta(self, meta: Dict):
+        tmp_file = f"{self.meta_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_file, self.meta_file)
+        self._meta = meta
+        self._meta_signature = _file_signature(self.meta_file)
+
+    def load_ids(self) -> Set[int]:
+        return set(self._get_index())
+
+    def known_ids(self, ids: Iterable[int]) -> Set[int]:
+        ids = set(ids)
+        known = self._get_index().intersection(ids)
+        return known | self._get_removed().intersection(ids - known)
+
+    def missing_ids(self, ids: Iterable[int]) -> List[int]:
+        return self._get_index().difference(ids).tolist()
+
+    def count_ids(self) -> int:
+        return len(self._get_index())
+
+    def save_ids(self, ids: Iterable[int], replace: bool, timestamp: str, meta: Dict = None,
+                 hashes: Dict[int, int] = None, profiles: Dict[int, List[str]] = None):
+        ids = set(ids)
+        meta = dict(meta or {})
+        if profiles or os.path.exists(self.profiles_file):
+            slots = list(self.get_meta('profile_slots') or [])
+            masks = self._profile_masks(profiles or {}, slots)
+            profile_index = self._load_index(self.profiles_file)
+            if replace:
+                profile_index.replace(ids, masks)
+            else:
+                stored = profile_index.hashes_of(masks)
+                profile_index.add_many(masks, {object_id: mask | stored.get(object_id, 0)
+                                               for object_id, mask in masks.items()})
+            self._save_index(self.profiles_file, profile_index)
+            meta['profile_slots'] = slots
+        index, removed = self._get_index(), self._get_removed()
+        removed_count = len(removed)
+        if replace:
+            dropped = index.difference(ids)
+            removed.add_many(dropped, index.hashes_of(dropped))
+            index.replace(ids, hashes)
+        else:
+            index.add_many(ids, hashes)
+        removed.discard_many(ids)
+        self._save_index(self.index_file, index)
+        if len(removed) != removed_count:
+            self._save_index(self.removed_file, removed)
+        self._write_meta(dict(self._get_meta(), last_update=timestamp, **meta))
+
+    def load_hashes(self, ids: Iterable[int]) -> Dict[int, int]:
+        ids = list(ids)
+        hashes = self._get_removed().hashes_of(ids)
+        hashes.update(self._get_index().hashes_of(ids))
+        return hashes
+
+    def load_profiles(self, ids: Iterable[int]) -> Dict[int, List[str]]:
+        if not os.path.exists(self.profiles_file):
+            return {}
+        slots = self.get_meta('profile_slots') or []
+        return {
+            object_id: [name for bit, name in enumerate(slots) if mask >> bit & 1]
+            for object_id, mask in self._load_index(self.profiles_file).hashes_of(ids).items()
+        }
+
+    def get_meta(self, key: str, default: Any = None) -> Any:
+        return self._get_meta().get(key, default)
+
+    def set_meta(self, key: str, value: Any):
+        self._write_meta(dict(self._get_meta(), **{key: value}))
+
+
+def create_store(backend: str = STATE_BACKEND, data_file: str = DATA_FILE) -> StateStore:
+    """
+    Create the configured state backend
+
+    Args:
+        backend: 'json', 'sqlite' or 'index'
+        data_file: JSON state file (used directly or imported on first start)
+
+    Returns:
+        StateStore instance
+    """
+    if backend == 'sqlite':
+        return SqliteStateStore(STATE_DB_FILE, import_from=data_file)
+    if backend == 'index':
+        return IndexStateStore(STATE_INDEX_FILE, import_from=data_file)
+    if backend != 'json':
+        logger.warning(f"Unknown STATE_BACKEND '{backend}', using json")
+    return JsonStateStore(data_file)
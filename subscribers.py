@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Optional, Tuple
+
+from config import SUBSCRIBERS_FILE, DEFAULT_PROFILE
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriberRegistry:
+    """
+    Chats that receive notifications, each with its own search profiles
+
+    Stored as {"<chat_id>": {"profiles": [...], "subscribed_at": "..."}} in a JSON file.
+    """
+
+    def __init__(self, data_file: str = SUBSCRIBERS_FILE, default_chat_id=None):
+        self.data_file = data_file
+        self._subscribers: Dict[str, Dict] = {}
+        self._load()
+        # The configured chat is always subscribed
+        if default_chat_id and str(default_chat_id) not in self._subscribers:
+            self.add(default_chat_id)
+
+    def _load(self):
+        try:
+            if os.path.exists(self.data_file):
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    self._subscribers = json.load(f)
+                logger.info(f"Loaded {len(self._subscribers)} subscribers from {self.data_file}")
+        except Exception as e:
+            logger.error(f"Error loading subscribers file: {e}")
+            self._subscribers = {}
+
+    def _save(self):
+        try:
+            tmp_file = f"{self.data_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._subscribers, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.data_file)
+        except Exception as e:
+            logger.error(f"Error saving subscribers file: {e}")
+
+    def add(self, chat_id, profiles: List[str] = None) -> Dict:
+        """
+        Subscribe a chat or change its profiles
+
+        Args:
+            chat_id: Telegram chat ID
+            profiles: Search profile names, the default profile if None
+
+        Returns:
+            Subscriber record
+        """
+        minsk_tz = timezone(timedelta(hours=3))
+        record = self._subscribers.get(str(chat_id)) or {'subscribed_at': datetime.now(minsk_tz).isoformat()}
+        record['profiles'] = profiles or record.get('profiles') or [DEFAULT_PROFILE]
+        self._subscribers[str(chat_id)] = record
+        self._save()
+        logger.info(f"Chat {chat_id} subscribed to {record['profiles']}")
+        return record
+
+    def remove(self, chat_id) -> bool:
+        """Unsubscribe a chat, returns False if it was not subscribed"""
+        if self._subscribers.pop(str(chat_id), None) is None:
+            return False
+        self._save()
+        logger.info(f"Chat {chat_id} unsubscribed")
+        return True
+
+    def get(self, chat_id) -> Optional[Dict]:
+        return self._subscribers.get(str(chat_id))
+
+    def chat_ids(self) -> List[str]:
+        return list(self._subscribers)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def plan_notifications(self, new_objects: List[Dict],
+                           matches: Dict[int, List[str]] = None) -> List[Tuple[List[Dict], List[str]]]:
+        """
+        Group subscribers by the exact set of new objects they should receive
+
+        Each group is rendered once and delivered to all of its chats.
+
+        Args:
+            new_objects: New objects found by the check
+            matches: Object ID -> names of profiles that returned it
+                (every object matches every subscriber if None)
+
+        Returns:
+            List of (objects, chat_ids) pairs
+        """
+        # Chats with the same profiles get the same objects, filter once per profile set
+        chats_by_profiles: Dict[frozenset, List[str]] = {}
+        for chat_id, record in self._subscribers.items():
+            profiles = frozenset(record.get('profiles') or [DEFAULT_PROFILE])
+            chats_by_profiles.setdefault(profiles, []).append(chat_id)
+
+        groups: Dict[Tuple[int, ...], Tuple[List[Dict], List[str]]] = {}
+        for profiles, chat_ids in chats_by_profiles.items():
+            objects = [
+                obj for obj in new_objects
+                if matches is None or profiles.intersection(matches.get(obj.get('id'), ()))
+            ]
+            if not objects:
+                continue
+            key = tuple(obj.get('id') for obj in objects)
+            groups.setdefault(key, (objects, []))[1].extend(chat_ids)
+        return list(groups.values())
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple
+
+from config import SEARCH_PAYLOAD, SUBSCRIPTIONS_FILE, DEFAULT_PROFILE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SearchProfile:
+    """Named set of search filters for the abandoned objects API"""
+
+    name: str
+    ate_id: Optional[int] = SEARCH_PAYLOAD.get('ateId')
+    from_money_amount: Optional[float] = SEARCH_PAYLOAD.get('fromMoneyAmount')
+    to_money_amount: Optional[float] = SEARCH_PAYLOAD.get('toMoneyAmount')
+    state_search_category_id: Optional[int] = SEARCH_PAYLOAD.get('stateSearchCategoryId')
+    from_deterioration: Optional[int] = SEARCH_PAYLOAD.get('fromDeterioration')
+    to_deterioration: Optional[int] = SEARCH_PAYLOAD.get('toDeterioration')
+    # Any other raw payload fields, e.g. {"oneBasePrice": false}
+    extra: Dict = field(default_factory=dict)
+    # Own check schedule: interval in hours or a cron spec (the global schedule if both None)
+    interval_hours: Optional[float] = None
+    schedule: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SearchProfile':
+        """Build a profile from a subscriptions file entry"""
+        known = {key: data[key] for key in cls.__dataclass_fields__ if key in data}
+        return cls(**known)
+
+    def build_payload(self, base: Dict = None) -> Dict:
+        """
+        Build the search payload of this profile
+
+        Args:
+            base: Payload to start from, SEARCH_PAYLOAD if None
+
+        Returns:
+            Complete search payload
+        """
+        payload = dict(base or SEARCH_PAYLOAD)
+        payload.update({
+            'ateId': self.ate_id,
+            'fromMoneyAmount': self.from_money_amount,
+            'toMoneyAmount': self.to_money_amount,
+            'stateSearchCategoryId': self.state_search_category_id,
+            'fromDeterioration': self.from_deterioration,
+            'toDeterioration': self.to_deterioration,
+        })
+        payload.update(self.extra)
+        return payload
+
+
+@dataclass
+class FetchResult:
+    """Objects of one fetch cycle merged across all profiles"""
+
+    objects: List[Dict]
+    # Object ID -> names of the profiles that returned it
+    matches: Dict[int, List[str]]
+    # False if any profile's result may lack objects (see SearchResult.complete)
+    complete: bool = True
+
+
+class SubscriptionRegistry:
+    """Registry of named search profiles fetched together in one cycle"""
+
+    def __init__(self, profiles: List[SearchProfile]):
+        if not profiles:
+            raise ValueError("At least one search profile is required")
+        self.profiles = {profile.name: profile for profile in profiles}
+
+    @classmethod
+    def load(cls, path: str = SUBSCRIPTIONS_FILE) -> 'SubscriptionRegistry':
+        """
+        Load profiles from a JSON file
+
+        Args:
+            path: Path to a JSON list of profile objects
+
+        Returns:
+            Registry with the loaded profiles or with the default profile only
+        """
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    profiles = [SearchProfile.from_dict(item) for item in json.load(f)]
+                logger.info(f"Loaded {len(profiles)} search profiles from {path}")
+                return cls(profiles)
+        except Exception as e:
+            logger.error(f"Error loading subscriptions file {path}: {e}")
+        return cls([SearchProfile(DEFAULT_PROFILE)])
+
+    def get(self, name: str) -> Optional[SearchProfile]:
+        return self.profiles.get(name)
+
+    def names(self) -> List[str]:
+        return list(self.profiles)
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def schedule_groups(self) -> Dict[Tuple[Optional[float], Optional[str]], List[str]]:
+        """
+        Group profile names by their own schedule
+
+        Returns:
+            (interval_hours, schedule) -> profile names; (None, None) holds the
+            profiles that follow the global schedule
+        """
+        groups: Dict[Tuple[Optional[float], Optional[str]], List[str]] = {}
+        for profile in self.profiles.values():
+            groups.setdefault((profile.interval_hours, profile.schedule), []).append(profile.name)
+        return groups
+
+    def _group_by_payload(self, base: Dict, names: List[str] = None) -> Dict[str, List[str]]:
+        """Group profile names by identical payloads so each is fetched once"""
+        groups: Dict[str, List[str]] = {}
+        for profile in self.profiles.values():
+            if names is not None and profile.name not in names:
+                continue
+            key = json.dumps(profile.build_payload(base), sort_keys=True)
+            groups.setdefault(key, []).append(profile.name)
+        return groups
+
+    async def fetch(self, api_client, data_manager=None, incremental: bool = False,
+                    names: List[str] = None) -> Optional[FetchResult]:
+        """
+        Fetch all profiles concurrently and merge their results
+
+        Profiles with identical payloads share one request, objects returned
+        by several profiles appear once in the result.
+
+        Args:
+            api_client: AbandonedObjectsAPI used for every request
+            data_manager: DataManager providing known-object checks (incremental mode)
+            incremental: Fetch only the unseen head of each result set
+            names: Profiles to fetch, all if None
+
+        Returns:
+            Merged FetchResult or None if any profile failed
+        """
+        groups = self._group_by_payload(api_client.payload, names)
+
+        async def fetch_group(key: str, names: List[str]):
+            payload = json.loads(key)
+            if incremental:
+                return await api_client.fetch_new_objects(
+                    data_manager.get_known_checker(names[0]), payload, data_manager.get_stop_date(names)
+                )
+            return await api_client.fetch_abandoned_objects(payload)
+
+        results = await asyncio.gather(*(fetch_group(key, names) for key, names in groups.items()))
+
+        objects: Dict[int, Dict] = {}
+        matches: Dict[int, List[str]] = {}
+        for names, result in zip(groups.values(), results):
+            if result is None:
+                # A partial result would make missing objects look removed
+                logger.error(f"Fetch failed for profiles {names}")
+                return None
+            for obj in result.objects:
+                object_id = obj.get('id')
+                if not object_id:
+                    continue
+                objects.setdefault(object_id, obj)
+                matches.setdefault(object_id, []).extend(names)
+
+        if len(self.profiles) > 1:
+            logger.info(f"Fetched {sum(len(group) for group in groups.values())} profiles in {len(groups)} requests, "
+                        f"{len(objects)} unique objects")
+        return FetchResult(list(objects.values()), matches, all(result.complete for result in results))
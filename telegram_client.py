@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import List, Dict, Optional
+
+import aiohttp
+
+from config import TELEGRAM_API_BASE
+from http_transport import HttpTransport
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramClient:
+    """Async client for the Telegram Bot API (never uses the eri2.nca.by proxy)"""
+
+    def __init__(self, token: str, transport: HttpTransport, api_base: str = TELEGRAM_API_BASE):
+        self.token = token
+        self.transport = transport
+        self.api_base = api_base.rstrip('/')
+
+    def _method_url(self, method: str) -> str:
+        return f"{self.api_base}/bot{self.token}/{method}"
+
+    async def call(self, method: str, params: Dict = None, timeout: float = 30) -> Optional[Dict]:
+        """
+        Call a Bot API method
+
+        Args:
+            method: Bot API method name, e.g. 'sendMessage'
+            params: JSON parameters of the call
+            timeout: Total request timeout in seconds
+
+        Returns:
+            Decoded response body or None if the request failed
+        """
+        try:
+            session = await self.transport.get_session()
+            async with session.post(
+                self._method_url(method),
+                json=params or {},
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                data = await response.json(content_type=None)
+                if response.status != 200 or not data.get('ok'):
+                    logger.error(f"Telegram API error in {method}: {response.status} - {data}")
+                return data
+        except asyncio.TimeoutError:
+            logger.error(f"Telegram API timeout in {method} after {timeout}s")
+            return None
+        except (aiohttp.ClientError, ValueError) as e:
+            logger.error(f"Error calling Telegram API {method}: {e}")
+            return None
+
+    async def get_me(self) -> Optional[Dict]:
+        """Return bot info or None if the token is not valid"""
+        data = await self.call('getMe', timeout=10)
+        if data and data.get('ok'):
+            return data.get('result', {})
+        return None
+
+    async def send_message(self, chat_id, text: str) -> Optional[Dict]:
+        """
+        Send a Markdown message without link previews
+
+        Returns:
+            Raw response (with 'error_code' and 'parameters' on failure) or None on network error
+        """
+        return await self.call('sendMessage', {
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': 'Markdown',
+            'disable_web_page_preview': True
+        })
+
+    async def get_updates(self, offset: int = None, timeout: int = 0, limit: int = 100) -> Optional[List[Dict]]:
+        """
+        Fetch pending updates
+
+        Args:
+            offset: First update_id to return (confirms all earlier ones)
+            timeout: Long-polling timeout in seconds
+            limit: Maximum number of updates
+
+        Returns:
+            List of updates or None if the request failed
+        """
+        params = {'timeout': timeout, 'limit': limit, 'allowed_updates': ['message']}
+        if offset is not None:
+            params['offset'] = offset
+        # Leave the server time to answer the long-poll before timing out locally
+        data = await self.call('getUpdates', params, timeout=timeout + 10)
+        if data and data.get('ok'):
+            return data.get('result') or []
+        return None
+
+    async def set_webhook(self, url: str, secret_token: str, drop_pending_updates: bool = False) -> bool:
+        """Register a webhook URL; Telegram will send secret_token in every request"""
+        data = await self.call('setWebhook', {
+            'url': url,
+            'secret_token': secret_token,
+            'allowed_updates': ['message'],
+            'drop_pending_updates': drop_pending_updates
+        })
+        return bool(data and data.get('ok'))
+
+    async def delete_webhook(self, drop_pending_updates: bool = False) -> bool:
+        """Remove the webhook so getUpdates polling works again"""
+        data = await self.call('deleteWebhook', {'drop_pending_updates': drop_pending_updates})
+        return bool(data and data.get('ok'))
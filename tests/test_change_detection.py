@@ -0,0 +1,33 @@
+from change_detection import CHANGE_FIELDS, ChangeSet, changed_fields, content_hash
+
+OBJECT = {'id': 1, 'stateTypeId': 2, 'moneyAmount': 1500.0, 'deterioration': 40, 'eventDate': '2024-05-01'}
+
+
+def test_hash_is_stable_and_fits_int64():
+    value = content_hash(OBJECT)
+    assert value == content_hash(dict(OBJECT))
+    assert -(1 << 63) <= value < 1 << 63
+
+
+def test_hash_ignores_untracked_fields():
+    assert content_hash(OBJECT) == content_hash(dict(OBJECT, id=2, position='Минск'))
+
+
+def test_changed_fields_names_each_changed_field():
+    for key in CHANGE_FIELDS:
+        changed = dict(OBJECT, **{key: 'other'})
+        assert changed_fields(content_hash(OBJECT), content_hash(changed)) == [key]
+
+
+def test_changed_fields_of_several_fields_keeps_field_order():
+    changed = dict(OBJECT, eventDate='2024-06-01', stateTypeId=3)
+    assert changed_fields(content_hash(OBJECT), content_hash(changed)) == ['stateTypeId', 'eventDate']
+
+
+def test_unchanged_hash_has_no_changed_fields():
+    assert changed_fields(content_hash(OBJECT), content_hash(OBJECT)) == []
+
+
+def test_changeset_truth_value():
+    assert not ChangeSet()
+    assert ChangeSet(removed=[1])
@@ -0,0 +1,68 @@
+import random
+import struct
+
+import pytest
+
+from id_index import IdIndex, _HEADER, _MAGIC_V1
+
+
+@pytest.fixture
+def ids():
+    rng = random.Random(7)
+    return rng.sample(range(1, 10 ** 9), 5000)
+
+
+@pytest.mark.parametrize('bloom_bits', [0, 10])
+def test_save_and_load_round_trip(tmp_path, ids, bloom_bits):
+    hashes = {object_id: object_id * 31 - 5 for object_id in ids[::3]}
+    index = IdIndex(ids, bloom_bits, hashes)
+    path = str(tmp_path / 'ids.idx')
+    index.save(path)
+
+    loaded = IdIndex.load(path, bloom_bits)
+    assert list(loaded) == sorted(ids)
+    assert loaded.hashes_of(ids) == hashes
+    assert all(object_id in loaded for object_id in ids[:100])
+    assert 0 not in loaded and 10 ** 9 + 1 not in loaded
+
+
+def test_loads_version_1_files_without_hashes(tmp_path):
+    path = tmp_path / 'v1.idx'
+    values = [3, 5, 8]
+    path.write_bytes(_HEADER.pack(_MAGIC_V1, 1, len(values), 0, 0) + struct.pack('<3q', *values))
+
+    index = IdIndex.load(str(path))
+    assert list(index) == values
+    assert index.hashes_of(values) == {}
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'not.idx'
+    path.write_bytes(b'x' * _HEADER.size)
+    with pytest.raises(ValueError):
+        IdIndex.load(str(path))
+
+
+def test_add_many_keeps_order_and_updates_hashes():
+    index = IdIndex([10, 30], hashes={10: 1, 30: 3})
+    index.add_many([20, 30, 40], {20: 2, 30: 33})
+    assert list(index) == [10, 20, 30, 40]
+    assert index.hashes_of([10, 20, 30, 40]) == {10: 1, 20: 2, 30: 33}
+
+
+def test_replace_keeps_hashes_of_ids_that_stay():
+    index = IdIndex([1, 2, 3], hashes={1: 11, 2: 22, 3: 33})
+    index.replace([2, 3, 4], {3: 333})
+    assert list(index) == [2, 3, 4]
+    assert index.hashes_of([1, 2, 3, 4]) == {2: 22, 3: 333}
+
+
+def test_difference_intersection_and_discard(ids):
+    index = IdIndex(ids, bloom_bits_per_id=10)
+    current = set(ids[:4000]) | {1, 2}
+    assert index.difference(current).tolist() == sorted(set(ids) - current)
+    assert index.intersection(current) == set(ids[:4000])
+
+    index.discard_many(ids[:10])
+    assert len(index) == len(ids) - 10
+    assert not index.intersection(ids[:10])
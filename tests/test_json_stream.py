@@ -0,0 +1,67 @@
+import json
+import random
+
+import pytest
+
+from json_stream import SearchResponseParser
+
+
+def _body(objects, **data):
+    return json.dumps({'success': True, 'data': dict(data, content=objects), 'messages': ['ok']},
+                      ensure_ascii=False).encode()
+
+
+def _chunks(body, rng):
+    pos = 0
+    while pos < len(body):
+        size = rng.randint(1, 64)
+        yield body[pos:pos + size]
+        pos += size
+
+
+def _parse(body, fields=None, seed=0):
+    parser = SearchResponseParser(fields)
+    objects = []
+    for chunk in _chunks(body, random.Random(seed)):
+        objects.extend(parser.feed(chunk))
+    return objects, parser.close()
+
+
+OBJECTS = [
+    {'id': i, 'position': f'д. Ёлкино, ул. «Лесная» {i}', 'eventDate': '2024-05-01',
+     'moneyAmount': i * 1.5, 'nested': {'a': [1, 2, {'b': '}]'}]}, 'note': 'escaped \\" quote'}
+    for i in range(1, 60)
+]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_chunks_give_the_same_result_as_json_loads(seed):
+    body = _body(OBJECTS, totalElements=59, totalPages=1)
+    objects, data = _parse(body, seed=seed)
+    assert objects == OBJECTS
+    assert data == {'totalElements': 59, 'totalPages': 1}
+
+
+def test_objects_are_reduced_to_the_given_fields():
+    objects, _ = _parse(_body(OBJECTS), fields=('id', 'moneyAmount'))
+    assert objects == [{'id': obj['id'], 'moneyAmount': obj['moneyAmount']} for obj in OBJECTS]
+
+
+def test_number_split_between_chunks():
+    parser = SearchResponseParser()
+    assert parser.feed(b'{"data": {"totalElements": 12') == []
+    assert parser.feed(b'34, "content": []}}') == []
+    assert parser.close() == {'totalElements': 1234}
+
+
+def test_empty_content():
+    objects, data = _parse(_body([], totalElements=0))
+    assert objects == [] and data == {'totalElements': 0}
+
+
+@pytest.mark.parametrize('body', [b'{"data": {"content": [{"id": 1}', b'[1, 2]', b'{"data": {"content": [1 2]}}'])
+def test_truncated_or_invalid_body_raises(body):
+    parser = SearchResponseParser()
+    with pytest.raises(json.JSONDecodeError):
+        parser.feed(body)
+        parser.close()
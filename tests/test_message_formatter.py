@@ -0,0 +1,50 @@
+import re
+
+import pytest
+
+from api_client import AbandonedObjectsAPI
+from message_formatter import MESSAGE_LIMIT, MessageFormatter, _message_length
+
+
+@pytest.fixture
+def formatter():
+    return MessageFormatter(AbandonedObjectsAPI())
+
+
+def _items(count, length):
+    return [f"{i}. 🏠 {'ж' * length}\n🔗 [Подробнее](https://example.org/{i}/forView)" for i in range(1, count + 1)]
+
+
+@pytest.mark.parametrize('count, length', [(1, 10), (50, 300), (400, 90), (3, 3000)])
+def test_every_item_is_delivered_in_order_within_the_limit(formatter, count, length):
+    items = _items(count, length)
+    parts = list(formatter._pack_messages("Заголовок:\n\n", iter(items), "🏠"))
+
+    assert all(_message_length(part) <= MESSAGE_LIMIT for part in parts)
+    assert parts[0].startswith("Заголовок:")
+    assert all(part.startswith("🏠 Продолжение") for part in parts[1:] if not part.startswith("🕐"))
+    assert "🕐 Проверка выполнена" in parts[-1]
+    text = "".join(parts)
+    assert re.findall(r'^(\d+)\. ', text, re.M) == [str(i) for i in range(1, count + 1)]
+
+
+def test_oversized_item_keeps_its_link(formatter):
+    item = f"1. 📍 {'адрес ' * 2000}\n🔗 [Подробнее](https://example.org/1/forView)"
+    parts = list(formatter._pack_messages("Заголовок:\n\n", [item], "🏠"))
+
+    assert all(_message_length(part) <= MESSAGE_LIMIT for part in parts)
+    assert "[Подробнее](https://example.org/1/forView)" in parts[0]
+    assert "…" in parts[0]
+
+
+def test_emoji_count_as_two_units():
+    assert _message_length("🏠") == 2
+    assert _message_length("ж") == 1
+
+
+def test_new_objects_messages(formatter):
+    objects = [{'id': i, 'position': f'Адрес {i}'} for i in range(1, 4)]
+    parts = list(formatter.iter_new_objects_messages(objects))
+    assert len(parts) == 1
+    assert "Найдено 3 новых" in parts[0]
+    assert all(f"/{i}/forView" in parts[0] for i in range(1, 4))
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import pytest
+
+from scheduler import MINSK_TZ, CronSchedule, IntervalSchedule, create_schedule
+
+
+def at(*args):
+    return datetime(*args, tzinfo=MINSK_TZ)
+
+
+@pytest.mark.parametrize('spec, moment, expected', [
+    ('*/30 8-20 * * 1-5', at(2024, 5, 3, 20, 30), at(2024, 5, 6, 8, 0)),   # Friday evening -> Monday
+    ('*/30 8-20 * * 1-5', at(2024, 5, 6, 8, 0, 30), at(2024, 5, 6, 8, 30)),
+    ('0 9 * * *', at(2024, 5, 1, 9, 0), at(2024, 5, 2, 9, 0)),             # a due minute is not repeated
+    ('15 10 29 2 *', at(2024, 3, 1), at(2028, 2, 29, 10, 15)),
+    ('0 12 1 * 0', at(2024, 5, 2), at(2024, 5, 5, 12, 0)),                 # day of month or Sunday
+    ('0 0 * * 7', at(2024, 5, 1), at(2024, 5, 5, 0, 0)),                   # 7 is Sunday too
+    ('5,45 */6 * 12 *', at(2024, 11, 30, 23, 59), at(2024, 12, 1, 0, 5)),
+])
+def test_cron_next_after(spec, moment, expected):
+    assert CronSchedule(spec).next_after(moment) == expected
+
+
+@pytest.mark.parametrize('spec', ['* * *', '60 * * * *', '* 5-3 * * *', '*/0 * * * *', 'x * * * *'])
+def test_invalid_cron_spec(spec):
+    with pytest.raises(ValueError):
+        CronSchedule(spec)
+
+
+def test_unsatisfiable_cron_spec():
+    with pytest.raises(ValueError):
+        CronSchedule('0 0 31 2 *').next_after(at(2024, 1, 1))
+
+
+def test_create_schedule_prefers_cron():
+    assert isinstance(create_schedule(2, '0 * * * *'), CronSchedule)
+    assert create_schedule(2).next_after(at(2024, 1, 1)) == at(2024, 1, 1, 2, 0)
+    with pytest.raises(ValueError):
+        IntervalSchedule(0)
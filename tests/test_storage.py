@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from data_manager import DataManager
+from storage import IndexStateStore, JsonStateStore, SqliteStateStore
+
+BACKENDS = ['json', 'sqlite', 'index']
+
+
+def make_store(backend, tmp_path, import_from=''):
+    if backend == 'json':
+        return JsonStateStore(str(tmp_path / 'state.json'))
+    if backend == 'sqlite':
+        return SqliteStateStore(str(tmp_path / 'state.db'), import_from=import_from)
+    return IndexStateStore(str(tmp_path / 'state.idx'), import_from=import_from)
+
+
+def obj(object_id, **fields):
+    return dict({'id': object_id, 'stateTypeId': 1, 'eventDate': f'2024-05-{object_id % 28 + 1:02d}'}, **fields)
+
+
+def summary(changes):
+    return (
+        sorted(o['id'] for o in changes.new),
+        sorted((o['id'], fields) for o, fields in changes.updated),
+        sorted(changes.removed),
+        {key: sorted(value) for key, value in changes.removed_profiles.items()},
+    )
+
+
+# (objects, incremental, matches) of consecutive checks
+CHECKS = [
+    ([obj(1), obj(2), obj(3)], False, {1: ['a'], 2: ['b'], 3: ['a', 'b']}),
+    ([obj(4), obj(2, stateTypeId=2)], True, {4: ['a'], 2: ['a']}),
+    ([obj(1), obj(4)], False, {1: ['a'], 4: ['a']}),
+    ([obj(2, stateTypeId=3), obj(4, eventDate='2024-07-01')], True, None),
+    ([obj(1), obj(2, stateTypeId=3), obj(4, eventDate='2024-07-01'), obj(5)], False, None),
+    ([], True, None),
+    ([], False, None),
+]
+
+EXPECTED = [
+    ([1, 2, 3], [], [], {}),
+    ([4], [(2, ['stateTypeId'])], [], {}),
+    ([], [], [2, 3], {2: ['a', 'b'], 3: ['a', 'b']}),
+    ([], [(2, ['stateTypeId']), (4, ['eventDate'])], [], {}),
+    ([5], [], [], {}),
+    ([], [], [], {}),
+    ([], [], [1, 2, 4, 5], {1: ['default'], 2: ['default'], 4: ['default'], 5: ['default']}),
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_detect_the_same_changes(backend, tmp_path):
+    manager = DataManager(str(tmp_path / 'state.json'), make_store(backend, tmp_path))
+    results = [summary(manager.detect_changes(objects, incremental, matches))
+               for objects, incremental, matches in CHECKS]
+    assert results == EXPECTED
+    assert manager.load_last_ids() == set()
+    assert manager.store.known_ids([1, 2, 3, 4, 5, 6]) == {1, 2, 3, 4, 5}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_state_survives_reopening(backend, tmp_path):
+    manager = DataManager(str(tmp_path / 'state.json'), make_store(backend, tmp_path))
+    manager.detect_changes([obj(1), obj(2)], False, {1: ['a'], 2: ['a']})
+    manager.detect_changes([obj(2)], False, {2: ['a']})
+    manager.store.close()
+
+    reopened = DataManager(str(tmp_path / 'state.json'), make_store(backend, tmp_path))
+    assert reopened.load_last_ids() == {2}
+    changes = reopened.detect_changes([obj(1, stateTypeId=5), obj(2)], False, {1: ['a'], 2: ['a']})
+    assert summary(changes) == ([], [(1, ['stateTypeId'])], [], {})
+    assert reopened.load_watermark('a')['id'] is not None
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'index'])
+def test_json_state_is_imported_on_first_start(backend, tmp_path):
+    data_file = tmp_path / 'last_check_data.json'
+    data_file.write_text(json.dumps({
+        'last_ids': [7, 8, 9],
+        'last_update': '2024-05-01T10:00:00+03:00',
+        'high_water_mark': {'id': 9, 'event_date': '2024-05-01'},
+    }))
+
+    manager = DataManager(str(data_file), make_store(backend, tmp_path, import_from=str(data_file)))
+    assert manager.load_last_ids() == {7, 8, 9}
+    assert manager.get_last_update_info() == {'last_update': '2024-05-01T10:00:00+03:00', 'objects_count': 3}
+    assert manager.load_watermark() == {'id': 9, 'event_date': '2024-05-01'}
+    assert [o['id'] for o in manager.detect_changes([obj(9), obj(10)], True).new] == [10]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_update_checkpoint_and_meta(backend, tmp_path):
+    manager = DataManager(str(tmp_path / 'state.json'), make_store(backend, tmp_path))
+    assert manager.load_update_checkpoint() == (0, {})
+    manager.save_update_checkpoint(42, {'1': 1700000000})
+    assert manager.load_update_checkpoint() == (42, {'1': 1700000000})
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Run recorded ERI traffic (ERI_CAPTURE_FILE) through the bot's fetch, diff and notify pipeline
+
+Usage:
+    python tools/eri_replay.py eri_capture.ndjson.gz                # as fast as possible
+    python tools/eri_replay.py eri_capture.ndjson.gz --speed 60     # an hour of recording per minute
+
+The recording is split into checks (a check ends where a search request repeats) and
+every check is replayed with check_and_notify() at its recorded time; the first one only
+seeds the state, like a bot that was already running. State files go to a scratch
+directory and messages to an in-process fake Telegram API (benchmarks/fake_servers.py)
+unless --telegram-api-base is given. Search profiles and payload settings must match
+the recording (same subscriptions file and environment), otherwise requests miss.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from eri_capture import read_capture, request_key  # noqa: E402
+
+
+def split_checks(path: str) -> list:
+    """Recorded time at which each check of the recording is complete"""
+    starts = []
+    seen = set()
+    last = 0.0
+    for exchange in read_capture(path):
+        last = max(last, exchange.t)
+        if exchange.kind != 'search':
+            continue
+        key = request_key(exchange.kind, exchange.request)
+        if not starts or key in seen:
+            starts.append(exchange.t)
+            seen = set()
+        seen.add(key)
+    # A check owns everything recorded before the next one starts (details included)
+    return [next_start - 0.001 for next_start in starts[1:]] + [last] if starts else []
+
+
+def prepare_environment(args, telegram_api_base: str):
+    """Settings for the replayed bot, before config is imported"""
+    rate = str(args.telegram_rate or 1_000_000)
+    os.environ.update({
+        'ERI_REPLAY_FILE': str(Path(args.capture).resolve()),
+        # The tool moves the replay clock itself, one check at a time
+        'ERI_REPLAY_SPEED': '0',
+        'ERI_CAPTURE_FILE': '',
+        # A cached result would hide the next recorded check
+        'ERI_CACHE_TTL': '0',
+        'TELEGRAM_API_BASE': telegram_api_base,
+        'TELEGRAM_GLOBAL_RATE': rate,
+        'TELEGRAM_CHAT_RATE': rate,
+        'TELEGRAM_GROUP_RATE': rate,
+        'SLOW_CHECK_SECONDS': '0',
+    })
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'replay')
+    os.environ.setdefault('TELEGRAM_CHAT_ID', '1')
+    if args.subscriptions:
+        os.environ['SUBSCRIPTIONS_FILE'] = str(Path(args.subscriptions).resolve())
+    elif Path('subscriptions.json').exists() and 'SUBSCRIPTIONS_FILE' not in os.environ:
+        os.environ['SUBSCRIPTIONS_FILE'] = str(Path('subscriptions.json').resolve())
+
+
+async def replay(args, checks: list):
+    import simple_bot
+    from metrics import MESSAGES
+
+    bot = simple_bot.SimpleEriBot()
+    replay_clock = bot.api_client.replay
+    started = time.perf_counter()
+    total_new = 0
+    try:
+        for number, check_time in enumerate(checks):
+            if number and args.speed > 0:
+                await asyncio.sleep((check_time - checks[number - 1]) / args.speed)
+            replay_clock.seek(check_time)
+            recorded_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(check_time))
+            if number == 0 and not args.notify_first:
+                fetch_result = await bot.fetch_current_objects()
+                if fetch_result is None:
+                    raise RuntimeError(f"Seed check failed: {bot.api_client.last_error}")
+                bot.detect_changes(fetch_result)
+                print(f"{recorded_at} seeded {len(fetch_result.objects)} objects", flush=True)
+                continue
+            sent_before = MESSAGES.value(result='sent')
+            checked_before = bot.last_check_time
+            await bot.check_and_notify()
+            sent = MESSAGES.value(result='sent') - sent_before
+            if bot.last_check_time == checked_before:
+                print(f"{recorded_at} check failed ({bot.api_client.last_error}), {sent:.0f} messages", flush=True)
+                continue
+            total_new += bot.last_check_result
+            print(f"{recorded_at} {bot.last_check_result} new objects, {sent:.0f} messages", flush=True)
+    finally:
+        await bot.send_queue.stop()
+        await bot.transport.close()
+
+    elapsed = time.perf_counter() - started
+    span_hours = (checks[-1] - checks[0]) / 3600 if checks else 0.0
+    print(f"\nReplayed {len(checks)} checks ({span_hours:.1f} h recorded) in {elapsed:.1f}s: "
+          f"{total_new} new objects, {MESSAGES.value(result='sent'):.0f} messages sent, "
+          f"{MESSAGES.value(result='failed'):.0f} failed")
+
+
+async def run(args, checks: list):
+    runner = None
+    telegram_api_base = args.telegram_api_base
+    if not telegram_api_base:
+        from aiohttp import web
+        from benchmarks.fake_servers import FakeServers
+        servers = FakeServers(objects=0, latency=0.0, error_rate=0.0, tg_latency=0.0,
+                              tg_429_rate=0.0, retry_after=1)
+        runner = web.AppRunner(servers.app(), access_log=None)
+        await runner.setup()
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        telegram_api_base = f"http://127.0.0.1:{port}"
+    prepare_environment(args, telegram_api_base)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='eri-replay-')
+    os.makedirs(workdir, exist_ok=True)
+    if args.subscribers:
+        shutil.copy(args.subscribers, os.path.join(workdir, 'subscribers.json'))
+    os.chdir(workdir)
+    try:
+        await replay(args, checks)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', help='ERI_CAPTURE_FILE of a running bot')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='Recorded seconds per real second between checks (0: no waiting)')
+    parser.add_argument('--notify-first', action='store_true', help='Notify about the first check too')
+    parser.add_argument('--subscriptions', help='Search profiles file the recording was made with')
+    parser.add_argument('--subscribers', help='subscribers.json to copy into the scratch directory')
+    parser.add_argument('--workdir', help='Keep state files here instead of a temporary directory')
+    parser.add_argument('--telegram-api-base', help='Send messages to this Bot API instead of a fake one')
+    parser.add_argument('--telegram-rate', type=float, default=0.0,
+                        help='Bot send rate limits, messages/s (0 lifts them)')
+    args = parser.parse_args()
+
+    checks = split_checks(args.capture)
+    if not checks:
+        sys.exit(f"No search requests recorded in {args.capture}")
+    asyncio.run(run(args, checks))
+
+
+if __name__ == '__main__':
+    main()
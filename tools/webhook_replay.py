@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Stand-in for Telegram: POST recorded updates to the bot's webhook endpoint
+
+Usage:
+    python tools/webhook_replay.py updates.json --url http://127.0.0.1:8443/telegram/webhook --secret SECRET
+
+The input is a JSON list of updates, a getUpdates response ({"ok": true, "result": [...]})
+or NDJSON with one update per line. Message dates are shifted to "now" by default so the
+bot does not drop them as stale.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from webhook_server import SECRET_HEADER  # noqa: E402
+
+
+def load_updates(path: str) -> list:
+    text = Path(path).read_text(encoding='utf-8').strip()
+    if not text:
+        return []
+    if text[0] in '[{' and not text.startswith('{"update_id"'):
+        data = json.loads(text)
+        return data.get('result', []) if isinstance(data, dict) else data
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+async def replay(updates: list, url: str, secret: str, delay: float, keep_dates: bool):
+    async with aiohttp.ClientSession() as session:
+        for update in updates:
+            if not keep_dates and 'message' in update:
+                update['message']['date'] = int(time.time())
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers={SECRET_HEADER: secret}) as response:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                print(f"update {update.get('update_id')}: HTTP {response.status} in {elapsed_ms:.1f} ms")
+            if delay:
+                await asyncio.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('updates', help='File with recorded updates')
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram/webhook')
+    parser.add_argument('--secret', required=True, help='Value of WEBHOOK_SECRET')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds between updates')
+    parser.add_argument('--keep-dates', action='store_true', help='Do not shift message dates to now')
+    args = parser.parse_args()
+    asyncio.run(replay(load_updates(args.updates), args.url, args.secret, args.delay, args.keep_dates))
+
+
+if __name__ == '__main__':
+    main()
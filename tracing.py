@@ -0,0 +1,202 @@
+import asyncio
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import SLOW_CHECK_SECONDS, PROFILE_SLOW_CHECKS, TRACE_DIR
+from metrics import CHECKS, CHECK_SECONDS, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Correlation ID of the check cycle the current task works for, '-' outside of cycles
+trace_id_var: contextvars.ContextVar[str] = contextvars.ContextVar('trace_id', default='-')
+_current_trace: contextvars.ContextVar[Optional['Trace']] = contextvars.ContextVar('current_trace', default=None)
+# Stack samples taken per slow cycle, one every SLOW_CHECK_SECONDS
+MAX_STACK_SAMPLES = 5
+# Functions listed in the profile summary of a trace file
+PROFILE_TOP_FUNCTIONS = 30
+
+# Only one cProfile profiler can run at a time, overlapping cycles go unprofiled
+_profiler_busy = False
+
+
+def _await_chain(task: asyncio.Task) -> List[str]:
+    """Frames of a task's coroutine and everything it awaits, outermost first"""
+    frames = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None) or getattr(coro, 'ag_frame', None)
+        if frame is None:
+            break
+        frames.append(f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None) or getattr(coro, 'ag_await', None)
+    return frames
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current correlation ID to log records as %(trace_id)s"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+class Trace:
+    """Stage timings and diagnostics of one check cycle"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.trace_id = uuid.uuid4().hex[:8]
+        self.started_at = datetime.now().astimezone()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        # Set by the cycle: 'ok', 'fetch_failed' or 'error'
+        self.result = 'error'
+        self.spans: List[Dict] = []
+        self.stack_samples: List[Dict] = []
+        self.profile_summary: Optional[str] = None
+
+    def summary(self) -> str:
+        """Total time per stage, e.g. 'fetch 38.10s, diff 0.20s'"""
+        totals: Dict[str, float] = {}
+        for item in self.spans:
+            totals[item['name']] = totals.get(item['name'], 0.0) + item['duration']
+        return ', '.join(f"{name} {seconds:.2f}s" for name, seconds in totals.items()) or 'no stages'
+
+    def sample_stacks(self, task: asyncio.Task):
+        """Record where the cycle task and every other task are waiting right now"""
+        tasks = {}
+        for other in [task] + [t for t in asyncio.all_tasks() if t is not task]:
+            if not other.done():
+                tasks[other.get_name() + (' (cycle)' if other is task else '')] = _await_chain(other)
+        self.stack_samples.append({'at': round(time.perf_counter() - self.start, 3), 'tasks': tasks})
+        logger.warning(f"Check {self.trace_id} running for {time.perf_counter() - self.start:.0f}s, "
+                       f"stack sampled")
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'kind': self.kind,
+            'result': self.result,
+            'started_at': self.started_at.isoformat(),
+            'duration': self.duration,
+            'spans': self.spans,
+            'stack_samples': self.stack_samples,
+            'profile_summary': self.profile_summary,
+        }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a stage of the current cycle
+
+    The duration goes to the eri_bot_stage_seconds histogram and, inside
+    a traced cycle, to the cycle's span list with its offset and attributes.
+    """
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=name)
+        if trace is not None:
+            trace.spans.append(dict(attributes, name=name, offset=round(start - trace.start, 4),
+                                    duration=round(duration, 4)))
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    global _profiler_busy
+    if not PROFILE_SLOW_CHECKS or _profiler_busy:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler (e.g. a debugger) is active
+        return None
+    _profiler_busy = True
+    return profiler
+
+
+def _stop_profiler(profiler: Optional[cProfile.Profile]):
+    global _profiler_busy
+    if profiler is not None:
+        profiler.disable()
+        _profiler_busy = False
+
+
+def _write_artifacts(trace: Trace, profiler: Optional[cProfile.Profile]):
+    """Save the trace (and profile) of a slow cycle to TRACE_DIR"""
+    try:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        base = os.path.join(TRACE_DIR, f"{trace.started_at.strftime('%Y%m%d-%H%M%S')}-{trace.kind}-{trace.trace_id}")
+        if profiler is not None:
+            profiler.dump_stats(f"{base}.prof")
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+            trace.profile_summary = buffer.getvalue()
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump(trace.to_dict(), f, ensure_ascii=False, indent=2)
+        logger.warning(f"Slow check trace written to {base}.json")
+    except Exception as e:
+        logger.error(f"Error writing trace of check {trace.trace_id}: {e}")
+
+
+@asynccontextmanager
+async def trace_cycle(kind: str):
+    """
+    Trace one check cycle
+
+    Sets a fresh correlation ID for every log line of the cycle (including
+    tasks it starts), logs the stage timings at the end and records the
+    cycle in eri_bot_check_seconds / eri_bot_checks_total. A cycle running
+    longer than SLOW_CHECK_SECONDS gets stack samples of all tasks and its
+    trace (plus a cProfile dump with PROFILE_SLOW_CHECKS) written to TRACE_DIR.
+
+    Args:
+        kind: Cycle kind, e.g. 'scheduled' or 'manual'
+
+    Yields:
+        Trace of the cycle; set trace.result before leaving
+    """
+    trace = Trace(kind)
+    id_token = trace_id_var.set(trace.trace_id)
+    trace_token = _current_trace.set(trace)
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    watchdog = None
+
+    def sample():
+        nonlocal watchdog
+        trace.sample_stacks(task)
+        if len(trace.stack_samples) < MAX_STACK_SAMPLES:
+            watchdog = loop.call_later(SLOW_CHECK_SECONDS, sample)
+
+    if SLOW_CHECK_SECONDS > 0:
+        watchdog = loop.call_later(SLOW_CHECK_SECONDS, sample)
+    profiler = _start_profiler()
+    try:
+        yield trace
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        _stop_profiler(profiler)
+        trace.duration = round(time.perf_counter() - trace.start, 4)
+        CHECK_SECONDS.observe(trace.duration, kind=kind)
+        CHECKS.inc(kind=kind, result=trace.result)
+        logger.info(f"Check {trace.trace_id} ({kind}, {trace.result}) took {trace.duration:.2f}s: {trace.summary()}")
+        if SLOW_CHECK_SECONDS > 0 and trace.duration >= SLOW_CHECK_SECONDS:
+            _write_artifacts(trace, profiler)
+        _current_trace.reset(trace_token)
+        trace_id_var.reset(id_token)
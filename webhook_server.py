@@ -0,0 +1,72 @@
+import hmac
+import json
+import logging
+from typing import Callable, Dict
+
+from aiohttp import web
+
+from config import WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Minimal asyncio HTTP endpoint for Telegram webhook updates
+
+    Each POST is validated against the secret token header and handed to
+    on_update without waiting for it to be processed, so Telegram gets its
+    200 response immediately.
+    """
+
+    def __init__(self, on_update: Callable[[Dict], None], secret_token: str,
+                 host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH):
+        self.on_update = on_update
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.path = path
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Validate and accept a single update POST"""
+        received = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            logger.warning(f"Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400)
+        if not self._is_valid_update(update):
+            logger.warning(f"Rejected malformed webhook update from {request.remote}")
+            return web.Response(status=400)
+
+        self.on_update(update)
+        return web.Response(status=200)
+
+    @staticmethod
+    def _is_valid_update(update) -> bool:
+        """An object with an integer update_id and, if present, a message object"""
+        if not isinstance(update, dict):
+            return False
+        update_id = update.get('update_id')
+        if not isinstance(update_id, int) or isinstance(update_id, bool):
+            return False
+        return isinstance(update.get('message', {}), dict)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None